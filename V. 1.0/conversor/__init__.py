@@ -0,0 +1,4 @@
+"""Image Converter - armanson: conversion core shared by the desktop app and the command line."""
+from .core import OUTPUT_FORMATS, ConversionResult, convert_file, save_image
+from .batch import ConversionJob, collect_inputs, plan_jobs, run_batch
+from .probe import ImageProbe, open_probed, probe_image
@@ -0,0 +1,131 @@
+"""Memory-aware admission control for conversions running at the same time.
+
+A pool sized to the CPU count can still run out of memory: a 48 MP HEIC or a large
+PNG takes hundreds of MB once decoded, and a few of them at once can exceed the
+machine. Each job's peak is estimated from its header alone (the decoded pixels,
+the converted copy normalize_mode makes or the quantizer's working memory, and the
+encoded buffer; see conversor.streaming.estimate_peak), and a job only starts while
+the estimates of the running jobs stay under a memory budget. Smaller jobs may
+overtake one that does not fit yet, but only a few times, so a large job is never
+starved; a job larger than the whole budget runs alone.
+"""
+import os
+import threading
+
+DEFAULT_MAX_BYPASS = 8 # Times a waiting job may be overtaken by later, smaller ones
+
+
+def estimate_job(job, options):
+    """Estimated peak memory (bytes) of converting a batch.ConversionJob with convert_file options.
+
+    Jobs that will not decode anything (output already there, same-format copies) and
+    unreadable sources (they fail at once) count as 0.
+    """
+    from . import core, passthrough, probe, streaming
+    if not options.get("overwrite") and os.path.exists(job.destination):
+        return 0
+    frames = options.get("frames", "auto")
+    colour = core.colour_settings(options.get("background"), options.get("quantizer"), options.get("palette"))
+    try:
+        if not options.get("reencode") and passthrough.can_copy(
+                job.source, job.output_format, frames, options.get("frame_step", 1), options.get("max_dimension"),
+                core.encoder_settings(options.get("preset"), options.get("quality"), options.get("target_size")),
+                colour):
+            return 0
+        info = probe.probe_image(job.source)
+    except Exception:
+        return 0
+    peak = streaming.estimate_peak(info.size, info.mode, job.output_format, colour)
+    if info.n_frames > 1 and frames != "first":
+        # Frames are decoded one at a time, but encoders keep the previous frame to compare against
+        peak += streaming.decoded_bytes(info.size, "RGBA")
+    memory_limit = options.get("memory_limit")
+    if memory_limit and peak > memory_limit:
+        return memory_limit # Converted in strips within the limit (or refused) by convert_file
+    return peak
+
+
+class _Ticket:
+    __slots__ = ("estimate", "bypassed")
+
+    def __init__(self, estimate):
+        self.estimate = estimate
+        self.bypassed = 0 # Times later jobs were admitted before this one
+
+
+class MemoryBudget:
+    """Admits jobs while the estimated memory of the running ones stays under limit bytes. Thread-safe.
+
+    A job first takes a ticket with enqueue(), in arrival order, then is admitted with
+    try_admit() (or acquire(), which waits) and gives its memory back with release().
+    metrics, a conversor.metrics.Metrics, receives the reserved bytes as a gauge.
+    """
+
+    def __init__(self, limit, max_bypass=DEFAULT_MAX_BYPASS, metrics=None):
+        self.limit = limit
+        self.max_bypass = max_bypass
+        self.metrics = metrics
+        self.in_use = 0
+        self.running = 0
+        self._waiting = [] # Tickets not admitted yet, oldest first
+        self._condition = threading.Condition()
+
+    def enqueue(self, estimate):
+        """Returns a ticket for a job needing about estimate bytes."""
+        ticket = _Ticket(estimate)
+        with self._condition:
+            self._waiting.append(ticket)
+        return ticket
+
+    def _admissible(self, ticket):
+        # Fits next to the running jobs (or nothing runs: a job above the limit runs alone), and
+        # no older waiting job has already been overtaken max_bypass times
+        if self.running and self.in_use + ticket.estimate > self.limit:
+            return False
+        for older in self._waiting:
+            if older is ticket:
+                return True
+            if older.bypassed >= self.max_bypass:
+                return False
+        return True
+
+    def try_admit(self, ticket):
+        """Admits the ticket's job if it fits now; returns whether it did."""
+        with self._condition:
+            if not self._admissible(ticket):
+                return False
+            for older in self._waiting:
+                if older is ticket:
+                    break
+                older.bypassed += 1
+            self._waiting.remove(ticket)
+            self.in_use += ticket.estimate
+            self.running += 1
+            self._publish()
+            return True
+
+    def acquire(self, estimate):
+        """Waits until a job needing about estimate bytes fits, and admits it."""
+        ticket = self.enqueue(estimate)
+        with self._condition:
+            self._condition.wait_for(lambda: self.try_admit(ticket))
+
+    def cancel(self, ticket):
+        """Drops a ticket that will not be admitted any more (e.g. its file disappeared)."""
+        with self._condition:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+
+    def release(self, estimate):
+        """Gives back the memory of a finished job."""
+        with self._condition:
+            self.in_use -= estimate
+            self.running -= 1
+            self._publish()
+            self._condition.notify_all()
+
+    def _publish(self):
+        if self.metrics:
+            self.metrics.set_gauge("conversor_memory_reserved_bytes", self.in_use,
+                                   "Estimated peak memory of the conversions running now.")
@@ -0,0 +1,231 @@
+"""Convert the images inside ZIP and TAR archives, streaming members in and out without extracting them.
+
+Members are read one after another straight from the archive (a TAR, compressed or
+not, is read as a stream and never seeked), converted in memory on a pool of worker
+processes, and written to the output archive (or folder) as they come back. At most
+`window` members are in flight at once, so memory does not grow with the archive,
+and outputs are always written in the order of the source archive, so converting
+the same archive twice gives the same output archive.
+"""
+import os
+import posixpath
+import time
+from collections import deque, namedtuple
+
+from . import batch, core, formats
+
+ZIP_EXTENSIONS = (".zip",)
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+ARCHIVE_EXTENSIONS = ZIP_EXTENSIONS + TAR_EXTENSIONS
+WINDOW_PER_WORKER = 2 # Members read ahead of the one being written, per worker process
+
+# An image inside an archive; mtime (seconds) is kept on the converted member
+ArchiveMember = namedtuple("ArchiveMember", ["name", "data", "mtime"])
+
+_TAR_MODES = {".gz": "gz", ".tgz": "gz", ".bz2": "bz2", ".tbz2": "bz2", ".xz": "xz", ".txz": "xz"}
+_ZIP_EPOCH = 315532800 # 1980-01-01, the earliest time a ZIP entry can hold
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def _is_image_member(name):
+    return name.lower().endswith(formats.input_extensions()) and not posixpath.basename(name).startswith("._")
+
+
+def _tar_compression(path):
+    return _TAR_MODES.get(os.path.splitext(path.lower())[1], "")
+
+
+def iter_members(path):
+    """Yields the image members of a ZIP or TAR archive as ArchiveMembers, in archive order.
+
+    Other members (folders, documents, macOS "._" resource files) are skipped.
+    """
+    if path.lower().endswith(ZIP_EXTENSIONS):
+        import zipfile
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_image_member(info.filename):
+                    yield ArchiveMember(info.filename, archive.read(info), time.mktime(info.date_time + (0, 0, -1)))
+    else:
+        import tarfile
+        with tarfile.open(path, "r|*") as archive: # Stream mode: members are read in order, once
+            for info in archive:
+                if info.isfile() and _is_image_member(info.name):
+                    yield ArchiveMember(info.name, archive.extractfile(info).read(), info.mtime)
+
+
+def output_name(name, output_format, suffix=""):
+    """The converted member's name: same folder inside the archive, new extension."""
+    folder, base = posixpath.split(name)
+    return posixpath.join(folder, f"{posixpath.splitext(base)[0]}{suffix}.{output_format.lower()}")
+
+
+def _compressor(file, compression):
+    # gzip would store the time and the (temporary) file name in its header: leaving them out keeps outputs reproducible
+    if compression == "gz":
+        import gzip
+        return gzip.GzipFile("", "wb", fileobj=file, mtime=0)
+    if compression == "bz2":
+        import bz2
+        return bz2.BZ2File(file, "wb")
+    if compression == "xz":
+        import lzma
+        return lzma.LZMAFile(file, "wb")
+    return file
+
+
+class ArchiveWriter:
+    """Writes members to a new ZIP or TAR archive (by destination's extension), renamed into place when closed.
+
+    Converted images are already compressed, so ZIP members are stored, not deflated
+    again; a .tar.gz/.tar.bz2/.tar.xz is still compressed as a whole.
+    """
+
+    def __init__(self, destination):
+        self.destination = destination
+        folder = os.path.dirname(destination)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._output = core.atomic_output(destination)
+        temp_path = self._output.__enter__()
+        if destination.lower().endswith(ZIP_EXTENSIONS):
+            import zipfile
+            self._zip = zipfile.ZipFile(temp_path, "w", zipfile.ZIP_STORED)
+            self._tar = None
+        else:
+            import tarfile
+            self._zip = None
+            self._file = open(temp_path, "wb")
+            self._compressed = _compressor(self._file, _tar_compression(destination))
+            self._tar = tarfile.open(fileobj=self._compressed, mode="w|")
+
+    def add(self, name, data, mtime):
+        if self._zip is not None:
+            import zipfile
+            info = zipfile.ZipInfo(name, time.localtime(max(mtime, _ZIP_EPOCH))[:6])
+            info.external_attr = 0o644 << 16
+            self._zip.writestr(info, data)
+        else:
+            import io
+            import tarfile
+            info = tarfile.TarInfo(name)
+            info.size, info.mtime, info.mode = len(data), int(mtime), 0o644
+            self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self, exc_info=(None, None, None)):
+        try:
+            (self._zip or self._tar).close()
+            if self._tar is not None:
+                self._compressed.close() # tarfile leaves the file objects it was given open
+                self._file.close()
+        finally:
+            self._output.__exit__(*exc_info) # Renames the archive into place, or removes it after an error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close(exc_info)
+
+
+class FolderWriter:
+    """ArchiveWriter's interface over a folder: each member becomes a file (written atomically) under it."""
+
+    def __init__(self, destination):
+        self.destination = destination
+
+    def add(self, name, data, mtime):
+        path = os.path.join(self.destination, *[part for part in name.split("/") if part not in ("", ".", "..")])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with core.atomic_output(path) as temp_path, open(temp_path, "wb") as f:
+            f.write(data)
+        os.utime(path, (mtime, mtime))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def _convert_member(name, data, output_format, reencode, options):
+    # Runs in a worker process; copies a member already in the output format, like passthrough does for files
+    if not reencode:
+        from . import passthrough, probe
+        try:
+            info = probe.probe_bytes(name, data)
+            copy = passthrough.copies_as_is(info, len(data), output_format, options.get("frames", "auto"),
+                                            options.get("frame_step", 1), options.get("max_dimension"),
+                                            core.encoder_settings(options.get("preset"), options.get("quality"),
+                                                                  options.get("target_size")),
+                                            core.colour_settings(options.get("background"), options.get("quantizer"),
+                                                                 options.get("palette")))
+        except Exception:
+            copy = False # Unreadable: transcode reports the error
+        if copy:
+            return data, {"copy": 0.0}, None
+    return core.transcode(name, data, output_format, options)
+
+
+def convert_archive(source, destination, output_format, workers=None, progress=None, metrics=None, window=None,
+                    suffix="", overwrite=False, reencode=False, frames="auto", **options):
+    """Converts every image member of the archive source into destination; returns results in member order.
+
+    destination is a ZIP/TAR archive (by its extension) or else a folder. Results name
+    members as "<archive>/<member>". Members that fail are reported and left out of the
+    output. progress is called as progress(done, total, result); total is None for TAR
+    archives, whose member count is only known at the end. Other keyword options
+    (max_dimension, preset, ...) are passed on to core.save_image.
+    """
+    if frames == "split":
+        raise ValueError("archive members are converted to one output each; frames='split' is not supported")
+    if not overwrite and os.path.exists(destination) and is_archive(destination):
+        return [core.ConversionResult(source, destination, "skipped", "output already exists", 0.0)]
+    options = dict(options, frames=frames)
+    workers = workers or os.cpu_count() or 1
+    window = window or WINDOW_PER_WORKER * workers
+    total = None
+    planned = [] # Output names of every member, when the archive lists them up front
+    if source.lower().endswith(ZIP_EXTENSIONS):
+        import zipfile
+        with zipfile.ZipFile(source) as archive: # Only the central directory is read
+            planned = [output_name(info.filename, output_format, suffix) for info in archive.infolist()
+                       if not info.is_dir() and _is_image_member(info.filename)]
+        total = len(planned)
+
+    results = []
+    # Members with the same name but another extension (a.png and a.jpg) get distinct outputs
+    names = batch.DestinationNames(planned)
+
+    def finish(member, start, future, output):
+        try:
+            data, stages, error = future.result()
+        except Exception as e:
+            data, stages, error = None, {}, f"{type(e).__name__}: {e}" # A worker process died
+        name = names.claim(output_name(member.name, output_format, suffix)) # In archive order: reproducible
+        if error is None:
+            output.add(name, data, member.mtime)
+        result = core.ConversionResult(posixpath.join(source, member.name), posixpath.join(destination, name),
+                                       "failed" if error else "ok", error, time.perf_counter() - start,
+                                       stages=stages)
+        results.append(result)
+        if metrics:
+            metrics.observe(result, output_format)
+        if progress:
+            progress(len(results), total, result)
+
+    writer = ArchiveWriter if is_archive(destination) else FolderWriter
+    # Members are read (HEIC ones probed) here while workers start: workers are not forked from this process
+    with batch.process_pool(workers) as executor, writer(destination) as output:
+        in_flight = deque() # (member, start, future), in archive order: the oldest is always written first
+        for member in iter_members(source):
+            if len(in_flight) >= window:
+                finish(*in_flight.popleft(), output)
+            future = executor.submit(_convert_member, member.name, member.data, output_format, reencode, options)
+            in_flight.append((member._replace(data=None), time.perf_counter(), future)) # The worker has its copy
+        while in_flight:
+            finish(*in_flight.popleft(), output)
+    return results
@@ -0,0 +1,221 @@
+"""Batch conversion: expand directories/globs into jobs and run them on a process pool."""
+import glob
+import os
+import time
+from collections import namedtuple
+
+from . import core, formats
+
+# One unit of work for the pool
+ConversionJob = namedtuple("ConversionJob", ["source", "destination", "output_format"])
+
+
+def process_pool(workers, **kwargs):
+    """A ProcessPoolExecutor whose workers never fork from a process where other threads run.
+
+    Workers are started on demand, so with fork a worker created while an I/O thread
+    holds a codec lock (libheif's, for instance) inherits the lock held and deadlocks.
+    A forkserver (spawn where there is none) starts them from a clean process.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, **kwargs)
+
+
+def _is_image(path):
+    return path.lower().endswith(formats.input_extensions())
+
+
+def collect_inputs(patterns, recursive=False):
+    """Expands files, directories and glob patterns into (source, relative_dir) pairs.
+
+    relative_dir keeps the sub-folder of files found inside a directory, so the
+    output tree mirrors the input tree instead of colliding on equal names.
+    """
+    found = []
+    seen = set()
+
+    def add(path, relative_dir):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            found.append((os.path.normpath(path), relative_dir))
+
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, dirs, files in os.walk(pattern):
+                dirs.sort()
+                for name in sorted(files):
+                    if _is_image(name):
+                        add(os.path.join(root, name), os.path.relpath(root, pattern))
+                if not recursive:
+                    break
+        elif os.path.isfile(pattern):
+            add(pattern, "")
+        else:
+            for path in sorted(glob.glob(pattern, recursive=recursive)):
+                if os.path.isfile(path) and _is_image(path):
+                    add(path, "")
+    return found
+
+
+def _path_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class DestinationNames:
+    """Hands out distinct destinations one at a time: a repeat becomes <name>_2.<ext>, <name>_3.<ext>, ...
+
+    Paths are compared as the file system would (case-insensitively on Windows).
+    reserved holds names that later sources will ask for, which a rename never takes;
+    when sources arrive as a stream (a TAR archive) they cannot be known, and a later
+    source whose own name was taken by a rename is renamed in turn. used holds names
+    already handed out, e.g. by an earlier run.
+    """
+
+    def __init__(self, reserved=(), used=()):
+        self._used = {_path_key(path) for path in used} # Handed out
+        self._taken = {_path_key(path) for path in reserved} | self._used # Reserved and handed out
+
+    def claim(self, path):
+        """path, or a new name if path was handed out already."""
+        key = _path_key(path)
+        if key in self._used:
+            stem, extension = os.path.splitext(path)
+            counter = 2
+            while _path_key(f"{stem}_{counter}{extension}") in self._taken:
+                counter += 1
+            path = f"{stem}_{counter}{extension}"
+            key = _path_key(path)
+        self._used.add(key)
+        self._taken.add(key)
+        return path
+
+
+def unique_destinations(destinations):
+    """destinations with repeats renamed <name>_2.<ext>, <name>_3.<ext>, ... (the first keeps its name).
+
+    Sources with the same name (img.png and img.jpg, or files from several folders
+    converted into one) would otherwise be written to one path, by racing workers.
+    A new name never takes one another source already has (see DestinationNames).
+    """
+    names = DestinationNames(destinations)
+    return [names.claim(path) for path in destinations]
+
+
+def plan_jobs(inputs, output_format, output_dir=None, suffix="_converted"):
+    """Turns collect_inputs() pairs into ConversionJobs, each with its own destination (see unique_destinations)."""
+    destinations = []
+    for source, relative_dir in inputs:
+        folder = None
+        if output_dir is not None:
+            folder = os.path.normpath(os.path.join(output_dir, relative_dir))
+        destinations.append(core.output_path_for(source, output_format, folder, suffix))
+    return [ConversionJob(source, destination, output_format)
+            for (source, _), destination in zip(inputs, unique_destinations(destinations))]
+
+
+def _run_job(job, options, submitted=None):
+    started = time.time() # Wall clock: comparable between the parent and the worker processes
+    result = core.convert_file(job.source, job.destination, job.output_format, **options)
+    if submitted is not None and result.stages is not None:
+        result.stages["queue"] = max(0.0, started - submitted) # Time spent waiting for a free worker
+    return result
+
+
+def _failed_result(job, error):
+    # A worker process died (e.g. killed by the OOM killer); report it as a failure
+    return core.ConversionResult(job.source, job.destination, "failed", f"{type(error).__name__}: {error}", 0.0)
+
+
+def run_batch(jobs, workers=None, progress=None, metrics=None, memory_budget=None, **options):
+    """Converts every job on a pool of worker processes and returns the results in job order.
+
+    workers defaults to os.cpu_count(); workers=1 runs in-process (no pool).
+    progress, if given, is called as progress(done, total, result) after each file.
+    metrics, a conversor.metrics.Metrics, receives every result (with its stage timings) as it arrives.
+    memory_budget (bytes), if given, only starts a job while the estimated peak memory of the
+    running ones stays under it (see conversor.admission).
+    Other keyword options (overwrite, memory_limit, frames, ...) are passed on to core.convert_file.
+    """
+    total = len(jobs)
+    results = [None] * total
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1 or total <= 1:
+        for index, job in enumerate(jobs):
+            results[index] = _run_job(job, options)
+            if metrics:
+                metrics.observe(results[index], job.output_format)
+            if progress:
+                progress(index + 1, total, results[index])
+        return results
+
+    if memory_budget:
+        return _run_admitted(jobs, min(workers, total), progress, metrics, memory_budget, options)
+
+    # concurrent.futures loads logging and multiprocessing: only import it when a pool is needed
+    from concurrent.futures import as_completed
+    with process_pool(min(workers, total)) as executor:
+        futures = {executor.submit(_run_job, job, options, time.time()): index for index, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            index = futures[future]
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = _failed_result(jobs[index], e)
+            if metrics:
+                metrics.observe(results[index], jobs[index].output_format)
+            if progress:
+                progress(done, total, results[index])
+    return results
+
+
+def _run_admitted(jobs, workers, progress, metrics, memory_budget, options):
+    """run_batch under a memory budget: jobs are submitted one by one, as their estimated memory fits."""
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from . import admission
+    budget = admission.MemoryBudget(memory_budget, metrics=metrics)
+    total = len(jobs)
+    results = [None] * total
+    waiting = [] # (index, estimate, ticket) of the next jobs, oldest first; headers are read only this far ahead
+    running = {} # future -> (index, estimate)
+    next_index = done = 0
+    with process_pool(workers) as executor:
+        while next_index < total or waiting or running:
+            while next_index < total and len(waiting) < 4 * workers:
+                estimate = admission.estimate_job(jobs[next_index], options)
+                waiting.append((next_index, estimate, budget.enqueue(estimate)))
+                next_index += 1
+            for entry in list(waiting):
+                if len(running) >= workers:
+                    break # Only running jobs hold memory: the rest wait here, not in the pool's queue
+                index, estimate, ticket = entry
+                if budget.try_admit(ticket):
+                    waiting.remove(entry)
+                    running[executor.submit(_run_job, jobs[index], options, time.time())] = (index, estimate)
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, estimate = running.pop(future)
+                budget.release(estimate)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = _failed_result(jobs[index], e)
+                done += 1
+                if metrics:
+                    metrics.observe(results[index], jobs[index].output_format)
+                if progress:
+                    progress(done, total, results[index])
+    return results
+
+
+def summarize(results):
+    """Counts results per status, plus cache hits: {"ok": n, "skipped": n, "failed": n, "linked": n, "cached": n}."""
+    counts = {"ok": 0, "skipped": 0, "failed": 0, "linked": 0, "cached": 0}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+        counts["cached"] += bool(result.cached)
+    return counts
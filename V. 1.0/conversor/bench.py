@@ -0,0 +1,233 @@
+"""Reproducible conversion benchmark: throughput, latency percentiles and peak memory per format pair.
+
+Synthetic, deterministic images of several sizes and modes are encoded in every
+input format, then converted to every output format. Each case runs in a fresh
+process so its peak RSS is its own. The import time of the package's entry points
+is measured too. Results are written as JSON and can be compared against an
+earlier run to catch regressions.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import core, formats
+
+DEFAULT_SIZES = ((640, 480), (1920, 1080))
+DEFAULT_MODES = ("RGB", "RGBA", "L", "P", "CMYK")
+DEFAULT_ITERATIONS = 3
+DEFAULT_THRESHOLD = 10.0 # Percent
+
+# Every registered format, both ways
+INPUT_FORMATS = OUTPUT_FORMATS = tuple(formats.output_names())
+
+# Start-up cost tracked by the benchmark: what scripted use and the command line pay before any work
+STARTUP_SNIPPETS = {"import conversor": "import conversor",
+                    "command line": "import conversor.cli",
+                    "HEIF support": "import conversor.core as core; core.register_heif()",
+                    "PIL.Image": "import PIL.Image"}
+STARTUP_RUNS = 5
+STARTUP_NOISE_MS = 5.0 # Start-up changes smaller than this are not reported as regressions
+
+
+def _distinct(formats):
+    # JPG and JPEG are the same codec: benchmark it once
+    seen, result = set(), []
+    for name in formats:
+        if core.pil_format(name) not in seen:
+            seen.add(core.pil_format(name))
+            result.append(name)
+    return result
+
+
+def synthetic_image(size, mode):
+    """A deterministic image with both smooth areas and fine detail, so encoders do realistic work."""
+    from PIL import Image
+    detail = Image.effect_mandelbrot(size, (-2.0, -1.25, 0.75, 1.25), 100)
+    horizontal = Image.linear_gradient("L").rotate(90).resize(size)
+    radial = Image.radial_gradient("L").resize(size)
+    img = Image.merge("RGB", (detail, horizontal, radial))
+    if mode == "RGBA":
+        img.putalpha(Image.linear_gradient("L").resize(size))
+    elif mode == "P":
+        img = img.quantize(256)
+    elif mode != "RGB":
+        img = img.convert(mode)
+    return img
+
+
+def write_input(directory, input_format, size, mode):
+    """Encodes a synthetic image as input_format and returns (path, actual_mode)."""
+    path = os.path.join(directory, f"{size[0]}x{size[1]}_{mode}.{input_format.lower()}")
+    if not os.path.exists(path):
+        img = synthetic_image(size, mode)
+        codec = formats.load_plugin(formats.get(input_format))
+        core.normalize_mode(img, input_format).save(path, format=codec.pil_format)
+    with core.open_image(path) as img:
+        return path, img.mode
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None # Not available on Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def run_case(source, output_format, iterations):
+    """Converts source to output_format iterations times (after one warm-up) in the current process."""
+    baseline_rss = _peak_rss_mb()
+    destination = os.path.join(tempfile.mkdtemp(prefix="conversor-bench-"), f"out.{output_format.lower()}")
+    latencies = []
+    error = None
+    try:
+        for attempt in range(iterations + 1):
+            start = time.perf_counter()
+            # reencode: same-format cases would otherwise time a file copy (conversor.passthrough)
+            result = core.convert_file(source, destination, output_format, overwrite=True, reencode=True)
+            elapsed = time.perf_counter() - start
+            if result.status != "ok":
+                error = result.error
+                break
+            if attempt: # The first run is a warm-up (imports, codec initialization)
+                latencies.append(elapsed)
+        output_bytes = os.path.getsize(destination) if error is None else None
+    finally:
+        if os.path.exists(destination):
+            os.remove(destination)
+        os.rmdir(os.path.dirname(destination))
+    return {"latencies": latencies, "error": error, "output_bytes": output_bytes,
+            "baseline_rss_mb": baseline_rss, "peak_rss_mb": _peak_rss_mb()}
+
+
+def _summarize(case, measured, source):
+    latencies = measured["latencies"]
+    if measured["error"] or not latencies:
+        return dict(case, error=measured["error"] or "no successful runs")
+    total = sum(latencies)
+    width, height = case["size"]
+    input_mb = os.path.getsize(source) / 2**20
+    return dict(case,
+                input_bytes=os.path.getsize(source),
+                output_bytes=measured["output_bytes"],
+                images_per_s=round(len(latencies) / total, 3),
+                mb_per_s=round(input_mb * len(latencies) / total, 3),
+                mpix_per_s=round(width * height / 1e6 * len(latencies) / total, 3),
+                latency_ms={"mean": round(1000 * total / len(latencies), 3),
+                            "p50": round(1000 * _percentile(latencies, 0.50), 3),
+                            "p90": round(1000 * _percentile(latencies, 0.90), 3),
+                            "p99": round(1000 * _percentile(latencies, 0.99), 3)},
+                peak_rss_mb=measured["peak_rss_mb"] and round(measured["peak_rss_mb"], 1),
+                rss_growth_mb=measured["peak_rss_mb"] and round(measured["peak_rss_mb"] - measured["baseline_rss_mb"], 1))
+
+
+def startup_times(runs=STARTUP_RUNS):
+    """Median milliseconds each STARTUP_SNIPPETS entry adds to a fresh interpreter's start-up."""
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def measure(code):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=package_dir, check=True)
+            samples.append(1000 * (time.perf_counter() - start))
+        return _percentile(samples, 0.5)
+
+    interpreter = measure("pass")
+    return {name: round(max(0.0, measure(code) - interpreter), 1) for name, code in STARTUP_SNIPPETS.items()}
+
+
+def case_id(case):
+    return f"{case['input']}({case['mode']} {case['size'][0]}x{case['size'][1]}) -> {case['output']}"
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, modes=DEFAULT_MODES, inputs=INPUT_FORMATS, outputs=OUTPUT_FORMATS,
+                  iterations=DEFAULT_ITERATIONS, report=None, startup=True):
+    """Runs every input -> output case and returns the JSON-ready results.
+
+    report, if given, is called with each case's result as soon as it is measured.
+    startup=False skips the import time measurements.
+    """
+    from .batch import process_pool
+    # A fresh process per case keeps each peak RSS independent of the previous cases
+    results = []
+    with tempfile.TemporaryDirectory(prefix="conversor-bench-inputs-") as directory, \
+            process_pool(1, max_tasks_per_child=1) as executor:
+        for input_format in _distinct(inputs):
+            for size in sizes:
+                measured_modes = set()
+                for mode in modes:
+                    source, source_mode = write_input(directory, input_format, size, mode)
+                    if source_mode in measured_modes:
+                        continue # The input format stored this mode as one already measured
+                    measured_modes.add(source_mode)
+                    for output_format in _distinct(outputs):
+                        case = {"input": input_format, "output": output_format, "mode": source_mode,
+                                "size": list(size)}
+                        measured = executor.submit(run_case, source, output_format, iterations).result()
+                        results.append(_summarize(case, measured, source))
+                        if report:
+                            report(results[-1])
+    return {"meta": environment(iterations), "startup_ms": startup_times() if startup else {}, "results": results}
+
+
+def environment(iterations):
+    """Describes where a benchmark ran, so runs from different machines are not compared blindly."""
+    import PIL
+    try:
+        import pillow_heif
+        heif_version = pillow_heif.__version__
+    except ImportError:
+        heif_version = None
+    return {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+            "pillow": PIL.__version__, "pillow_heif": heif_version, "platform": platform.platform(),
+            "machine": platform.machine(), "cpu_count": os.cpu_count(), "iterations": iterations}
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Lists (case_id, metric, old, new, change_percent) for cases that got worse by more than threshold percent."""
+    old_cases = {case_id(case): case for case in baseline["results"] if "error" not in case}
+    regressions = []
+    for case in current["results"]:
+        old = old_cases.get(case_id(case))
+        if old is None or "error" in case:
+            continue
+        # Throughput should not drop; latency and memory should not rise
+        checks = [("images_per_s", old["images_per_s"], case["images_per_s"], -1),
+                  ("latency_ms.p90", old["latency_ms"]["p90"], case["latency_ms"]["p90"], 1)]
+        if old.get("peak_rss_mb") and case.get("peak_rss_mb"):
+            checks.append(("peak_rss_mb", old["peak_rss_mb"], case["peak_rss_mb"], 1))
+        for metric, before, after, worse in checks:
+            change = 100 * (after - before) / before if before else 0
+            if change * worse > threshold:
+                regressions.append((case_id(case), metric, before, after, round(change, 1)))
+    old_startup = baseline.get("startup_ms", {})
+    for name, after in current.get("startup_ms", {}).items():
+        before = old_startup.get(name)
+        if before is None or after - before < STARTUP_NOISE_MS:
+            continue
+        change = 100 * (after - before) / before if before else 100.0
+        if change > threshold:
+            regressions.append((f"startup: {name}", "import_ms", before, after, round(change, 1)))
+    return regressions
+
+
+def save(results, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
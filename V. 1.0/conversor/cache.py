@@ -0,0 +1,134 @@
+"""Content-addressed cache of converted outputs, with a size cap and LRU eviction.
+
+Entries are keyed by a hash of the source bytes plus the output format and the
+encoder parameters, so an identical request is answered by copying (or hard
+linking) the stored output instead of decoding and encoding again. The index
+and the hit/miss counters live in SQLite, so every worker process shares them.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from . import core
+
+DEFAULT_CACHE_SIZE = 1024 * 2**20 # 1 GB
+
+_READ_CHUNK = 1024 * 1024
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "image-conversor")
+
+
+def file_digest(path):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_READ_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """On-disk cache of conversion outputs. Safe to share between processes and to pickle."""
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_SIZE, link=False):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.link = link # Hard link hits into place instead of copying them
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+        with self._connect() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER, last_used REAL)")
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+            db.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", [("hits",), ("misses",)])
+
+    @contextmanager
+    def _connect(self):
+        # A new connection per operation keeps the object picklable for worker processes
+        db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), timeout=30)
+        try:
+            with db: # Commits on success, rolls back on error
+                yield db
+        finally:
+            db.close()
+
+    def _object_path(self, key):
+        return os.path.join(self.directory, "objects", key[:2], key)
+
+    def key_for(self, source, output_format, params=None):
+        """Cache key of converting source to output_format with the given encoder parameters."""
+        from .core import pil_format
+        description = json.dumps({"format": pil_format(output_format), "params": params or {}}, sort_keys=True)
+        return hashlib.sha256(f"{file_digest(source)}:{description}".encode()).hexdigest()
+
+    def fetch(self, key, destination):
+        """Puts the cached output for key at destination. Returns False (a miss) if there is none."""
+        path = self._object_path(key)
+        with self._connect() as db:
+            found = db.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+            found = found and os.path.exists(path)
+            db.execute("UPDATE counters SET value = value + 1 WHERE name = ?", ("hits" if found else "misses",))
+            if not found:
+                return False
+            db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        with core.atomic_output(destination) as temp_path:
+            if self.link:
+                try:
+                    os.link(path, temp_path)
+                    return True
+                except OSError:
+                    pass # Different file system: fall back to a copy
+            shutil.copyfile(path, temp_path)
+        return True
+
+    def store(self, key, output_path):
+        """Adds a freshly converted output to the cache and evicts the least recently used entries."""
+        path = self._object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        try:
+            shutil.copyfile(output_path, temp_path)
+            os.replace(temp_path, path) # Readers never see a half-written entry
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, os.path.getsize(path), time.time()))
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        with self._connect() as db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            for key, size in db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+                if total <= self.max_bytes:
+                    break
+                db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                try:
+                    os.remove(self._object_path(key))
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def stats(self):
+        """Returns {"hits", "misses", "entries", "bytes"} for this cache directory."""
+        with self._connect() as db:
+            counters = dict(db.execute("SELECT name, value FROM counters"))
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"hits": counters.get("hits", 0), "misses": counters.get("misses", 0), "entries": entries, "bytes": size}
+
+    def clear(self):
+        """Deletes every entry and resets the counters."""
+        with self._connect() as db:
+            db.execute("DELETE FROM entries")
+            db.execute("UPDATE counters SET value = 0")
+        shutil.rmtree(os.path.join(self.directory, "objects"), ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
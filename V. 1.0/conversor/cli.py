@@ -0,0 +1,495 @@
+"""Command line entry point: python -m conversor <command> ...
+
+Only light modules are imported here; Pillow, the HEIF plugin, multiprocessing and
+the HTTP server load when a command needs them, and tkinter is never imported.
+"""
+import argparse
+import os
+import signal
+import sys
+import time
+
+from . import batch, bench, core, dedup, estimate, formats, journal, metrics, presets, watch
+from .cache import DEFAULT_CACHE_SIZE, ConversionCache, default_cache_dir
+
+
+def _lossy_formats():
+    return "/".join(codec.names[0] for codec in formats.registered() if codec.lossy)
+
+
+def _check_output_format(output_format):
+    """Prints why output_format cannot be written here (e.g. Pillow lacks its encoder); returns True if it can."""
+    if formats.available(output_format):
+        return True
+    print(f"This Pillow cannot write {output_format} (its encoder or plugin is missing).", file=sys.stderr)
+    return False
+
+
+def _print_result(done, total, result):
+    status = "CACHED" if result.cached else result.status.upper()
+    line = f"[{done}/{total or '?'}] {status:7} {result.source} -> {result.destination} ({result.seconds:.2f}s)"
+    if result.error:
+        line += f" {result.error}"
+    print(line, flush=True)
+
+
+def _metrics_for(args):
+    sinks = []
+    if args.metrics_log:
+        sinks.append(metrics.JsonLogSink(args.metrics_log))
+    if args.metrics_prom:
+        sinks.append(metrics.PrometheusTextfileSink(args.metrics_prom))
+    return metrics.Metrics(sinks)
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-log", metavar="PATH",
+                        help="append one JSON line per file, with per-stage timings, to PATH (- for stderr)")
+    parser.add_argument("--metrics-prom", metavar="PATH",
+                        help="keep a Prometheus textfile of counters and stage histograms at PATH")
+
+
+def add_encoder_arguments(parser):
+    parser.add_argument("--preset", choices=presets.PRESETS, default=None,
+                        help="encoder settings: web (progressive, optimized), small, fast or lossless "
+                             "(default: Pillow's defaults)")
+    parser.add_argument("--quality", type=int, choices=range(1, 101), metavar="1-100",
+                        help=f"{_lossy_formats()} encoder quality, overriding the preset's")
+    parser.add_argument("--target-size", type=int, metavar="KB",
+                        help=f"highest {_lossy_formats()} quality whose output fits in KB kilobytes")
+    parser.add_argument("--reencode", action="store_true",
+                        help="decode and encode sources already in the output format instead of copying them")
+
+
+def _encoder_options(args):
+    return {"quality": args.quality, "preset": args.preset,
+            "target_size": args.target_size * 1024 if args.target_size else None, "reencode": args.reencode}
+
+
+def _colour_argument(text):
+    from .colour import parse_colour
+    try:
+        return parse_colour(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a colour name or #rrggbb: {text!r}")
+
+
+def add_colour_arguments(parser):
+    from .colour import QUANTIZERS
+    parser.add_argument("--background", type=_colour_argument, default=None, metavar="COLOUR",
+                        help="colour transparent pixels are flattened onto for JPEG, as a name or #rrggbb "
+                             "(default: white)")
+    parser.add_argument("--quantizer", choices=QUANTIZERS, default=None,
+                        help="palette quantizer for GIF (default: octree, the fastest); with PNG output, "
+                             "writes palette PNGs")
+    parser.add_argument("--shared-palette", action="store_true",
+                        help="compute one palette for the whole batch (GIF or PNG output) and use it for every file")
+
+
+def _colour_options(args, sources):
+    options = {"background": args.background, "quantizer": args.quantizer, "palette": None}
+    if args.shared_palette:
+        from . import colour
+        options["palette"] = colour.build_palette(sources, colour.ColourSettings(args.background, args.quantizer))
+    return options
+
+
+def _count(number, noun):
+    return f"{number} {noun}{'' if number == 1 else 's'}"
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02}m"
+    return f"{minutes}m {seconds:02}s" if minutes else f"{seconds}s"
+
+
+def _print_estimate(jobs, archive_sources, output_format, args, memory_limit, memory_budget):
+    """Runs a dry run of the jobs and prints the estimate; returns the exit code."""
+    from .colour import DEFAULT_QUANTIZER
+    # A shared palette is not built for a dry run: quantizing each sample costs about as much as mapping it
+    quantizer = args.quantizer or (DEFAULT_QUANTIZER if args.shared_palette else None)
+    options = dict(_encoder_options(args), frames=args.frames, frame_step=args.frame_step,
+                   default_duration=args.frame_duration, max_dimension=args.max_dimension,
+                   background=args.background, quantizer=quantizer)
+    try:
+        plan = estimate.dry_run(jobs, samples=args.dry_run_samples, workers=args.workers, overwrite=args.overwrite,
+                                memory_limit=memory_limit, memory_budget=memory_budget, **options)
+    except ValueError as e:
+        print(f"Cannot estimate: {e}.", file=sys.stderr)
+        return 1
+    samples = sum(calibration.samples for calibration in plan.calibration.values())
+    print(f"Dry run: {plan.jobs} images to {output_format}: {plan.converted} to convert, {plan.copied} copied as they "
+          f"are, {plan.skipped} skipped (output exists), {plan.unreadable} unreadable.")
+    for name, calibration in sorted(plan.calibration.items()):
+        print(f"  {name}: {calibration.bytes_per_pixel:.3f} bytes/pixel, "
+              f"{calibration.pixels_per_second / 1e6:.1f} MP/s per worker ({_count(calibration.samples, 'sample')})")
+    print(f"Estimated output: {plan.output_bytes / 2**20:.1f} MB")
+    print(f"Estimated time: {_duration(plan.wall_seconds)} with {_count(plan.workers, 'worker')} "
+          f"({_duration(plan.cpu_seconds)} of conversion time)")
+    print(f"Estimated peak memory: {plan.peak_memory / 2**20:.1f} MB")
+    if archive_sources:
+        print(f"Not estimated: {len(archive_sources)} archive(s).")
+    print(f"Calibrated on {_count(samples, 'sample conversion')}; nothing was written.")
+    return 0
+
+
+def _journal_path(args):
+    if args.journal is not True:
+        return args.journal
+    return os.path.join(args.output_dir or ".", journal.JOURNAL_FILE)
+
+
+def _run_jobs(jobs, runner, args, progress, options):
+    # Deduplication wraps the journal, so duplicates are never journaled and a resumed run still links them
+    from contextlib import ExitStack
+    from functools import partial
+    with ExitStack() as stack:
+        if args.journal:
+            manifest = stack.enter_context(journal.BatchJournal(_journal_path(args), verify=args.verify_journal))
+            runner = partial(manifest.run, runner=runner)
+        if args.dedup:
+            index_path = args.dedup_index or os.path.join(args.output_dir or ".", dedup.INDEX_FILE)
+            index = stack.enter_context(dedup.DedupIndex(index_path))
+            runner = partial(index.run, runner=runner, threshold=args.dedup_threshold, action=args.dedup)
+        return runner(jobs, progress=progress, **options)
+
+
+def _archive_destination(source, args):
+    from . import archives
+    name = os.path.basename(source)
+    extension = next(ext for ext in archives.ARCHIVE_EXTENSIONS if name.lower().endswith(ext))
+    stem = name[:-len(extension)] + args.suffix
+    folder = args.output_dir if args.output_dir is not None else os.path.dirname(source)
+    if args.archive_output == "folder":
+        return os.path.join(folder, stem)
+    return os.path.join(folder, stem + (extension if args.archive_output == "same" else f".{args.archive_output}"))
+
+
+def _convert_archives(sources, output_format, args, options, progress, sinks):
+    from . import archives
+    results = []
+    for source in sources:
+        try:
+            results += archives.convert_archive(source, _archive_destination(source, args), output_format,
+                                                workers=args.workers, progress=progress, metrics=sinks,
+                                                overwrite=args.overwrite, **options)
+        except Exception as e: # Unreadable archive: nothing of it was written
+            results.append(core.ConversionResult(source, _archive_destination(source, args), "failed",
+                                                 f"{type(e).__name__}: {e}", 0.0))
+            if progress:
+                progress(1, 1, results[-1])
+    return results
+
+
+def cmd_convert(args):
+    """Converts files, directories and globs to the chosen format."""
+    output_format = args.to.upper()
+    inputs = batch.collect_inputs(args.inputs, recursive=args.recursive)
+    if not inputs:
+        print("No images found.", file=sys.stderr)
+        return 2
+
+    if args.pipeline and (args.memory_limit or args.cache or args.frames == "split"):
+        print("--pipeline cannot be combined with --memory-limit, --cache or --frames split.", file=sys.stderr)
+        return 2
+
+    from .archives import is_archive
+    archive_sources = [source for source, _ in inputs if is_archive(source)]
+    if archive_sources and args.frames == "split":
+        print("--frames split cannot be used with archives.", file=sys.stderr)
+        return 2
+    if args.dedup == "link" and args.frames == "split":
+        print("--dedup link cannot be combined with --frames split.", file=sys.stderr)
+        return 2
+    if not 0 <= args.dedup_threshold <= dedup.MAX_THRESHOLD:
+        print(f"--dedup-threshold must be between 0 and {dedup.MAX_THRESHOLD}.", file=sys.stderr)
+        return 2
+    if args.shared_palette and not formats.get(output_format).palette:
+        palettes = " or ".join(codec.names[0] for codec in formats.registered() if codec.palette)
+        print(f"--shared-palette needs {palettes} output.", file=sys.stderr)
+        return 2
+    if not _check_output_format(output_format):
+        return 2
+    if args.quantizer:
+        from .colour import quantizer_available
+        if not quantizer_available(args.quantizer):
+            print(f"This Pillow was built without {args.quantizer}.", file=sys.stderr)
+            return 2
+    if args.dry_run_samples < 1:
+        print("--dry-run-samples must be at least 1.", file=sys.stderr)
+        return 2
+    inputs = [(source, relative_dir) for source, relative_dir in inputs if not is_archive(source)]
+    jobs = batch.plan_jobs(inputs, output_format, output_dir=args.output_dir, suffix=args.suffix)
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit else None
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    if args.dry_run:
+        return _print_estimate(jobs, archive_sources, output_format, args, memory_limit, memory_budget)
+    cache = None
+    if args.cache:
+        cache = ConversionCache(args.cache_dir, max_bytes=args.cache_size * 2**20, link=args.cache_link)
+    options = dict(frames=args.frames, frame_step=args.frame_step, default_duration=args.frame_duration,
+                   max_dimension=args.max_dimension, **_encoder_options(args),
+                   **_colour_options(args, [job.source for job in jobs]))
+    archive_options = dict(options)
+    if args.pipeline:
+        from . import pipeline # asyncio is only loaded for pipelined runs
+        runner = pipeline.run_pipeline
+        options.update(io_threads=args.io_threads or pipeline.DEFAULT_IO_THREADS)
+    else:
+        runner = batch.run_batch
+        options.update(memory_limit=memory_limit, cache=cache)
+    progress = None if args.quiet else _print_result
+    results = []
+    with _metrics_for(args) as sinks:
+        options.update(workers=args.workers, overwrite=args.overwrite, metrics=sinks, memory_budget=memory_budget)
+        if jobs: # Not when only archives were given
+            results = _run_jobs(jobs, runner, args, progress, options)
+        results += _convert_archives(archive_sources, output_format, args, archive_options, progress, sinks)
+
+    counts = batch.summarize(results)
+    seconds = sum(result.seconds for result in results)
+    resumed = sum(result.error == journal.RESUMED_ERROR for result in results)
+    linked = f"{counts['linked']} linked, " if counts["linked"] else ""
+    print(f"Done: {counts['ok']} converted ({counts['cached']} from cache), {linked}{counts['skipped']} skipped"
+          f"{f' ({resumed} done in an earlier run)' if resumed else ''}, "
+          f"{counts['failed']} failed ({seconds:.2f}s of conversion time).")
+    return 1 if counts["failed"] else 0
+
+
+def _print_watch_result(result):
+    _print_result(time.strftime("%H:%M:%S"), "watch", result)
+
+
+def cmd_watch(args):
+    """Converts images as they arrive in a directory, until interrupted."""
+    if not os.path.isdir(args.directory):
+        print(f"Not a directory: {args.directory}", file=sys.stderr)
+        return 2
+    if not _check_output_format(args.to):
+        return 2
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit else None
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    with _metrics_for(args) as sinks:
+        watcher = watch.FolderWatcher(args.directory, args.to, output_dir=args.output_dir, suffix=args.suffix,
+                                      recursive=args.recursive, workers=args.workers, settle=args.settle,
+                                      poll_interval=args.poll_interval, state_path=args.state,
+                                      report=None if args.quiet else _print_watch_result, metrics=sinks,
+                                      memory_budget=memory_budget,
+                                      overwrite=args.overwrite, memory_limit=memory_limit, frames=args.frames,
+                                      max_dimension=args.max_dimension, **_encoder_options(args))
+        # Ctrl+C and SIGTERM stop watching; conversions already running are allowed to finish
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: watcher.stop())
+        print(f"Watching {os.path.abspath(args.directory)} (Ctrl+C to stop)...", flush=True)
+        watcher.run()
+    print("Stopped.")
+    return 0
+
+
+def cmd_serve(args):
+    """Serves conversions over HTTP until interrupted."""
+    from . import server # http.server is only needed here
+    memory_limit = args.memory_limit * 2**20 if args.memory_limit else None
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    max_upload = args.max_upload * 2**20 if args.max_upload else server.DEFAULT_MAX_UPLOAD
+    sinks = _metrics_for(args).sinks
+    server.serve(args.host, args.port or server.DEFAULT_PORT, quiet=args.quiet, workers=args.workers,
+                 queue_size=args.queue, max_upload=max_upload, metrics_sinks=sinks, memory_budget=memory_budget,
+                 memory_limit=memory_limit)
+    return 0
+
+
+def cmd_cache(args):
+    """Shows (or clears) the conversion cache statistics."""
+    cache = ConversionCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = 100 * stats["hits"] / lookups if lookups else 0
+    print(f"Cache: {cache.directory}")
+    print(f"Entries: {stats['entries']} ({stats['bytes'] / 2**20:.1f} MB)")
+    print(f"Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {hit_rate:.1f}%")
+    return 0
+
+
+def _parse_size(text):
+    width, _, height = text.lower().partition("x")
+    return int(width), int(height)
+
+
+def _print_case(case):
+    if "error" in case:
+        print(f"{bench.case_id(case):45} ERROR {case['error']}", flush=True)
+        return
+    print(f"{bench.case_id(case):45} {case['images_per_s']:8.2f} img/s {case['mb_per_s']:8.2f} MB/s "
+          f"p50 {case['latency_ms']['p50']:8.1f} ms p99 {case['latency_ms']['p99']:8.1f} ms "
+          f"peak {case['peak_rss_mb']} MB", flush=True)
+
+
+def cmd_bench(args):
+    """Benchmarks every input -> output pair and optionally compares with an earlier run."""
+    results = bench.run_benchmark(sizes=args.sizes, modes=args.modes, inputs=args.inputs, outputs=args.outputs,
+                                  iterations=args.iterations, report=None if args.quiet else _print_case,
+                                  startup=not args.no_startup)
+    if not args.quiet:
+        for name, milliseconds in results["startup_ms"].items():
+            print(f"{'startup: ' + name:45} {milliseconds:8.1f} ms")
+    if args.output:
+        bench.save(results, args.output)
+        print(f"Results written to {args.output}")
+    if not args.compare:
+        return 0
+
+    regressions = bench.compare(bench.load(args.compare), results, args.threshold)
+    for name, metric, before, after, change in regressions:
+        print(f"REGRESSION {name}: {metric} {before} -> {after} ({change:+.1f}%)")
+    print(f"{len(regressions)} regression(s) above {args.threshold}% compared with {args.compare}.")
+    return 1 if regressions else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="conversor", description="Image Converter - armanson (command line)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="convert images in batch")
+    convert.add_argument("inputs", nargs="+", help="image files, ZIP/TAR archives, directories or glob patterns")
+    convert.add_argument("-t", "--to", required=True, type=str.upper, choices=formats.output_names(),
+                         help="output format")
+    convert.add_argument("-o", "--output-dir", help="where to write the results (default: next to each source)")
+    convert.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    convert.add_argument("-r", "--recursive", action="store_true", help="descend into sub-directories")
+    convert.add_argument("--suffix", default="_converted", help="appended to each output name (default: _converted)")
+    convert.add_argument("--overwrite", action="store_true", help="replace outputs that already exist")
+    add_encoder_arguments(convert)
+    add_colour_arguments(convert)
+    convert.add_argument("--max-dimension", type=int, metavar="PX",
+                         help="scale outputs down to fit in PX x PX (decoded at reduced resolution where possible)")
+    convert.add_argument("--memory-limit", type=int, metavar="MB",
+                         help="peak memory per file; larger images are converted in strips")
+    convert.add_argument("--memory-budget", type=int, metavar="MB",
+                         help="total estimated memory of the conversions running at once; the others wait for room "
+                              "(default: no limit)")
+    convert.add_argument("--frames", choices=core.FRAME_MODES, default="auto",
+                         help="multi-frame sources: keep the animation when the output allows it (auto), "
+                              "keep the first frame only, or write one file per frame (split)")
+    convert.add_argument("--frame-step", type=int, default=1, metavar="N",
+                         help="keep every N-th frame; skipped frames' durations are preserved")
+    convert.add_argument("--frame-duration", type=int, default=None, metavar="MS",
+                         help=f"frame duration for sources without timing, e.g. HEIC sequences "
+                              f"(default: {core.DEFAULT_FRAME_DURATION})")
+    convert.add_argument("--cache", action="store_true",
+                         help="reuse earlier outputs of identical conversions (same source bytes and options)")
+    convert.add_argument("--cache-dir", default=None, help=f"cache location (default: {default_cache_dir()})")
+    convert.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE // 2**20, metavar="MB",
+                         help="size cap; least recently used outputs are evicted beyond it")
+    convert.add_argument("--cache-link", action="store_true", help="hard link cached outputs instead of copying them")
+    convert.add_argument("--pipeline", action="store_true",
+                         help="read, convert and write different files at the same time (for slow or network "
+                              "file systems); not combined with --memory-limit, --cache or --frames split")
+    convert.add_argument("--io-threads", type=int, default=None, metavar="N",
+                         help="files read and written at once with --pipeline (default: 4)")
+    convert.add_argument("--archive-output", choices=("same", "zip", "tar", "tar.gz", "folder"), default="same",
+                         help="what each input archive is converted into: an archive of the same kind, a ZIP, "
+                              "a TAR, a .tar.gz, or a folder of files (default: same)")
+    convert.add_argument("--dedup", nargs="?", const="skip", choices=dedup.DEDUP_ACTIONS, default=None,
+                         help="find copies and near-copies among the inputs by perceptual hash and convert each "
+                              "picture once; the others are skipped, or with 'link' get a hard link to its output")
+    convert.add_argument("--dedup-threshold", type=int, default=dedup.DEFAULT_THRESHOLD, metavar="BITS",
+                         help=f"bits of each 64-bit hash two files may differ in and still count as the same picture "
+                              f"(default: {dedup.DEFAULT_THRESHOLD}, at most {dedup.MAX_THRESHOLD})")
+    convert.add_argument("--dedup-index", default=None, metavar="PATH",
+                         help=f"where hashes are kept between runs (default: {dedup.INDEX_FILE} in the output "
+                              "directory)")
+    convert.add_argument("--journal", nargs="?", const=True, default=None, metavar="PATH",
+                         help="record every job so an interrupted run can be resumed by running it again "
+                              f"(default path: {journal.JOURNAL_FILE} in the output directory)")
+    convert.add_argument("--verify-journal", action="store_true",
+                         help="with --journal, re-check the checksum of outputs finished earlier before skipping them")
+    convert.add_argument("--dry-run", action="store_true",
+                         help="only estimate the output size, wall time and peak memory: headers are read and a few "
+                              "sources are converted in memory to calibrate; nothing is written")
+    convert.add_argument("--dry-run-samples", type=int, default=estimate.DEFAULT_SAMPLES, metavar="N",
+                         help=f"sources converted to calibrate a dry run (default: {estimate.DEFAULT_SAMPLES})")
+    add_metrics_arguments(convert)
+    convert.add_argument("-q", "--quiet", action="store_true", help="only print the final summary")
+    convert.set_defaults(func=cmd_convert)
+
+    watcher = commands.add_parser("watch", help="convert images as they arrive in a directory")
+    watcher.add_argument("directory", help="directory to watch")
+    watcher.add_argument("-t", "--to", required=True, type=str.upper, choices=formats.output_names(),
+                         help="output format")
+    watcher.add_argument("-o", "--output-dir", help="where to write the results (default: next to each source)")
+    watcher.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: all cores)")
+    watcher.add_argument("-r", "--recursive", action="store_true", help="also watch sub-directories")
+    watcher.add_argument("--suffix", default="_converted", help="appended to each output name (default: _converted)")
+    watcher.add_argument("--overwrite", action="store_true", help="replace outputs that already exist")
+    watcher.add_argument("--settle", type=float, default=watch.DEFAULT_SETTLE, metavar="SECONDS",
+                         help="how long a file must stay unchanged before it is converted (default: 2)")
+    watcher.add_argument("--poll-interval", type=float, default=watch.DEFAULT_POLL_INTERVAL, metavar="SECONDS",
+                         help="directory scan interval where inotify is not available (default: 1)")
+    watcher.add_argument("--state", metavar="PATH",
+                         help=f"index of converted files (default: {watch.STATE_FILE} in the output directory)")
+    add_encoder_arguments(watcher)
+    watcher.add_argument("--max-dimension", type=int, metavar="PX", help="scale outputs down to fit in PX x PX")
+    watcher.add_argument("--memory-limit", type=int, metavar="MB",
+                         help="peak memory per file; larger images are converted in strips")
+    watcher.add_argument("--memory-budget", type=int, metavar="MB",
+                         help="total estimated memory of the conversions running at once; the others wait for room "
+                              "(default: no limit)")
+    watcher.add_argument("--frames", choices=core.FRAME_MODES, default="auto",
+                         help="multi-frame sources: animate, keep the first frame, or split")
+    add_metrics_arguments(watcher)
+    watcher.add_argument("-q", "--quiet", action="store_true", help="do not print each file")
+    watcher.set_defaults(func=cmd_watch)
+
+    service = commands.add_parser("serve", help="serve conversions over HTTP (POST /convert?format=...)")
+    service.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    service.add_argument("--port", type=int, default=None, help="port (default: 8080)")
+    service.add_argument("-j", "--workers", type=int, default=None,
+                         help="worker processes, i.e. conversions at once (default: all cores)")
+    service.add_argument("--queue", type=int, default=None, metavar="N",
+                         help="requests allowed to wait for a worker; more get 503 (default: twice the workers)")
+    service.add_argument("--max-upload", type=int, default=None, metavar="MB",
+                         help="largest accepted upload (default: 100)")
+    service.add_argument("--memory-limit", type=int, metavar="MB",
+                         help="peak memory per conversion; larger images are converted in strips")
+    service.add_argument("--memory-budget", type=int, metavar="MB",
+                         help="total estimated memory of the conversions running at once; requests wait for room "
+                              "(default: no limit)")
+    add_metrics_arguments(service)
+    service.add_argument("-q", "--quiet", action="store_true", help="do not log each request")
+    service.set_defaults(func=cmd_serve)
+
+    cache = commands.add_parser("cache", help="show conversion cache hits, misses and size")
+    cache.add_argument("--cache-dir", default=None, help=f"cache location (default: {default_cache_dir()})")
+    cache.add_argument("--clear", action="store_true", help="delete every entry and reset the counters")
+    cache.set_defaults(func=cmd_cache)
+
+    benchmark = commands.add_parser("bench", help="measure throughput, latency and peak memory per format pair")
+    benchmark.add_argument("--sizes", type=lambda text: [_parse_size(size) for size in text.split(",")],
+                           default=list(bench.DEFAULT_SIZES), help="comma separated WxH list (default: 640x480,1920x1080)")
+    benchmark.add_argument("--modes", type=lambda text: text.split(","), default=list(bench.DEFAULT_MODES),
+                           help="comma separated colour modes (default: RGB,RGBA,L,P,CMYK)")
+    benchmark.add_argument("--inputs", type=lambda text: text.upper().split(","), default=list(bench.INPUT_FORMATS),
+                           help="comma separated input formats (default: all)")
+    benchmark.add_argument("--outputs", type=lambda text: text.upper().split(","), default=list(bench.OUTPUT_FORMATS),
+                           help="comma separated output formats (default: all)")
+    benchmark.add_argument("-n", "--iterations", type=int, default=bench.DEFAULT_ITERATIONS,
+                           help="timed conversions per case, after one warm-up")
+    benchmark.add_argument("-o", "--output", help="write the results to this JSON file")
+    benchmark.add_argument("--compare", metavar="BASELINE", help="JSON file of an earlier run to compare against")
+    benchmark.add_argument("--threshold", type=float, default=bench.DEFAULT_THRESHOLD, metavar="PERCENT",
+                           help="change that counts as a regression (default: 10)")
+    benchmark.add_argument("--no-startup", action="store_true", help="skip the import time measurements")
+    benchmark.add_argument("-q", "--quiet", action="store_true", help="do not print each case")
+    benchmark.set_defaults(func=cmd_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
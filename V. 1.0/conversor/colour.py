@@ -0,0 +1,187 @@
+"""The colour stage of a conversion: alpha flattening and palette quantization.
+
+What each output format stores comes from its codec (conversor.formats). Outputs
+without an alpha channel (JPEG) get transparent pixels composited onto a
+background colour, in one C-level paste with the alpha as mask, instead of having
+the alpha dropped (which shows whatever colour hid under it, often black). GIF
+outputs, and PNG outputs when a quantizer is chosen, are quantized explicitly with
+one of Pillow's quantizers instead of Pillow's implicit (and slowest) conversion on
+save. A palette can also be computed once for a whole batch (build_palette) from
+small decodes of every source, and every file is then mapped onto it.
+"""
+import os
+from collections import namedtuple
+
+DEFAULT_BACKGROUND = (255, 255, 255)
+DEFAULT_QUANTIZER = "octree"
+PALETTE_SAMPLE = 64 # Pixels per side each source contributes to a shared palette
+ALPHA_THRESHOLD = 128 # Pixels less opaque than this become transparent where transparency is all or nothing
+TRANSPARENT_INDEX = 255 # Palette entry kept free for transparent pixels
+
+# Quantizer names -> Pillow's Image.Quantize members. octree is the fastest and keeps
+# transparency; median cut and max coverage are slower but smoother on photographs;
+# libimagequant (if Pillow was built with it) gives the best quality.
+QUANTIZERS = {"octree": "FASTOCTREE", "median": "MEDIANCUT", "maxcoverage": "MAXCOVERAGE",
+              "libimagequant": "LIBIMAGEQUANT"}
+_ALPHA_QUANTIZERS = ("octree", "libimagequant") # The others only take RGB images
+
+# How colours are converted: the background alpha is flattened onto (an RGB tuple), the
+# quantizer name and a shared palette (a list of up to 256 RGB triplets, flattened)
+ColourSettings = namedtuple("ColourSettings", ["background", "quantizer", "palette"], defaults=(None, None, None))
+
+
+def parse_colour(text):
+    """An RGB tuple from a colour name or #rrggbb. Raises ValueError for anything else."""
+    from PIL import ImageColor
+    return ImageColor.getrgb(text)[:3]
+
+
+def quantizer_available(name):
+    if name != "libimagequant":
+        return True
+    from PIL import features
+    return features.check("libimagequant")
+
+
+def has_alpha(img):
+    return "A" in img.mode or img.mode.endswith("a") or "transparency" in img.info
+
+
+def to_mode(img, mode, background=None):
+    """img in mode; transparent pixels are composited onto background when mode has no alpha."""
+    from PIL import Image
+    if img.mode == mode:
+        return img
+    if "A" in mode or not has_alpha(img):
+        return img.convert(mode)
+    rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+    flat = Image.new("RGB", img.size, background or DEFAULT_BACKGROUND)
+    flat.paste(rgba, mask=rgba) # Blends every pixel by its alpha in one pass
+    return flat if mode == "RGB" else flat.convert(mode)
+
+
+def palette_image(palette):
+    """A "P" image carrying palette, as Image.quantize(palette=...) needs."""
+    from PIL import Image
+    holder = Image.new("P", (1, 1))
+    holder.putpalette(palette)
+    return holder
+
+
+def quantize(img, settings=None, binary_alpha=False):
+    """img as a "P" image: mapped onto settings.palette if given, else quantized to 256 colours.
+
+    Transparency is kept in the palette's alpha by the quantizers that support it; with
+    binary_alpha (GIF), a shared palette or the other quantizers, pixels below
+    ALPHA_THRESHOLD become TRANSPARENT_INDEX and the rest are flattened onto the background.
+    """
+    from PIL import Image
+    settings = settings or ColourSettings()
+    method = settings.quantizer or DEFAULT_QUANTIZER
+    transparent = None
+    if has_alpha(img) and (binary_alpha or settings.palette or method not in _ALPHA_QUANTIZERS):
+        rgba = img if img.mode == "RGBA" else img.convert("RGBA")
+        transparent = rgba.getchannel("A").point(lambda alpha: 255 if alpha < ALPHA_THRESHOLD else 0)
+        img = to_mode(rgba, "RGB", settings.background)
+    elif img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if has_alpha(img) else "RGB")
+    if settings.palette:
+        quantized = img.quantize(palette=palette_image(settings.palette))
+    else:
+        colours = 256 if transparent is None else TRANSPARENT_INDEX
+        quantized = img.quantize(colours, method=getattr(Image.Quantize, QUANTIZERS[method]))
+    if transparent is not None and transparent.getbbox():
+        palette = quantized.getpalette()
+        quantized.putpalette(palette + [0] * (768 - len(palette))) # TRANSPARENT_INDEX needs an entry
+        quantized.paste(TRANSPARENT_INDEX, mask=transparent)
+        quantized.info["transparency"] = TRANSPARENT_INDEX
+    return quantized
+
+
+def _quantizes(img, codec, settings):
+    if codec.palette == "required":
+        return settings.palette is not None or img.mode not in codec.modes
+    return codec.palette == "optional" and (settings.palette is not None or (settings.quantizer and img.mode != "P"))
+
+
+def quantize_bytes(mode, output_format, settings=None):
+    """Bytes per pixel convert_colour allocates on top of an image of this mode to quantize it; 0 if it does not.
+
+    Used by the memory estimates (conversor.streaming): Pillow's quantizers copy and
+    index the pixels (9 bytes with the "P" result), mapping onto a shared palette only
+    writes the result (1), and alpha made binary adds an RGB copy and the masks (8).
+    """
+    from PIL import Image
+    from .formats import get
+    settings = settings or ColourSettings()
+    codec = get(output_format)
+    img = Image.new(mode, (1, 1))
+    if (not codec.alpha and has_alpha(img)) or not _quantizes(img, codec, settings):
+        return 0
+    per_pixel = 1 if settings.palette else 9
+    if mode not in ("RGB", "RGBA"):
+        per_pixel += 4 # Converted to RGB(A) first
+    if has_alpha(img) and (codec.palette == "required" or settings.palette or
+                           (settings.quantizer or DEFAULT_QUANTIZER) not in _ALPHA_QUANTIZERS):
+        per_pixel += 8
+    return per_pixel
+
+
+def convert_colour(img, output_format, settings=None):
+    """Returns an image whose colour mode the output format can store, flattened or quantized as settings say.
+
+    settings is a ColourSettings (or None for the defaults: a white background and
+    the octree quantizer for GIF; PNG outputs are only quantized when asked to).
+    """
+    from .formats import get
+    settings = settings or ColourSettings()
+    codec = get(output_format)
+    if not codec.alpha and has_alpha(img):
+        return to_mode(img, "RGB", settings.background)
+    if _quantizes(img, codec, settings):
+        return quantize(img, settings, binary_alpha=codec.palette == "required")
+    if img.mode not in codec.modes:
+        # Exotic modes (and e.g. CMYK, which few formats store) become RGB, or RGBA to keep their alpha
+        return img.convert("RGBA" if has_alpha(img) else "RGB")
+    return img
+
+
+def _sample(path, background):
+    from PIL import Image
+    from . import core
+    with core.open_image(path) as img:
+        img.draft("RGB", (PALETTE_SAMPLE, PALETTE_SAMPLE)) # JPEGs decode at 1/8 scale or less
+        img.thumbnail((PALETTE_SAMPLE, PALETTE_SAMPLE), Image.Resampling.NEAREST)
+        img = to_mode(img, "RGB", background)
+        return img.copy() # The sample outlives the file: closing it would close img too
+
+
+def build_palette(sources, settings=None, workers=None):
+    """One palette (flattened RGB triplets) for all sources, from a small decode of each.
+
+    Unreadable sources are left out; returns None if none could be read. Sources are
+    sampled on threads, as Pillow releases the GIL while decoding.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from PIL import Image
+    settings = settings or ColourSettings()
+
+    def sample(path):
+        try:
+            return _sample(path, settings.background)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as executor:
+        samples = [img for img in executor.map(sample, sources) if img is not None]
+    if not samples:
+        return None
+    columns = max(1, int(len(samples) ** 0.5))
+    rows = -(-len(samples) // columns)
+    mosaic = Image.new("RGB", (columns * PALETTE_SAMPLE, rows * PALETTE_SAMPLE), settings.background or
+                       DEFAULT_BACKGROUND)
+    for index, img in enumerate(samples):
+        mosaic.paste(img, ((index % columns) * PALETTE_SAMPLE, (index // columns) * PALETTE_SAMPLE))
+    quantized = quantize(mosaic, settings._replace(palette=None))
+    palette = quantized.getpalette()[:3 * TRANSPARENT_INDEX]
+    return palette + palette[:3] * (256 - len(palette) // 3) # Padding repeats the first colour, never black
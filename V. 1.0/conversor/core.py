@@ -0,0 +1,328 @@
+"""GUI-free conversion core: open -> mode-normalize -> save, shared by the app and the CLI."""
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from itertools import accumulate
+
+from . import formats
+
+# Pillow and pillow_heif are imported on first use, so importing the core (and starting
+# the command line) stays fast and the HEIF plugin is only loaded once a HEIF file is seen
+
+# The formats registered in conversor.formats when the core is imported
+OUTPUT_FORMATS = formats.output_names()
+INPUT_EXTENSIONS = formats.input_extensions()
+
+# What to do with multi-frame sources (see conversor.frames): animate when the output allows
+# it, keep the first frame only, or write one file per frame
+FRAME_MODES = ("auto", "first", "split")
+DEFAULT_FRAME_DURATION = 100 # Milliseconds, for sources without timing (HEIC sequences)
+
+_heif_registered = False
+_plugins_loaded = False
+
+# Pipeline stages in order, with the share of the progress bar each one covers
+STAGES = (("open", 0.05), ("decode", 0.40), ("convert", 0.10), ("encode", 0.40), ("write", 0.05))
+# Fraction of the whole conversion that is done once each stage finishes
+_STAGE_END = {stage: round(end, 4) for (stage, _), end in zip(STAGES, accumulate(weight for _, weight in STAGES))}
+
+# Result of converting one file. status is "ok", "skipped", "failed" or "linked" (a duplicate
+# given a link to the output of its original, see conversor.dedup);
+# cached is True when the output was taken from the conversion cache;
+# stages maps each stage name to the seconds spent in it (see conversor.metrics).
+ConversionResult = namedtuple("ConversionResult",
+                              ["source", "destination", "status", "error", "seconds", "cached", "stages"],
+                              defaults=(False, None))
+
+
+def pil_format(output_format):
+    """Returns the format name Pillow expects for a user-facing format (JPG -> JPEG, HEIC -> HEIF)."""
+    return formats.get(output_format).pil_format
+
+
+def detected_format(img, path):
+    """Returns the display name of an opened image's format."""
+    if img.format:
+        return img.format.upper()
+    codec = formats.for_path(path)
+    return codec.names[0] if codec else "UNKNOWN"
+
+
+def register_heif():
+    """Registers the HEIF opener for Pillow so HEIC/HEIF files open like any other image. Idempotent."""
+    global _heif_registered
+    if not _heif_registered:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+        _heif_registered = True
+
+
+def load_plugins(source=None):
+    """Loads the Pillow plugin source's format needs (by its extension), or with no source every registered one."""
+    global _plugins_loaded
+    if source is not None:
+        codec = formats.for_path(source)
+        if codec is not None:
+            formats.load_plugin(codec)
+        return
+    for codec in formats.registered():
+        formats.load_plugin(codec)
+    _plugins_loaded = True
+
+
+def open_image(path):
+    """Opens an image without decoding its pixels (Pillow decodes on first access).
+
+    The plugin a format needs (HEIF) is loaded for files with its extension, and every
+    plugin for a file Pillow cannot identify without them (e.g. a HEIC upload without an extension).
+    """
+    from PIL import Image, UnidentifiedImageError
+    load_plugins(str(path))
+    try:
+        return Image.open(path)
+    except UnidentifiedImageError:
+        if _plugins_loaded:
+            raise
+        load_plugins()
+        return Image.open(path)
+
+
+def normalize_mode(img, output_format, colour=None):
+    """Returns an image whose colour mode the output format can store (see conversor.colour).
+
+    colour is a conversor.colour.ColourSettings (or None for the defaults).
+    """
+    from .colour import convert_colour
+    return convert_colour(img, output_format, colour)
+
+
+def stage_reporter(progress):
+    """Wraps a progress(stage, fraction_done) callback into a function called with each finished stage."""
+    if progress is None:
+        return lambda stage: None
+    return lambda stage: progress(stage, _STAGE_END[stage])
+
+
+def save_options(output_format, encoder=None):
+    """Keyword arguments for Pillow's save() under encoder, a conversor.presets.EncoderSettings (or None)."""
+    if encoder is None:
+        return {} # Pillow's defaults, without importing the presets
+    from .presets import encoder_options
+    return encoder_options(output_format, encoder)
+
+
+def encode_image(img, output_format, encoder=None):
+    """Encodes an image in memory and returns the BytesIO holding the file contents.
+
+    With an encoder target_size, searches for the highest quality that fits it (see conversor.presets).
+    """
+    if encoder is not None and encoder.target_size:
+        from .presets import encode_to_size
+        return encode_to_size(img, output_format, encoder.target_size, encoder)
+    buffer = io.BytesIO()
+    img.save(buffer, format=pil_format(output_format), **save_options(output_format, encoder))
+    return buffer
+
+
+def encoder_settings(preset=None, quality=None, target_size=None):
+    """Bundles the encoder keyword arguments of save_image/convert_file, or None when all are defaults."""
+    if preset is None and quality is None and target_size is None:
+        return None
+    from .presets import EncoderSettings
+    return EncoderSettings(preset, quality, target_size)
+
+
+def colour_settings(background=None, quantizer=None, palette=None):
+    """Bundles the colour keyword arguments of save_image/convert_file, or None when all are defaults."""
+    if background is None and quantizer is None and palette is None:
+        return None
+    from .colour import ColourSettings
+    return ColourSettings(background, quantizer, palette)
+
+
+@contextmanager
+def atomic_output(destination):
+    """Yields a temporary path next to destination, renamed over it once the block succeeds.
+
+    Nobody (a viewer, a watcher, a resumed batch) ever finds a half-written output, even after a crash.
+    """
+    folder, name = os.path.split(destination)
+    temp_path = os.path.join(folder, f".{name}.{os.getpid()}-{threading.get_ident()}.part")
+    try:
+        yield temp_path
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_output(destination, buffer):
+    """Writes an encoded BytesIO to a path (atomically) or a binary file object, without copying its contents."""
+    if hasattr(destination, "write"):
+        destination.write(buffer.getbuffer())
+        return
+    with atomic_output(destination) as temp_path, open(temp_path, "wb") as f:
+        f.write(buffer.getbuffer())
+
+
+def save_image(img, destination, output_format, progress=None, frames="auto", frame_step=1, default_duration=None,
+               max_dimension=None, quality=None, preset=None, target_size=None, background=None, quantizer=None,
+               palette=None):
+    """Decodes, mode-normalizes, encodes and writes an opened image, reporting each stage to progress.
+
+    Multi-frame sources follow `frames` (see conversor.frames.FRAME_MODES): "auto" keeps the
+    animation when the output format supports one, "first" keeps only the first frame and
+    "split" writes one file per frame. frame_step keeps every n-th frame.
+    max_dimension, if given, scales the output to fit in that many pixels, decoding at
+    reduced resolution where the format allows (see conversor.thumbnails).
+    preset names a set of encoder options (see conversor.presets.PRESETS) and quality, if
+    given, overrides its JPEG/WEBP quality (1-100). target_size (bytes) instead searches
+    for the highest JPEG/WEBP quality whose output fits.
+    background (an RGB tuple) is what transparent pixels are flattened onto for JPEG;
+    quantizer (see conversor.colour.QUANTIZERS) and palette, a shared palette from
+    conversor.colour.build_palette, control GIF and palette PNG outputs.
+    """
+    from . import frames as frames_module
+    formats.load_plugin(formats.get(output_format)) # e.g. HEIC outputs are written by the HEIF plugin
+    report = stage_reporter(progress)
+    encoder = encoder_settings(preset, quality, target_size)
+    colour = colour_settings(background, quantizer, palette)
+    if frames != "first" and frames_module.is_multi_frame(img):
+        if frames == "split":
+            frames_module.save_frames(img, destination, output_format, frame_step, progress=progress,
+                                      max_dimension=max_dimension, encoder=encoder, colour=colour)
+            report("write")
+            return
+        if formats.get(output_format).animation:
+            buffer = frames_module.encode_animation(img, output_format, frame_step,
+                                                    default_duration or frames_module.DEFAULT_FRAME_DURATION,
+                                                    max_dimension=max_dimension, encoder=encoder, colour=colour)
+            report("encode")
+            write_output(destination, buffer)
+            report("write")
+            return
+
+    if max_dimension:
+        from . import thumbnails
+        img = thumbnails.decode_reduced(img, max_dimension)
+    img.load()
+    report("decode")
+    img_to_save = normalize_mode(img, output_format, colour)
+    report("convert")
+    buffer = encode_image(img_to_save, output_format, encoder)
+    report("encode")
+    write_output(destination, buffer)
+    report("write")
+
+
+def transcode(source, data, output_format, options):
+    """Converts the encoded bytes of an image in memory; returns (output bytes, stage timings, error text or None).
+
+    source only names the image (its extension tells which plugin is needed); nothing
+    touches the file system, so this runs in worker processes fed with data read elsewhere.
+    options (frames, max_dimension, preset, ...) are passed on to save_image.
+    """
+    from .metrics import StageTimer
+    timer = StageTimer()
+    load_plugins(source)
+    output = io.BytesIO()
+    try:
+        with open_image(io.BytesIO(data)) as img:
+            stage_reporter(timer)("open")
+            save_image(img, output, output_format, progress=timer, **options)
+    except Exception as e:
+        return None, timer.stages, f"{type(e).__name__}: {e}"
+    return output.getvalue(), timer.stages, None
+
+
+def output_path_for(source, output_format, output_dir=None, suffix="_converted"):
+    """Builds the output path for a source file: <name><suffix>.<ext> in output_dir (or next to it)."""
+    name = os.path.splitext(os.path.basename(source))[0]
+    folder = output_dir if output_dir is not None else os.path.dirname(source)
+    return os.path.join(folder, f"{name}{suffix}.{output_format.lower()}")
+
+
+def _needs_streaming(source, output_format, memory_limit, frames, max_dimension, colour):
+    from . import probe, streaming
+    info = probe.probe_image(source)
+    if max_dimension:
+        return False # Downscaled outputs are decoded at reduced size instead
+    if info.n_frames > 1 and frames != "first":
+        return False # Animations go through conversor.frames, one frame at a time
+    return streaming.estimate_peak(info.size, info.mode, output_format, colour) > memory_limit
+
+
+def _output_exists(destination, frames):
+    from .frames import frame_path
+    return os.path.exists(destination) or (frames == "split" and os.path.exists(frame_path(destination, 1)))
+
+
+def convert_file(source, destination, output_format, overwrite=False, progress=None, memory_limit=None,
+                 frames="auto", frame_step=1, default_duration=None, max_dimension=None, quality=None, preset=None,
+                 target_size=None, background=None, quantizer=None, palette=None, cache=None, reencode=False):
+    """Converts one file on disk. Never raises: errors are reported in the returned ConversionResult.
+
+    progress, if given, is called as progress(stage, fraction_done) after each stage in STAGES.
+    memory_limit (bytes), if given, switches images whose normal conversion would need more
+    than that to the strip-wise path in conversor.streaming.
+    frames, frame_step, default_duration, max_dimension, quality, preset, target_size,
+    background, quantizer and palette are passed on to save_image.
+    cache, a conversor.cache.ConversionCache, answers repeated conversions without decoding.
+    A source already in the output format is copied instead of re-encoded when nothing
+    else changes (see conversor.passthrough), unless reencode is True.
+    The time spent in each stage is returned in the result's stages.
+    """
+    from .metrics import StageTimer
+    start = time.perf_counter()
+    progress = StageTimer(progress)
+    if not overwrite and _output_exists(destination, frames):
+        return ConversionResult(source, destination, "skipped", "output already exists", 0.0)
+    try:
+        folder = os.path.dirname(destination)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        encoder = encoder_settings(preset, quality, target_size)
+        colour = colour_settings(background, quantizer, palette)
+        if not reencode:
+            from . import passthrough
+            if passthrough.can_copy(source, output_format, frames, frame_step, max_dimension, encoder, colour):
+                passthrough.copy_file(source, destination)
+                progress.mark("copy")
+                stage_reporter(progress)("write")
+                return ConversionResult(source, destination, "ok", None, time.perf_counter() - start,
+                                        stages=progress.stages)
+        cache_key = None
+        if cache is not None and frames != "split":
+            params = {"frames": frames, "frame_step": frame_step, "default_duration": default_duration,
+                      "max_dimension": max_dimension, "quality": quality, "preset": preset,
+                      "target_size": target_size, "background": background, "quantizer": quantizer,
+                      "palette": palette}
+            cache_key = cache.key_for(source, output_format, params)
+            if cache.fetch(cache_key, destination):
+                stage_reporter(progress)("write")
+                return ConversionResult(source, destination, "ok", None, time.perf_counter() - start, True,
+                                        progress.stages)
+            progress.mark("cache_lookup")
+
+        if memory_limit and _needs_streaming(source, output_format, memory_limit, frames, max_dimension, colour):
+            from . import streaming
+            streaming.convert_streaming(source, destination, output_format, memory_limit, progress=progress,
+                                        encoder=encoder, colour=colour)
+        else:
+            with open_image(source) as img:
+                stage_reporter(progress)("open")
+                save_image(img, destination, output_format, progress=progress, frames=frames,
+                           frame_step=frame_step, default_duration=default_duration, max_dimension=max_dimension,
+                           quality=quality, preset=preset, target_size=target_size, background=background,
+                           quantizer=quantizer, palette=palette)
+        if cache_key is not None:
+            cache.store(cache_key, destination)
+            progress.mark("cache_store")
+    except Exception as e:
+        return ConversionResult(source, destination, "failed", f"{type(e).__name__}: {e}", time.perf_counter() - start,
+                                stages=progress.stages)
+    return ConversionResult(source, destination, "ok", None, time.perf_counter() - start, stages=progress.stages)
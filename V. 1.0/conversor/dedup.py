@@ -0,0 +1,297 @@
+"""Skip (or link) inputs that are copies or near-copies of another input, by perceptual hash.
+
+Phone backups hold the same photo many times: exported, re-shared at another size or
+quality, slightly edited. Each input gets a fingerprint of a small, upright decode
+(JPEGs and HEICs decode at reduced size, see conversor.thumbnails): two 64-bit
+difference hashes (dHash) of its greyscale, one across rows and one down columns,
+and its mean colour. Inputs whose hashes each differ in at most `threshold` bits and
+whose colours are close are treated as one image: the first is converted and the
+others are skipped, or get a link to its output. Images with almost no detail (solid
+colours, smooth gradients) all hash alike, so they are never matched. Fingerprints
+are kept in a SQLite index keyed by path, size and mtime, so later runs only hash new
+files, and outputs of earlier runs also count as originals. Candidates are found
+through bands of the row hash (two hashes within t bits agree exactly on at least one
+of t + 1 bands), not by comparing every pair.
+"""
+import os
+import shutil
+import sqlite3
+import time
+from collections import namedtuple
+
+from . import core
+
+INDEX_FILE = ".conversor-dedup.sqlite"
+DEFAULT_THRESHOLD = 4 # Differing bits (of each 64-bit hash) still counted as the same picture
+MAX_THRESHOLD = 16
+DEDUP_ACTIONS = ("skip", "link")
+
+_HASH_SIZE = 8 # 8 x 8 differences: 64 bits
+_DECODE_SIZE = 64 # Decoded at most this large before hashing
+MIN_DETAIL_BITS = 8 # Fingerprints with less detail than this never match anything (see matchable)
+COLOUR_TOLERANCE = 32 # Largest difference of a mean colour channel (0-255) between two copies
+
+# What an image is compared by: the dHash across rows and down columns, and the mean RGB colour
+Fingerprint = namedtuple("Fingerprint", ["rows", "columns", "colour"])
+
+
+def _dhash(pixels, stride, step):
+    # 64 bits, one per pair of neighbours `step` bytes apart in rows of `stride` bytes: is the first brighter?
+    bits = 0
+    for row in range(_HASH_SIZE):
+        for column in range(_HASH_SIZE):
+            index = row * stride + column
+            bits = bits << 1 | (pixels[index] > pixels[index + step])
+    return bits
+
+
+def perceptual_hash(path):
+    """The Fingerprint of an image file."""
+    from PIL import Image, ImageOps, ImageStat
+    from .thumbnails import decode_reduced
+    with core.open_image(path) as img:
+        small = decode_reduced(img, _DECODE_SIZE, resample=Image.Resampling.BILINEAR)
+        small = ImageOps.exif_transpose(small) # Rotated exports of a photo hash like the original
+        small = small.convert("RGB")
+        grey = small.convert("L")
+        across = grey.resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BOX).tobytes()
+        down = grey.resize((_HASH_SIZE, _HASH_SIZE + 1), Image.Resampling.BOX).tobytes()
+        colour = tuple(round(value) for value in ImageStat.Stat(small).mean)
+    return Fingerprint(_dhash(across, _HASH_SIZE + 1, 1), _dhash(down, _HASH_SIZE, _HASH_SIZE), colour)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def matchable(fingerprint):
+    """False for images with too little detail to tell apart (solid colours, smooth gradients).
+
+    The detail of a hash is the rarer of its bit values: a flat image sets no bits and
+    a gradient sets (nearly) all of them, both the same for any such image.
+    """
+    detail = sum(min(hamming(value, 0), 64 - hamming(value, 0)) for value in (fingerprint.rows, fingerprint.columns))
+    return detail >= MIN_DETAIL_BITS
+
+
+def same_picture(a, b, threshold=DEFAULT_THRESHOLD):
+    """True if two fingerprints are copies of one picture: both hashes within threshold bits, colours close."""
+    return (matchable(a) and matchable(b) and hamming(a.rows, b.rows) <= threshold
+            and hamming(a.columns, b.columns) <= threshold
+            and max(abs(x - y) for x, y in zip(a.colour, b.colour)) <= COLOUR_TOLERANCE)
+
+
+def _encode(fingerprint):
+    return f"{fingerprint.rows:016x}{fingerprint.columns:016x}" + "".join(f"{c:02x}" for c in fingerprint.colour)
+
+
+def _decode(text):
+    """The Fingerprint stored as text, or None for the bare row hashes older indexes kept."""
+    if len(text) != 38:
+        return None
+    return Fingerprint(int(text[:16], 16), int(text[16:32], 16), tuple(int(text[i:i + 2], 16) for i in (32, 34, 36)))
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _Bands:
+    """Fingerprints bucketed by threshold + 1 ranges of their row hash, to find matches without a full scan."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        count = threshold + 1
+        width = 64 // count
+        self._ranges = [(index * width, 64 if index == count - 1 else (index + 1) * width) for index in range(count)]
+        self._buckets = [{} for _ in self._ranges]
+
+    def _keys(self, value):
+        return [(value.rows >> start) & ((1 << (end - start)) - 1) for start, end in self._ranges]
+
+    def add(self, value, item):
+        if not matchable(value):
+            return
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            bucket.setdefault(key, []).append((value, item))
+
+    def nearest(self, value):
+        """The earliest added item whose fingerprint is the same picture as value, or None."""
+        best = None
+        if not matchable(value):
+            return None
+        for bucket, key in zip(self._buckets, self._keys(value)):
+            for other, item in bucket.get(key, ()):
+                if same_picture(value, other, self.threshold) and (best is None or item[0] < best[0]):
+                    best = item
+        return best
+
+
+class DedupIndex:
+    """SQLite index of perceptual hashes (path, size, mtime -> hash) and of the outputs converted from them."""
+
+    def __init__(self, path):
+        self.path = path
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS images (path TEXT PRIMARY KEY, size INTEGER,"
+                             " mtime_ns INTEGER, hash TEXT, output_format TEXT, destination TEXT)")
+
+    def hashes(self, paths, workers=None):
+        """Fingerprint of each path ({path: Fingerprint}), computed on threads for files not indexed yet.
+
+        Unreadable files are left out.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        found, missing = {}, []
+        for path in paths:
+            try:
+                signature = _signature(path)
+            except OSError:
+                continue
+            row = self._db.execute("SELECT size, mtime_ns, hash FROM images WHERE path = ?",
+                                   (os.path.abspath(path),)).fetchone()
+            if row is not None and tuple(row[:2]) == signature and _decode(row[2]) is not None:
+                found[path] = _decode(row[2])
+            else:
+                missing.append((path, signature))
+
+        def compute(path):
+            try:
+                return perceptual_hash(path)
+            except Exception:
+                return None
+
+        # Pillow releases the GIL while decoding, so threads hash several files at once
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            computed = list(executor.map(compute, [path for path, _ in missing]))
+        with self._db:
+            for (path, signature), value in zip(missing, computed):
+                if value is None:
+                    continue
+                found[path] = value
+                self._db.execute("INSERT OR REPLACE INTO images (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                                 (os.path.abspath(path), *signature, _encode(value)))
+        return found
+
+    def earlier_outputs(self, output_format):
+        """(source, Fingerprint, destination) of sources converted to output_format by earlier runs.
+
+        Only those whose output remains, and hashed by this version of the index.
+        """
+        rows = self._db.execute("SELECT path, hash, destination FROM images WHERE output_format = ?"
+                                " AND destination IS NOT NULL", (core.pil_format(output_format),))
+        return [(path, _decode(value), destination) for path, value, destination in rows
+                if _decode(value) is not None and os.path.isfile(destination)]
+
+    def record_output(self, source, output_format, destination):
+        with self._db:
+            self._db.execute("UPDATE images SET output_format = ?, destination = ? WHERE path = ?",
+                             (core.pil_format(output_format), os.path.abspath(destination), os.path.abspath(source)))
+
+    def find_duplicates(self, jobs, threshold=DEFAULT_THRESHOLD, workers=None):
+        """Maps the index of each duplicate job to (original source, original destination, original job index or None).
+
+        The original is a source within threshold bits that an earlier run converted and
+        whose output is still there (job index None), or else the earliest such job.
+        """
+        hashes = self.hashes([job.source for job in jobs], workers)
+        in_batch = {os.path.abspath(job.source) for job in jobs}
+        by_format = {} # Output format -> _Bands of the originals converted to it
+        duplicates = {}
+        for index, job in enumerate(jobs):
+            value = hashes.get(job.source)
+            if value is None:
+                continue # Not hashable: converted (and reported) as usual
+            output_format = core.pil_format(job.output_format)
+            if output_format not in by_format:
+                by_format[output_format] = _Bands(threshold)
+                earlier = [entry for entry in self.earlier_outputs(output_format) if entry[0] not in in_batch]
+                for order, (source, other, destination) in enumerate(earlier):
+                    by_format[output_format].add(other, (order - len(earlier), source, destination, None))
+            bands = by_format[output_format]
+            match = bands.nearest(value)
+            if match is not None:
+                duplicates[index] = match[1:]
+            else:
+                bands.add(value, (index, job.source, job.destination, index))
+        return duplicates
+
+    def run(self, jobs, runner, threshold=DEFAULT_THRESHOLD, action="skip", progress=None, **options):
+        """Runs runner (batch.run_batch, pipeline.run_pipeline, ...) on the jobs that are not duplicates.
+
+        Duplicates are reported as skipped, or with action="link" get a hard link (or a
+        copy, across file systems) of their original's output once it exists and are
+        reported as "linked". Returns results in job order.
+        """
+        duplicates = self.find_duplicates(jobs, threshold, options.get("workers"))
+        remaining = [index for index in range(len(jobs)) if index not in duplicates]
+        done = 0
+
+        def report(result):
+            nonlocal done
+            done += 1
+            if progress:
+                progress(done, len(jobs), result)
+
+        results = [None] * len(jobs)
+        converted = runner([jobs[index] for index in remaining],
+                           progress=lambda _done, _total, result: report(result), **options)
+        for index, result in zip(remaining, converted):
+            results[index] = result
+            if result.status == "ok" and os.path.isfile(result.destination):
+                self.record_output(result.source, jobs[index].output_format, result.destination)
+
+        for index, (source, destination, original) in sorted(duplicates.items()):
+            job = jobs[index]
+            results[index] = self._resolve(job, source, destination,
+                                           results[original] if original is not None else None, action,
+                                           options.get("overwrite"))
+            if options.get("metrics"):
+                options["metrics"].observe(results[index], job.output_format) # The runner never saw them
+            report(results[index])
+        return results
+
+    def _resolve(self, job, source, destination, original_result, action, overwrite):
+        error = f"duplicate of {source}"
+        if action != "link":
+            return core.ConversionResult(job.source, job.destination, "skipped", error, 0.0)
+        if (original_result is not None and original_result.status == "failed") or not os.path.isfile(destination):
+            return core.ConversionResult(job.source, job.destination, "skipped", f"{error}, which has no output", 0.0)
+        if not overwrite and os.path.exists(job.destination):
+            return core.ConversionResult(job.source, job.destination, "skipped", "output already exists", 0.0)
+        start = time.perf_counter()
+        try:
+            link_or_copy(destination, job.destination)
+        except OSError as e:
+            return core.ConversionResult(job.source, job.destination, "failed", f"{type(e).__name__}: {e}",
+                                         time.perf_counter() - start)
+        return core.ConversionResult(job.source, job.destination, "linked", None, time.perf_counter() - start,
+                                     stages={"link": time.perf_counter() - start})
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def link_or_copy(source, destination):
+    """Hard links source at destination (atomically), copying instead across file systems."""
+    folder = os.path.dirname(destination)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return
+    with core.atomic_output(destination) as temp_path:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            shutil.copyfile(source, temp_path) # Different file system (or no hard links there)
@@ -0,0 +1,154 @@
+"""Dry-run planning: how much disk, time and memory a batch will take, without converting it.
+
+Every source's header is probed (no pixels are decoded) and a few sources per input
+format are really converted, in memory, to calibrate that format's output bytes per
+pixel and decoded pixels per second on this machine. The calibration is then applied
+to every job: output sizes are summed, the estimated conversion times are scheduled
+longest first on the workers to give a wall time, and the peaks of the largest jobs
+that can run at once (see conversor.admission) give the peak memory. Nothing is written.
+"""
+import heapq
+import os
+import time
+from collections import namedtuple
+
+from . import core, formats
+
+DEFAULT_SAMPLES = 8 # Real conversions spent calibrating, spread over the input formats
+
+# Calibration of one input format: output bytes per output pixel, decoded pixels
+# converted per second (on one core) and the number of sample conversions behind them
+Calibration = namedtuple("Calibration", ["bytes_per_pixel", "pixels_per_second", "samples"])
+
+# What dry_run found: job counts (to convert, copied as they are, skipped because the
+# output exists, unreadable), the estimated output bytes, conversion seconds summed over
+# jobs and wall seconds on `workers` processes, the peak memory (bytes) and the
+# calibration per input format
+Estimate = namedtuple("Estimate", ["jobs", "converted", "copied", "skipped", "unreadable", "output_bytes",
+                                   "cpu_seconds", "wall_seconds", "peak_memory", "workers", "calibration"])
+
+# A job planned from its header: decoded and output pixels (every frame kept counts)
+_Planned = namedtuple("_Planned", ["job", "info", "pixels", "output_pixels"])
+
+
+def _frames_kept(info, output_format, frames, frame_step):
+    if info.n_frames <= 1 or frames == "first":
+        return 1
+    if frames != "split" and not formats.get(output_format).animation:
+        return 1 # Only the first frame is written
+    return -(-info.n_frames // frame_step)
+
+
+def plan_job(info, output_format, frames="auto", frame_step=1, max_dimension=None):
+    """(decoded pixels, output pixels) of converting a probed source (a probe.ImageProbe)."""
+    from .thumbnails import fitted_size
+    kept = _frames_kept(info, output_format, frames, frame_step)
+    width, height = fitted_size(info.size, max_dimension) if max_dimension else info.size
+    return info.size[0] * info.size[1] * kept, width * height * kept
+
+
+def _pick_samples(planned, count):
+    """Up to count jobs, shared round robin between input formats; each format's picks are spread over its sizes."""
+    groups = {}
+    for item in sorted(planned, key=lambda item: item.pixels):
+        groups.setdefault(item.info.format, []).append(item)
+    share = {name: 0 for name in groups}
+    remaining = count
+    while remaining > 0 and any(share[name] < len(items) for name, items in groups.items()):
+        for name, items in groups.items():
+            if remaining > 0 and share[name] < len(items):
+                share[name] += 1
+                remaining -= 1
+    picks = []
+    for name, items in groups.items():
+        n = share[name]
+        picks += [items[(2 * index + 1) * len(items) // (2 * n)] for index in range(n)] # The middle of n equal slices
+    return picks
+
+
+def calibrate(samples, output_format, options):
+    """Converts each sample in memory; returns {input format: Calibration} for the formats with a successful one."""
+    totals = {} # Input format -> [output bytes, output pixels, decoded pixels, seconds, samples]
+    for item in samples:
+        with open(item.job.source, "rb") as f:
+            data = f.read()
+        start = time.perf_counter()
+        output, _, error = core.transcode(item.job.source, data, output_format, options)
+        seconds = time.perf_counter() - start
+        if error is not None:
+            continue # It will most likely fail for real too; other samples calibrate its format
+        total = totals.setdefault(item.info.format, [0, 0, 0, 0.0, 0])
+        for index, value in enumerate((len(output), item.output_pixels, item.pixels, seconds, 1)):
+            total[index] += value
+    return {name: Calibration(out_bytes / max(out_pixels, 1), pixels / max(seconds, 1e-9), count)
+            for name, (out_bytes, out_pixels, pixels, seconds, count) in totals.items()}
+
+
+def _pooled(calibration):
+    """One calibration for input formats without a successful sample: the others weighted by their samples."""
+    count = sum(item.samples for item in calibration.values())
+    return Calibration(sum(item.bytes_per_pixel * item.samples for item in calibration.values()) / count,
+                       sum(item.pixels_per_second * item.samples for item in calibration.values()) / count, 0)
+
+
+def wall_time(seconds, workers):
+    """Time to run jobs of these durations on `workers` processes, each job going to the first free one."""
+    finish = [0.0] * max(1, workers)
+    for duration in sorted(seconds, reverse=True): # Longest first, as a balanced schedule would
+        heapq.heapreplace(finish, finish[0] + duration)
+    return max(finish)
+
+
+def dry_run(jobs, samples=DEFAULT_SAMPLES, workers=None, overwrite=False, reencode=False, memory_limit=None,
+            memory_budget=None, **options):
+    """Estimates converting jobs (batch.ConversionJobs) with convert_file options; returns an Estimate.
+
+    At most `samples` sources are converted (in memory) to calibrate. Raises
+    ValueError when none of them could be converted.
+    """
+    from . import admission, passthrough, probe
+    workers = workers or os.cpu_count() or 1
+    frames, frame_step = options.get("frames", "auto"), options.get("frame_step", 1)
+    encoder = core.encoder_settings(options.get("preset"), options.get("quality"), options.get("target_size"))
+    colour = core.colour_settings(options.get("background"), options.get("quantizer"), options.get("palette"))
+    planned, copied_bytes = [], 0
+    copied = skipped = unreadable = 0
+    for job in jobs:
+        if not overwrite and os.path.exists(job.destination):
+            skipped += 1
+            continue
+        try:
+            info = probe.probe_image(job.source)
+            size = os.path.getsize(job.source)
+        except Exception:
+            unreadable += 1
+            continue
+        if not reencode and passthrough.copies_as_is(info, size, job.output_format, frames, frame_step,
+                                                     options.get("max_dimension"), encoder, colour):
+            copied += 1
+            copied_bytes += size # A copy takes no measurable conversion time
+            continue
+        planned.append(_Planned(job, info, *plan_job(info, job.output_format, frames, frame_step,
+                                                     options.get("max_dimension"))))
+
+    calibration = {}
+    if planned:
+        calibration = calibrate(_pick_samples(planned, samples), planned[0].job.output_format, options)
+        if not calibration:
+            raise ValueError("none of the sampled sources could be converted")
+    fallback = _pooled(calibration) if calibration else None
+    output_bytes, seconds = copied_bytes, []
+    for item in planned:
+        rates = calibration.get(item.info.format, fallback)
+        output_bytes += item.output_pixels * rates.bytes_per_pixel
+        seconds.append(item.pixels / rates.pixels_per_second)
+
+    peak_options = dict(options, overwrite=overwrite, reencode=reencode, memory_limit=memory_limit)
+    peaks = sorted((admission.estimate_job(item.job, peak_options) for item in planned), reverse=True)
+    peak_memory = sum(peaks[:workers])
+    if memory_budget and peaks:
+        peak_memory = min(peak_memory, max(memory_budget, peaks[0])) # Admission holds the rest back
+    # Workers beyond the CPU count share cores rather than add speed
+    parallel = min(workers, os.cpu_count() or workers)
+    return Estimate(len(jobs), len(planned), copied, skipped, unreadable, int(output_bytes), sum(seconds),
+                    wall_time(seconds, parallel), peak_memory, workers, calibration)
@@ -0,0 +1,117 @@
+"""Registry of the image formats the converter reads and writes, and what each of them can store.
+
+Every front end (command line, server, desktop apps, benchmark) and every stage of a
+conversion asks the registry instead of naming formats itself: the output formats
+offered, the input extensions collected, whether an output keeps alpha or animation,
+takes a quality setting or needs a palette, the modes it stores as they are, and the
+fast paths it has. Supporting another format is one register() call. Pillow is only
+imported to check whether a format can actually be written (available()).
+"""
+from collections import namedtuple
+
+# One format. names are the output format names users choose (the first is its label;
+# JPG and JPEG are one codec); pil_format is what Pillow's save() expects; read_formats are
+# the names Pillow gives sources in this format; extensions are the input file extensions.
+# modes are stored without conversion; palette is "required" (GIF), "optional" (PNG,
+# when a quantizer is chosen) or None; lossy formats take a quality (and a target size).
+# fast_paths: "draft" (decodes at reduced size, see conversor.thumbnails), "strips"
+# (encoded strip by strip, see conversor.streaming). plugin loads the Pillow plugin the
+# format needs (None for built-in ones).
+Codec = namedtuple("Codec", ["names", "pil_format", "read_formats", "extensions", "mime_type", "modes", "alpha",
+                             "animation", "lossy", "lossless", "palette", "fast_paths", "plugin"],
+                   defaults=(False, False, False, True, None, (), None))
+
+_CODECS = [] # In registration order: the order front ends list them in
+_BY_NAME = {} # Output names, Pillow format names and read formats -> Codec
+
+
+def register(codec):
+    """Adds a codec (or replaces the one with the same Pillow format) and returns it."""
+    for index, known in enumerate(_CODECS):
+        if known.pil_format == codec.pil_format:
+            _CODECS[index] = codec
+            break
+    else:
+        _CODECS.append(codec)
+    for name in (*codec.names, codec.pil_format, *codec.read_formats):
+        _BY_NAME[name.upper()] = codec
+    return codec
+
+
+def get(name):
+    """The codec of an output format name (JPG, HEIC, ...) or a Pillow format name (JPEG, MPO, HEIF, ...).
+
+    Raises ValueError for unknown formats.
+    """
+    try:
+        return _BY_NAME[name.upper()]
+    except KeyError:
+        raise ValueError(f"unknown image format {name!r}; choose from {', '.join(output_names())}") from None
+
+
+def find(name):
+    """Like get(), but None for unknown formats (e.g. a source Pillow reads but no codec is registered for)."""
+    return _BY_NAME.get((name or "").upper())
+
+
+def registered():
+    return list(_CODECS)
+
+
+def output_names():
+    """Every output format name, in registration order (e.g. for a command-line choice or a menu)."""
+    return [name for codec in _CODECS for name in codec.names]
+
+
+def input_extensions():
+    return tuple(extension for codec in _CODECS for extension in codec.extensions)
+
+
+def for_path(path):
+    """The codec a file's extension says it is in, or None."""
+    path = str(path).lower()
+    for codec in _CODECS:
+        if path.endswith(codec.extensions):
+            return codec
+    return None
+
+
+def load_plugin(codec):
+    if codec.plugin is not None:
+        codec.plugin()
+    return codec
+
+
+def available(name):
+    """True when the installed Pillow (and plugin) can write this output format."""
+    codec = find(name)
+    if codec is None:
+        return False
+    from PIL import Image
+    try:
+        load_plugin(codec)
+    except ImportError:
+        return False
+    Image.init()
+    return codec.pil_format in Image.SAVE
+
+
+def _load_heif():
+    from .core import register_heif
+    register_heif()
+
+
+register(Codec(("JPG", "JPEG"), "JPEG", ("JPEG", "MPO"), (".jpg", ".jpeg"), "image/jpeg", ("RGB", "L", "CMYK"),
+               lossy=True, lossless=False, fast_paths=("draft",)))
+register(Codec(("PNG",), "PNG", ("PNG",), (".png",), "image/png", ("RGB", "RGBA", "L", "P"), alpha=True,
+               palette="optional", fast_paths=("strips",)))
+register(Codec(("GIF",), "GIF", ("GIF",), (".gif",), "image/gif", ("P", "L"), alpha=True, animation=True,
+               palette="required"))
+register(Codec(("WEBP",), "WEBP", ("WEBP",), (".webp",), "image/webp", ("RGB", "RGBA", "L", "P"), alpha=True,
+               animation=True, lossy=True))
+register(Codec(("HEIC",), "HEIF", ("HEIF",), (".heic", ".heif"), "image/heic", ("RGB", "RGBA", "L"), alpha=True,
+               lossy=True, lossless=False, fast_paths=("draft",), plugin=_load_heif))
+register(Codec(("AVIF",), "AVIF", ("AVIF",), (".avif",), "image/avif", ("RGB", "RGBA", "L"), alpha=True,
+               animation=True, lossy=True, lossless=False))
+register(Codec(("TIFF",), "TIFF", ("TIFF",), (".tif", ".tiff"), "image/tiff", ("RGB", "RGBA", "L", "P", "CMYK"),
+               alpha=True))
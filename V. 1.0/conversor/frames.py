@@ -0,0 +1,137 @@
+"""Multi-frame conversion (animated GIF/WEBP, HEIC image sequences), decoding one frame at a time."""
+import io
+import os
+
+from PIL import Image
+
+from . import core, formats
+from .core import DEFAULT_FRAME_DURATION, FRAME_MODES # Defined in the core so the command line need not import Pillow
+from .thumbnails import REDUCING_GAP, fitted_size
+
+
+def frame_count(img):
+    return getattr(img, "n_frames", 1)
+
+
+def is_multi_frame(img):
+    return frame_count(img) > 1
+
+
+def frame_path(destination, number):
+    """Path of the number-th (1-based) file written in "split" mode: photo.png -> photo_0001.png."""
+    stem, ext = os.path.splitext(destination)
+    return f"{stem}_{number:04d}{ext}"
+
+
+def frame_plan(img, step=1, default_duration=DEFAULT_FRAME_DURATION):
+    """Lists (frame_index, duration_ms) for every step-th frame without keeping any frame in memory.
+
+    The durations of skipped frames are added to the kept frame before them, so the
+    subsampled animation plays for as long as the original.
+    """
+    plan = []
+    for index in range(frame_count(img)):
+        img.seek(index)
+        if img.format == "WEBP":
+            img.load() # WEBP only updates a frame's timing once it is decoded
+        duration = img.info.get("duration")
+        if duration is None:
+            duration = default_duration
+        if index % step == 0:
+            plan.append([index, duration])
+        else:
+            plan[-1][1] += duration
+    img.seek(0)
+    return [(index, duration) for index, duration in plan]
+
+
+class FrameSequence(Image.Image):
+    """Seekable image over the planned frames of a source, each decoded and converted only when seeked to.
+
+    Handed to Pillow's save(save_all=True), so animated encoders pull frames one by one
+    instead of receiving a list of fully decoded frames.
+    """
+
+    def __init__(self, source, plan, mode, max_dimension=None, finish=None):
+        super().__init__()
+        self._source = source
+        self._plan = plan
+        self._frame_mode = mode
+        self._max_dimension = max_dimension
+        self._finish = finish # Called on each converted frame, e.g. to quantize it
+        self._current = None
+        self.seek(0)
+
+    @property
+    def n_frames(self):
+        return len(self._plan)
+
+    @property
+    def is_animated(self):
+        return len(self._plan) > 1
+
+    def tell(self):
+        return self._current
+
+    def seek(self, frame):
+        if not 0 <= frame < len(self._plan):
+            raise EOFError("no more frames")
+        if frame == self._current:
+            return
+        index, duration = self._plan[frame]
+        self._source.seek(index)
+        converted = self._source.convert(self._frame_mode)
+        if self._max_dimension:
+            converted = converted.resize(fitted_size(converted.size, self._max_dimension), Image.Resampling.LANCZOS,
+                                         reducing_gap=REDUCING_GAP)
+        if self._finish:
+            converted = self._finish(converted)
+        self.im = converted.im
+        self._mode = converted.mode
+        self._size = converted.size
+        self.info = {"duration": duration}
+        self._current = frame
+
+
+def _animation_mode(img):
+    return "RGBA" if img.has_transparency_data or "A" in img.mode else "RGB"
+
+
+def encode_animation(img, output_format, step=1, default_duration=DEFAULT_FRAME_DURATION, max_dimension=None,
+                     encoder=None, colour=None):
+    """Encodes every step-th frame of img as an animation and returns the BytesIO holding it.
+
+    GIF frames go through the colour stage (conversor.colour) one by one; a shared
+    palette in colour keeps their colours from shifting between frames.
+    """
+    if encoder is not None and encoder.target_size:
+        raise ValueError("a target size is not supported for animations (convert with frames=\"first\")")
+    plan = frame_plan(img, step, default_duration)
+    finish = None
+    if formats.get(output_format).palette == "required":
+        finish = lambda frame: core.normalize_mode(frame, output_format, colour)
+    sequence = FrameSequence(img, plan, _animation_mode(img), max_dimension, finish)
+    buffer = io.BytesIO()
+    sequence.save(buffer, format=core.pil_format(output_format), save_all=True,
+                  duration=[duration for _, duration in plan], loop=img.info.get("loop", 0),
+                  **core.save_options(output_format, encoder))
+    return buffer
+
+
+def save_frames(img, destination, output_format, step=1, progress=None, max_dimension=None, encoder=None,
+                colour=None):
+    """Writes every step-th frame to its own file (see frame_path) and returns the paths written."""
+    written = []
+    plan = frame_plan(img, step)
+    for number, (index, _) in enumerate(plan, start=1):
+        img.seek(index)
+        frame = img
+        if max_dimension:
+            frame = img.resize(fitted_size(img.size, max_dimension), Image.Resampling.LANCZOS, reducing_gap=REDUCING_GAP)
+        path = frame_path(destination, number)
+        frame = core.normalize_mode(frame, output_format, colour)
+        core.write_output(path, core.encode_image(frame, output_format, encoder))
+        written.append(path)
+        if progress:
+            progress("encode", 0.05 + 0.9 * number / len(plan))
+    return written
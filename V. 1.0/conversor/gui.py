@@ -0,0 +1,524 @@
+"""The desktop app's window, shared by the English and Castellano builds.
+
+Each build is a table of the texts it shows (see run()); everything else, from the
+output formats offered to the file types of the open dialogue, comes from the
+conversion core and its codec registry (conversor.formats).
+"""
+import os
+import queue
+import threading
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import filedialog, messagebox
+
+import customtkinter as ctk
+from PIL import UnidentifiedImageError
+
+from . import batch, core, formats, probe, thumbnails
+
+try:
+    from tkinterdnd2 import DND_FILES, TkinterDnD # Optional: lets files be dropped on the window
+except ImportError:
+    TkinterDnD = None
+
+POLL_MS = 50 # How often the window collects the updates sent by the worker threads
+
+
+class ConversionCancelled(Exception):
+    """Raised from the progress callback of a conversion the user cancelled."""
+
+
+def file_types(strings):
+    """The open dialogue's file types: every readable image, then each registered format, then all files."""
+    patterns = [" ".join(f"*{extension}" for extension in codec.extensions) for codec in formats.registered()]
+    names = ["/".join(extension[1:].upper() for extension in codec.extensions) for codec in formats.registered()]
+    return ([(strings["image_files"], " ".join(patterns))] +
+            [(strings["format_files"].format(name=name), pattern) for name, pattern in zip(names, patterns)] +
+            [(strings["all_files"], "*.*")])
+
+
+def writable_formats():
+    """The output formats this Pillow (and its plugins) can write, in the registry's order."""
+    return [name for name in formats.output_names() if formats.available(name)]
+
+
+class ImageConverterApp(ctk.CTk):
+    """The converter window; strings is the build's text table (see run())."""
+
+    def __init__(self, strings):
+        super().__init__()
+        self.strings = strings
+
+        self.title(strings["title"])
+        self.geometry("700x860") # Adjusted for better visualization (room for the queue)
+
+        # --- Theme and Color Configuration (New palette: Blue, Yellow, Green) ---
+        ctk.set_appearance_mode("System")  # Keep system mode as default
+
+        # Custom colors
+        self.custom_primary_color = "#1F6AA5"  # Dark Blue (main background)
+        self.custom_secondary_color = "#FFD700" # Gold Yellow (buttons, borders, accents)
+        self.custom_success_color = "#28A745"   # Green for success/progress
+
+        # Configure main grid
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(0, weight=1) # For the main frame
+
+        # Main frame
+        self.main_frame = ctk.CTkFrame(self, fg_color=self.custom_primary_color) # Main blue background
+        self.main_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        self.main_frame.grid_columnconfigure(0, weight=1) # Central column for elements
+        self.main_frame.grid_rowconfigure(2, weight=1) # The queue takes the spare height
+
+        # --- Manual Selection / Click Area ---
+        self.select_area_frame = ctk.CTkFrame(self.main_frame, height=150, corner_radius=10,
+                                               border_width=3, border_color=self.custom_secondary_color, # Yellow border
+                                               fg_color="#3B8ED0") # Lighter blue for the area
+        self.select_area_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+        self.select_area_frame.grid_columnconfigure(0, weight=1)
+        self.select_area_frame.grid_rowconfigure(0, weight=1)
+
+        self.select_area_label = ctk.CTkLabel(self.select_area_frame, text=strings["select_prompt"],
+                                              font=ctk.CTkFont(size=16, weight="bold"), text_color="white")
+        self.select_area_label.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
+        self.select_area_label.bind("<Button-1>", lambda e: self.select_file()) # A click opens the selector
+
+        # Preview of the last added image (decoded at reduced resolution), shown below the text
+        self.preview_label = ctk.CTkLabel(self.select_area_frame, text="")
+        self.preview_label.grid(row=1, column=0, padx=20, pady=(0, 15))
+        self.preview_label.grid_remove()
+        self.preview_image = None
+
+        # --- Loaded file information ---
+        self.file_info_frame = ctk.CTkFrame(self.main_frame, fg_color=self.custom_primary_color)
+        self.file_info_frame.grid(row=1, column=0, padx=10, pady=10, sticky="ew")
+        self.file_info_frame.grid_columnconfigure(0, weight=1) # Allows the name label to expand
+        self.file_info_frame.grid_columnconfigure(1, weight=0) # Maintains the format label size
+
+        self.file_name_label = ctk.CTkLabel(self.file_info_frame, text=strings["no_file"], font=ctk.CTkFont(size=14),
+                                            text_color="white", wraplength=400, anchor="w") # Increased wraplength and anchor
+        self.file_name_label.grid(row=0, column=0, padx=10, pady=5, sticky="ew") # sticky="ew" to expand
+
+        self.format_detected_label = ctk.CTkLabel(self.file_info_frame, text="", font=ctk.CTkFont(size=14, weight="bold"),
+                                                  text_color=self.custom_secondary_color) # Changed to Yellow!
+        self.format_detected_label.grid(row=0, column=1, padx=10, pady=5, sticky="e")
+
+        # --- Conversion queue: one row per file, with its own progress bar and status ---
+        self.queue_frame = ctk.CTkScrollableFrame(self.main_frame, height=170, fg_color="#3B8ED0",
+                                                  border_width=2, border_color=self.custom_secondary_color)
+        self.queue_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
+        self.queue_frame.grid_columnconfigure(0, weight=1) # File names take the spare width
+
+        # --- Output format selection ---
+        self.conversion_options_frame = ctk.CTkFrame(self.main_frame, fg_color=self.custom_primary_color)
+        self.conversion_options_frame.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
+        self.conversion_options_frame.grid_columnconfigure(0, weight=1)
+        self.conversion_options_frame.grid_columnconfigure(1, weight=1)
+
+        self.output_format_label = ctk.CTkLabel(self.conversion_options_frame, text=strings["convert_to"], font=ctk.CTkFont(size=14), text_color="white")
+        self.output_format_label.grid(row=0, column=0, padx=10, pady=5, sticky="w")
+
+        self.output_formats = writable_formats()
+        self.selected_output_format = ctk.StringVar(value=self.output_formats[0]) # Initial value
+        self.output_format_menu = ctk.CTkOptionMenu(self.conversion_options_frame,
+                                                  values=self.output_formats,
+                                                  variable=self.selected_output_format,
+                                                  state="disabled",
+                                                  button_color=self.custom_secondary_color, # Yellow menu button
+                                                  fg_color=self.custom_secondary_color, # Yellow menu background
+                                                  dropdown_fg_color=self.custom_primary_color, # Blue dropdown menu
+                                                  dropdown_hover_color=self.custom_success_color, # Green hover
+                                                  text_color="black") # Black text for contrast
+        self.output_format_menu.grid(row=0, column=1, padx=10, pady=5, sticky="ew")
+
+        # Optional downscaling: outputs fit in a square of this many pixels
+        self.max_size_label = ctk.CTkLabel(self.conversion_options_frame, text=strings["max_size"], font=ctk.CTkFont(size=14), text_color="white")
+        self.max_size_label.grid(row=1, column=0, padx=10, pady=5, sticky="w")
+
+        self.max_size_options = [strings["original_size"], "3840", "2560", "1920", "1280", "800"]
+        self.selected_max_size = ctk.StringVar(value=self.max_size_options[0])
+        self.max_size_menu = ctk.CTkOptionMenu(self.conversion_options_frame,
+                                               values=self.max_size_options,
+                                               variable=self.selected_max_size,
+                                               state="disabled",
+                                               button_color=self.custom_secondary_color,
+                                               fg_color=self.custom_secondary_color,
+                                               dropdown_fg_color=self.custom_primary_color,
+                                               dropdown_hover_color=self.custom_success_color,
+                                               text_color="black")
+        self.max_size_menu.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+
+        # --- Progress Bar (Styled as "pipeline"): overall progress of the queue ---
+        self.progress_container_frame = ctk.CTkFrame(self.main_frame, fg_color=self.custom_primary_color)
+        self.progress_container_frame.grid(row=4, column=0, padx=10, pady=10, sticky="ew")
+        self.progress_container_frame.grid_columnconfigure(0, weight=1) # For the bar
+        self.progress_container_frame.grid_columnconfigure(1, weight=0) # For the percentage
+
+        self.progress_bar = ctk.CTkProgressBar(self.progress_container_frame,
+                                               height=20,
+                                               corner_radius=5,
+                                               border_width=2,
+                                               border_color=self.custom_secondary_color, # Yellow border for "pipeline"
+                                               fg_color="#404040", # Dark background for the "empty pipeline" (simulates black)
+                                               progress_color=self.custom_success_color) # Green fill
+        self.progress_bar.grid(row=0, column=0, padx=(5, 0), pady=5, sticky="ew") # Right padding for the percentage
+        self.progress_bar.set(0)
+        self.progress_bar.configure(mode="determinate")
+
+        self.progress_percentage_label = ctk.CTkLabel(self.progress_container_frame, text="0%", font=ctk.CTkFont(size=12, weight="bold"), text_color="white")
+        self.progress_percentage_label.grid(row=0, column=1, padx=(5, 5), pady=5, sticky="e") # To the right of the bar
+
+        # --- Action Buttons (Save, Cancel, Clear the queue) ---
+        self.action_buttons_frame = ctk.CTkFrame(self.main_frame, fg_color=self.custom_primary_color)
+        self.action_buttons_frame.grid(row=5, column=0, padx=10, pady=10, sticky="ew")
+        self.action_buttons_frame.grid_columnconfigure(0, weight=2) # The save button is the main action
+        self.action_buttons_frame.grid_columnconfigure((1, 2), weight=1)
+
+        self.save_button = ctk.CTkButton(self.action_buttons_frame, text=strings["save"], command=self.start_save_process, state="disabled",
+                                         fg_color=self.custom_secondary_color, # Yellow button
+                                         hover_color="#E6B800", # Darker yellow on hover
+                                         text_color="black") # Black text
+        self.save_button.grid(row=0, column=0, padx=5, pady=5, sticky="ew")
+
+        self.cancel_button = ctk.CTkButton(self.action_buttons_frame, text=strings["cancel"], command=self.cancel_conversion, state="disabled",
+                                           fg_color="#C0392B", hover_color="#A93226", text_color="white") # Red: stops the queue
+        self.cancel_button.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+
+        self.clear_button = ctk.CTkButton(self.action_buttons_frame, text=strings["clear"], command=self.reset_ui, state="disabled",
+                                          fg_color="#3B8ED0", hover_color="#2F76AE", text_color="white")
+        self.clear_button.grid(row=0, column=2, padx=5, pady=5, sticky="ew")
+
+        # State variables
+        self.queue_items = [] # One dict per queued file: path, probe, row widgets, progress and status
+        self.conversion_in_progress = False
+        self.events = queue.Queue() # Worker threads only put updates here; the Tk thread applies them
+        self.cancel_event = threading.Event()
+        self.executor = None
+        self.futures = {}
+        self.finished_count = 0
+
+        # Names shown next to the percentage for each conversion stage, and in the queue for each file state
+        self.stage_names = strings["stages"]
+        self.status_names = strings["statuses"]
+
+        self.enable_drop()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+    def enable_drop(self):
+        """Accepts files dropped on the selection area when tkinterdnd2 is installed."""
+        if TkinterDnD is None:
+            return
+        try:
+            TkinterDnD._require(self) # Loads the tkdnd extension into this window's Tcl interpreter
+            for widget in (self.select_area_frame, self.select_area_label):
+                widget.drop_target_register(DND_FILES)
+                widget.dnd_bind("<<Drop>>", self.on_drop)
+        except (RuntimeError, AttributeError, tk.TclError):
+            return # tkdnd could not be loaded: clicking still works
+        self.select_area_label.configure(text=self.strings["drop_prompt"])
+
+    def on_drop(self, event):
+        """Adds the dropped files (and the images inside dropped folders) to the queue."""
+        self.add_files(self.tk.splitlist(event.data))
+        return event.action
+
+    def select_file(self):
+        """Opens a dialogue to select one or more image files."""
+        if self.conversion_in_progress:
+            messagebox.showinfo(self.strings["busy_title"], self.strings["busy_wait"])
+            return
+
+        file_paths = filedialog.askopenfilenames(filetypes=file_types(self.strings))
+        if file_paths:
+            self.add_files(file_paths)
+
+    def add_files(self, paths):
+        """Probes each file's header once and adds the images to the queue (folders are searched for images)."""
+        if self.conversion_in_progress:
+            messagebox.showinfo(self.strings["busy_title"], self.strings["busy_wait"])
+            return
+        if any(item["status"] != "queued" for item in self.queue_items):
+            self.reset_ui() # The previous run is over: start a new list
+
+        queued = {item["path"] for item in self.queue_items}
+        rejected = []
+        for path, _ in batch.collect_inputs(paths, recursive=True):
+            path = os.path.normpath(path)
+            if path in queued:
+                continue
+            try:
+                # A single header read gives format, size and mode (HEIC/HEIF included); pixels are decoded on save
+                info = probe.probe_image(path)
+            except UnidentifiedImageError:
+                rejected.append(f"{os.path.basename(path)}: {self.strings['not_an_image']}")
+                continue
+            except Exception as e:
+                rejected.append(f"{os.path.basename(path)}: {e}")
+                continue
+            queued.add(path)
+            self._add_queue_row(path, info)
+
+        if rejected:
+            messagebox.showerror(self.strings["image_error_title"], self.strings["not_added"] + "\n" + "\n".join(rejected[:10]))
+        if not self.queue_items:
+            return
+
+        last = self.queue_items[-1]
+        if len(self.queue_items) == 1:
+            self.file_name_label.configure(text=os.path.basename(last["path"]))
+            self.format_detected_label.configure(text=last["probe"].format, text_color=self.custom_secondary_color)
+        else:
+            self.file_name_label.configure(text=self.strings["files_queued"].format(count=len(self.queue_items)))
+            self.format_detected_label.configure(text="", text_color=self.custom_secondary_color)
+        self.output_format_menu.configure(state="normal")
+        self.max_size_menu.configure(state="normal")
+        self.show_preview(last["path"])
+        # Enable the save button as soon as there is something to convert
+        self.save_button.configure(state="normal")
+        self.clear_button.configure(state="normal")
+        self.progress_bar.set(0) # Reset bar
+        self.progress_percentage_label.configure(text="0%")
+
+    def _add_queue_row(self, path, info):
+        """Adds one file's row to the queue list: name, format, progress bar and status."""
+        row = len(self.queue_items)
+        name_label = ctk.CTkLabel(self.queue_frame, text=os.path.basename(path), text_color="white", anchor="w")
+        name_label.grid(row=row, column=0, padx=(5, 10), pady=2, sticky="ew")
+        format_label = ctk.CTkLabel(self.queue_frame, text=info.format, text_color=self.custom_secondary_color, width=50)
+        format_label.grid(row=row, column=1, padx=5, pady=2)
+        bar = ctk.CTkProgressBar(self.queue_frame, width=120, height=10, fg_color="#404040", progress_color=self.custom_success_color)
+        bar.grid(row=row, column=2, padx=5, pady=2)
+        bar.set(0)
+        status_label = ctk.CTkLabel(self.queue_frame, text=self.status_names["queued"], text_color="white", width=110, anchor="w")
+        status_label.grid(row=row, column=3, padx=(5, 5), pady=2, sticky="w")
+        self.queue_items.append({"path": path, "probe": info, "widgets": (name_label, format_label, bar, status_label),
+                                 "bar": bar, "status_label": status_label, "fraction": 0.0, "status": "queued",
+                                 "destination": None, "error": None})
+
+    def show_preview(self, path):
+        """Shows a small preview decoded at reduced resolution (JPEG draft mode, HEIF thumbnails)."""
+        try:
+            preview = thumbnails.make_preview(path, size=120)
+        except Exception:
+            return # The preview is optional: the file can still be converted
+        self.preview_image = ctk.CTkImage(light_image=preview, dark_image=preview, size=preview.size)
+        self.preview_label.configure(image=self.preview_image)
+        self.preview_label.grid()
+
+    def selected_max_dimension(self):
+        """Returns the chosen maximum output dimension, or None to keep the original size."""
+        value = self.selected_max_size.get()
+        return int(value) if value.isdigit() else None # None keeps the original size
+
+    def reset_ui(self):
+        """Resets the UI elements to their initial state and empties the queue."""
+        for item in self.queue_items:
+            for widget in item["widgets"]:
+                widget.destroy()
+        self.queue_items = []
+        self.file_name_label.configure(text=self.strings["no_file"])
+        self.format_detected_label.configure(text="", text_color=self.custom_secondary_color) # Also resets to yellow
+        self.output_format_menu.configure(state="disabled")
+        self.max_size_menu.configure(state="disabled")
+        self.preview_label.grid_remove() # Hide the preview of the previous image
+        self.preview_image = None
+        self.save_button.configure(state="disabled")
+        self.clear_button.configure(state="disabled")
+        self.progress_bar.set(0)
+        self.progress_percentage_label.configure(text="0%")
+        self.conversion_in_progress = False
+
+
+    def start_save_process(self):
+        """Asks where to save the files and starts converting the queue on a pool of background threads."""
+        if not self.queue_items:
+            messagebox.showwarning(self.strings["warning_title"], self.strings["no_image"])
+            return
+        if self.conversion_in_progress:
+            messagebox.showinfo(self.strings["busy_title"], self.strings["busy_running"])
+            return
+
+        output_format = self.selected_output_format.get()
+        if len(self.queue_items) == 1:
+            save_path = self.ask_save_path(self.queue_items[0]["path"], output_format)
+            if not save_path:
+                messagebox.showinfo(self.strings["cancelled_title"], self.strings["save_cancelled"])
+                return
+            destinations = [save_path]
+            overwrite = True # The save dialogue already asked before replacing a file
+        else:
+            folder = filedialog.askdirectory(title=self.strings["choose_folder"])
+            if not folder:
+                messagebox.showinfo(self.strings["cancelled_title"], self.strings["save_cancelled"])
+                return
+            destinations = batch.unique_destinations([core.output_path_for(item["path"], output_format, folder, self.strings["suffix"])
+                                                      for item in self.queue_items])
+            overwrite = False # Existing files are skipped, never replaced without asking
+
+        self.set_controls_enabled(False)
+        self.progress_bar.set(0)
+        self.progress_percentage_label.configure(text="0%")
+        self.cancel_event = threading.Event()
+        self.events = queue.Queue()
+        self.finished_count = 0
+
+        # Pillow releases the GIL while decoding and encoding, so threads convert several files at once;
+        # they never touch the widgets: every update goes through self.events to the Tk thread
+        max_dimension = self.selected_max_dimension()
+        self.executor = ThreadPoolExecutor(max_workers=min(len(self.queue_items), os.cpu_count() or 1))
+        self.futures = {}
+        for index, (item, destination) in enumerate(zip(self.queue_items, destinations)):
+            item.update(fraction=0.0, status="queued", destination=destination, error=None)
+            self._show_item(index)
+            future = self.executor.submit(self._convert_item, index, item["path"], destination, output_format,
+                                          max_dimension, overwrite)
+            self.futures[future] = index
+        self.after(POLL_MS, self._poll_events)
+
+    def set_controls_enabled(self, enabled):
+        """Enables or disables the controls that must not be used during a conversion."""
+        self.conversion_in_progress = not enabled
+        state = "normal" if enabled else "disabled"
+        self.save_button.configure(state=state)
+        self.clear_button.configure(state=state)
+        self.output_format_menu.configure(state=state)
+        self.max_size_menu.configure(state=state)
+        self.cancel_button.configure(state="disabled" if enabled else "normal")
+        if enabled:
+            self.select_area_label.bind("<Button-1>", lambda e: self.select_file()) # Enable click on selection area
+            self.select_area_frame.configure(border_color=self.custom_secondary_color) # Revert to original color
+        else:
+            self.select_area_label.unbind("<Button-1>") # Disable click on selection area
+            self.select_area_frame.configure(border_color="gray") # Change border color to indicate disabled
+
+    def ask_save_path(self, source_path, output_format):
+        """Opens the native save dialogue and returns the chosen path (empty if cancelled)."""
+        original_name = os.path.splitext(os.path.basename(source_path))[0]
+        suggested_filename = f"{original_name}{self.strings['suffix']}.{output_format.lower()}"
+
+        filetypes_save = [
+            (self.strings["format_files"].format(name=output_format), f"*.{output_format.lower()}"),
+            (self.strings["all_files"], "*.*")
+        ]
+
+        return filedialog.asksaveasfilename(
+            defaultextension=f".{output_format.lower()}",
+            filetypes=filetypes_save,
+            initialfile=suggested_filename
+        )
+
+    def _convert_item(self, index, source, destination, output_format, max_dimension, overwrite):
+        """Converts one queued file (worker thread) and reports each real pipeline stage through self.events."""
+        events, cancel_event = self.events, self.cancel_event
+
+        def report(stage, fraction):
+            # Stopping before "write" never leaves a half-written file behind
+            if stage != "write" and cancel_event.is_set():
+                raise ConversionCancelled()
+            events.put(("progress", index, stage, fraction))
+
+        if cancel_event.is_set():
+            events.put(("done", index, "cancelled", None))
+            return
+        result = core.convert_file(source, destination, output_format, overwrite=overwrite, progress=report,
+                                   max_dimension=max_dimension)
+        status = "cancelled" if result.status == "failed" and cancel_event.is_set() else result.status
+        events.put(("done", index, status, result.error))
+
+    def _poll_events(self):
+        """Applies the updates sent by the worker threads (Tk thread only), then checks again shortly."""
+        try:
+            while True:
+                event = self.events.get_nowait()
+                if event[0] == "progress":
+                    _, index, stage, fraction = event
+                    item = self.queue_items[index]
+                    item["fraction"] = fraction
+                    item["status_label"].configure(text=self.stage_names.get(stage, stage))
+                    item["bar"].set(fraction)
+                else:
+                    _, index, status, error = event
+                    self._finish_item(index, status, error)
+        except queue.Empty:
+            pass
+
+        total = len(self.queue_items)
+        overall = sum(item["fraction"] for item in self.queue_items) / total
+        self.progress_bar.set(overall)
+        self.progress_percentage_label.configure(text=f"{self.finished_count}/{total} {int(overall * 100)}%")
+        if self.finished_count == total:
+            self._on_queue_finished()
+        else:
+            self.after(POLL_MS, self._poll_events)
+
+    def _finish_item(self, index, status, error):
+        """Records how a queued file ended and counts it as finished."""
+        item = self.queue_items[index]
+        if item["status"] != "queued":
+            return # Already counted (e.g. cancelled before it started)
+        item.update(status=status, error=error)
+        if status in ("ok", "skipped"):
+            item["fraction"] = 1.0
+        self.finished_count += 1
+        self._show_item(index)
+
+    def _show_item(self, index):
+        """Shows a queued file's state in its row."""
+        item = self.queue_items[index]
+        colors = {"ok": self.custom_success_color, "failed": "#FF6B6B", "cancelled": "gray"}
+        item["status_label"].configure(text=self.status_names[item["status"]], text_color=colors.get(item["status"], "white"))
+        item["bar"].set(item["fraction"])
+
+    def cancel_conversion(self):
+        """Stops the queue: files not started are dropped, files being converted stop at their next stage."""
+        if not self.conversion_in_progress:
+            return
+        self.cancel_event.set()
+        for future, index in self.futures.items():
+            if future.cancel():
+                self._finish_item(index, "cancelled", None) # Never started: no worker will report it
+        self.cancel_button.configure(state="disabled")
+        self.progress_percentage_label.configure(text=self.strings["cancelling"])
+
+    def _on_queue_finished(self):
+        """Re-enables the controls and tells the user how the conversions ended."""
+        self.executor.shutdown(wait=False)
+        self.executor = None
+        self.set_controls_enabled(True)
+        counts = {status: 0 for status in self.status_names}
+        for item in self.queue_items:
+            counts[item["status"]] += 1
+
+        if len(self.queue_items) == 1 and counts["ok"] == 1:
+            messagebox.showinfo(self.strings["success_title"],
+                                self.strings["saved_to"].format(path=self.queue_items[0]["destination"]))
+            self.reset_ui() # Reset UI after saving
+            return
+        summary = self.strings["summary"].format(**counts)
+        errors = [f"{os.path.basename(item['path'])}: {item['error']}" for item in self.queue_items if item["status"] == "failed"]
+        if errors:
+            messagebox.showerror(self.strings["save_error_title"],
+                                 summary + "\n\n" + self.strings["errors"] + "\n" + "\n".join(errors[:10]))
+        elif counts["ok"] == len(self.queue_items):
+            messagebox.showinfo(self.strings["success_title"], summary)
+            self.reset_ui() # Reset UI after saving everything
+        else:
+            messagebox.showinfo(self.strings["finished_title"], summary) # The list stays, showing what was skipped or cancelled
+
+    def on_close(self):
+        """Closes the window without waiting: pending conversions are dropped, running ones stop at their next stage."""
+        self.cancel_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
+
+
+def run(strings):
+    """Opens the window with the texts of one build and runs it until it is closed.
+
+    strings maps each text the window shows to its translation: see the English and
+    Castellano scripts for the keys. Formatted ones take {count}, {name}, {path} or the
+    status counts ({ok}, {skipped}, {failed}, {cancelled}).
+    """
+    app = ImageConverterApp(strings)
+    app.mainloop()
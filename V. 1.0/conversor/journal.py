@@ -0,0 +1,132 @@
+"""Crash-safe journal of a batch, so an interrupted run can be resumed.
+
+Every job of a batch is recorded in a small SQLite manifest before it starts
+(pending) and again when it finishes (ok, skipped or failed, with the error text,
+the output path and the output's SHA-256). Outputs are written to a temporary
+file and renamed into place (core.atomic_output), so an output is either complete
+or absent, and each record is committed on its own: after a crash or Ctrl+C,
+running the same batch again skips what was finished and converts only the jobs
+that were pending or failed, or whose source changed since.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+from . import core
+
+JOURNAL_FILE = ".conversor-journal.sqlite"
+RESUMED_ERROR = "converted in an earlier run" # Error text of the results of jobs a resumed run skips
+
+_CHUNK = 1024 * 1024
+_DONE = ("ok", "linked", "skipped")
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_checksum(path):
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BatchJournal:
+    """SQLite manifest of jobs: (source, destination) -> status, error, source signature, output size and checksum.
+
+    verify=True also re-reads each finished output and compares its checksum before
+    trusting it; by default its size is compared.
+    """
+
+    def __init__(self, path, verify=False):
+        self.path = path
+        self.verify = verify
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL") # Each commit survives a crash of the process
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS jobs (source TEXT, destination TEXT, output_format TEXT,"
+                             " status TEXT, error TEXT, source_size INTEGER, source_mtime_ns INTEGER,"
+                             " output_size INTEGER, checksum TEXT, updated_at REAL,"
+                             " PRIMARY KEY (source, destination))")
+
+    def is_done(self, job):
+        """True if the job finished in an earlier run and neither its source nor its output changed since.
+
+        A job skipped because its output already existed counts as done only while that output is still there.
+        """
+        row = self._db.execute("SELECT status, source_size, source_mtime_ns, output_size, checksum FROM jobs"
+                               " WHERE source = ? AND destination = ?", (job.source, job.destination)).fetchone()
+        if row is None or row[0] not in _DONE or _signature(job.source) != row[1:3]:
+            return False
+        if row[3] is None: # Skipped, or "split" frames written under other names: the output must still be there
+            from .frames import frame_path
+            return os.path.exists(job.destination) or os.path.exists(frame_path(job.destination, 1))
+        if _signature(job.destination)[0] != row[3]:
+            return False
+        return not self.verify or file_checksum(job.destination) == row[4]
+
+    def mark_pending(self, jobs):
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, 'pending', NULL, ?, ?, NULL, NULL, ?)",
+                                 [(job.source, job.destination, job.output_format, *_signature(job.source),
+                                   time.time()) for job in jobs])
+
+    def record(self, result):
+        """Records how a job ended, with its output's size and checksum when it produced a single file."""
+        output_size = checksum = None
+        if result.status in ("ok", "linked") and os.path.isfile(result.destination):
+            output_size, checksum = os.path.getsize(result.destination), file_checksum(result.destination)
+        with self._db:
+            self._db.execute("UPDATE jobs SET status = ?, error = ?, output_size = ?, checksum = ?, updated_at = ?"
+                             " WHERE source = ? AND destination = ?",
+                             (result.status, result.error, output_size, checksum, time.time(), result.source,
+                              result.destination))
+
+    def counts(self):
+        """Jobs per status, e.g. {"ok": 120, "failed": 2, "pending": 30}."""
+        return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def run(self, jobs, runner, progress=None, **options):
+        """Runs runner (batch.run_batch or pipeline.run_pipeline) on the jobs not finished in an earlier run.
+
+        Returns results in job order; finished jobs are reported as skipped with
+        RESUMED_ERROR and are not passed to progress. Other options go to runner.
+        """
+        results = [None] * len(jobs)
+        remaining = []
+        for index, job in enumerate(jobs):
+            if self.is_done(job):
+                results[index] = core.ConversionResult(job.source, job.destination, "skipped", RESUMED_ERROR, 0.0)
+            else:
+                remaining.append(index)
+        self.mark_pending([jobs[index] for index in remaining])
+        resumed = len(jobs) - len(remaining)
+
+        def record(done, total, result):
+            self.record(result)
+            if progress:
+                progress(resumed + done, len(jobs), result)
+
+        for index, result in zip(remaining, runner([jobs[index] for index in remaining], progress=record, **options)):
+            results[index] = result
+        return results
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
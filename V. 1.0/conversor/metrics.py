@@ -0,0 +1,237 @@
+"""Per-stage timing of conversions and the sinks that export it.
+
+convert_file times every stage (open, decode, convert, encode, write) with a
+perf_counter call per stage and returns the timings in ConversionResult.stages,
+so measuring costs next to nothing and works the same inside worker processes.
+The process that collects the results feeds them to one or more sinks:
+a JSON line per file, or a Prometheus textfile of counters and histograms.
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Upper bounds (seconds) of the histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PROMETHEUS_FLUSH_INTERVAL = 10.0 # Seconds between textfile rewrites while conversions keep arriving
+
+
+class StageTimer:
+    """A progress(stage, fraction_done) callback that adds the time since the previous call to that stage.
+
+    Wraps an optional progress callback, which is still called as before.
+    """
+
+    def __init__(self, progress=None):
+        self.progress = progress
+        self.stages = {}
+        self._last = time.perf_counter()
+
+    def __call__(self, stage, fraction_done):
+        self.mark(stage)
+        if self.progress:
+            self.progress(stage, fraction_done)
+
+    def mark(self, stage):
+        """Charges the time since the previous stage to stage, without reporting progress."""
+        now = time.perf_counter()
+        # Stages reported several times (per frame, per strip) accumulate
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None # Failed conversions and "split" outputs have no single output file
+
+
+def input_format(path):
+    """Format label of a source, from its extension (probing it again is not worth it here)."""
+    ext = os.path.splitext(path)[1].lstrip(".").upper()
+    return {"JPG": "JPEG", "HEIF": "HEIC"}.get(ext, ext) or "UNKNOWN"
+
+
+def describe(result, output_format):
+    """The JSON-ready record of one conversion."""
+    from .core import pil_format
+    return {"time": round(time.time(), 3), "source": result.source, "destination": result.destination,
+            "input_format": input_format(result.source), "output_format": pil_format(output_format),
+            "status": result.status, "error": result.error, "cached": result.cached,
+            "seconds": round(result.seconds, 6),
+            "stages": {stage: round(seconds, 6) for stage, seconds in (result.stages or {}).items()},
+            "input_bytes": _file_size(result.source),
+            "output_bytes": _file_size(result.destination) if result.status in ("ok", "linked") else None}
+
+
+class JsonLogSink:
+    """Writes one JSON object per converted file (JSON Lines) to a path, or to stderr for "-"."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = sys.stderr if path == "-" else open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def observe(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush() # One line per file is cheap enough, and a crash loses nothing
+
+    def close(self):
+        if self._file is not sys.stderr:
+            self._file.close()
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.total += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels}le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels}le="+Inf"}} {self.total}'
+        yield f"{name}_sum{{{labels.rstrip(',')}}} {self.sum:.6f}"
+        yield f"{name}_count{{{labels.rstrip(',')}}} {self.total}"
+
+
+def _labels(**labels):
+    return "".join(f'{key}="{value}",' for key, value in sorted(labels.items()))
+
+
+class PrometheusTextfileSink:
+    """Keeps counters and histograms in memory and rewrites a Prometheus textfile with them.
+
+    Meant for node_exporter's textfile collector: the file is replaced atomically, on
+    close() and at most every flush_interval seconds while conversions arrive.
+    With path=None nothing is written; render() still returns the metrics (e.g. for an HTTP endpoint).
+    """
+
+    def __init__(self, path, buckets=DEFAULT_BUCKETS, flush_interval=PROMETHEUS_FLUSH_INTERVAL):
+        self.path = path
+        self.buckets = buckets
+        self.flush_interval = flush_interval
+        self.conversions = {} # (status, input_format, output_format) -> count
+        self.cache_hits = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.stage_seconds = {} # stage -> _Histogram
+        self.conversion_seconds = {} # output_format -> _Histogram
+        self.gauges = {} # name -> (help, value), set by pipelines that report their own state
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def observe(self, record):
+        with self._lock:
+            key = (record["status"], record["input_format"], record["output_format"])
+            self.conversions[key] = self.conversions.get(key, 0) + 1
+            self.cache_hits += bool(record["cached"])
+            if record["status"] == "ok":
+                self.input_bytes += record["input_bytes"] or 0
+                self.output_bytes += record["output_bytes"] or 0
+                histogram = self.conversion_seconds.setdefault(record["output_format"], _Histogram(self.buckets))
+                histogram.observe(record["seconds"])
+                for stage, seconds in record["stages"].items():
+                    self.stage_seconds.setdefault(stage, _Histogram(self.buckets)).observe(seconds)
+            due = time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def set_gauge(self, name, value, help_text=""):
+        with self._lock:
+            self.gauges[name] = (help_text, value)
+
+    def render(self):
+        """The textfile contents in the Prometheus exposition format."""
+        lines = ["# HELP conversor_conversions_total Files processed, by result and format.",
+                 "# TYPE conversor_conversions_total counter"]
+        for (status, source_format, output_format), count in sorted(self.conversions.items()):
+            labels = _labels(status=status, input_format=source_format, output_format=output_format)
+            lines.append(f"conversor_conversions_total{{{labels.rstrip(',')}}} {count}")
+        lines += ["# HELP conversor_cache_hits_total Conversions answered by the conversion cache.",
+                  "# TYPE conversor_cache_hits_total counter",
+                  f"conversor_cache_hits_total {self.cache_hits}",
+                  "# HELP conversor_input_bytes_total Bytes read from successfully converted sources.",
+                  "# TYPE conversor_input_bytes_total counter",
+                  f"conversor_input_bytes_total {self.input_bytes}",
+                  "# HELP conversor_output_bytes_total Bytes written to outputs.",
+                  "# TYPE conversor_output_bytes_total counter",
+                  f"conversor_output_bytes_total {self.output_bytes}",
+                  "# HELP conversor_stage_seconds Time spent in each conversion stage.",
+                  "# TYPE conversor_stage_seconds histogram"]
+        for stage, histogram in sorted(self.stage_seconds.items()):
+            lines += histogram.lines("conversor_stage_seconds", _labels(stage=stage))
+        lines += ["# HELP conversor_conversion_seconds Time to convert one file, by output format.",
+                  "# TYPE conversor_conversion_seconds histogram"]
+        for output_format, histogram in sorted(self.conversion_seconds.items()):
+            lines += histogram.lines("conversor_conversion_seconds", _labels(output_format=output_format))
+        for name, (help_text, value) in sorted(self.gauges.items()):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self._lock:
+            text = self.render()
+            self._last_flush = time.monotonic()
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=folder, prefix=".conversor-metrics-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, self.path) # The collector never reads a half-written file
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def close(self):
+        self.flush()
+
+
+class Metrics:
+    """Fans conversion results out to every sink. Used from the process that collects the results."""
+
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+
+    def __bool__(self):
+        return bool(self.sinks)
+
+    def observe(self, result, output_format):
+        record = describe(result, output_format)
+        for sink in self.sinks:
+            sink.observe(record)
+
+    def set_gauge(self, name, value, help_text=""):
+        """Publishes a point-in-time value (e.g. a queue depth) to the sinks that keep gauges."""
+        for sink in self.sinks:
+            if hasattr(sink, "set_gauge"):
+                sink.set_gauge(name, value, help_text)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,60 @@
+"""Same-format fast path: copy the source instead of decoding and re-encoding it.
+
+Converting a JPEG to JPG (or a PNG to PNG, ...) with nothing else to change would
+only cost time and, for lossy formats, quality. The source is copied byte for byte
+instead (shutil lets the kernel copy it where the platform allows), which also keeps
+its metadata: the EXIF orientation stays in place, so the copy displays upright
+without the pixels being rotated and recompressed. Anything that changes the
+pixels or the encoder settings still goes through the normal decode/encode path.
+"""
+import os
+import shutil
+
+from . import core, formats
+
+
+def can_copy(source, output_format, frames="auto", frame_step=1, max_dimension=None, encoder=None, colour=None):
+    """True when converting source with these options would only rewrite the same image in the same format.
+
+    encoder is a conversor.presets.EncoderSettings (or None). Presets and explicit
+    qualities always re-encode; a target size is met by the source itself when it
+    is already small enough. colour is a conversor.colour.ColourSettings (or None): a
+    quantizer or shared palette re-encodes, a background alone changes nothing here.
+    """
+    from . import probe
+    return copies_as_is(probe.probe_image(source), os.path.getsize(source), output_format, frames, frame_step,
+                        max_dimension, encoder, colour)
+
+
+def copies_as_is(info, source_size, output_format, frames="auto", frame_step=1, max_dimension=None, encoder=None,
+                 colour=None):
+    """can_copy() for an already probed source (a probe.ImageProbe) of source_size bytes, e.g. an archive member."""
+    from . import thumbnails
+    # A codec's read formats include names Pillow gives its variants, e.g. MPO (multi-picture JPEGs from phones)
+    codec = formats.get(output_format)
+    if formats.find(info.format) is not codec:
+        return False
+    if encoder is not None:
+        from .presets import DEFAULT_PRESET
+        if encoder.quality is not None or encoder.preset not in (None, DEFAULT_PRESET):
+            return False
+        if encoder.target_size and source_size > encoder.target_size:
+            return False
+    if colour is not None and (colour.quantizer or colour.palette):
+        return False
+    if max_dimension and thumbnails.fitted_size(info.size, max_dimension) != info.size:
+        return False
+    if info.n_frames > 1:
+        if info.format == "MPO":
+            return frames != "split" # JPEG readers show the first picture and skip the others
+        # Only a whole animation in a format that keeps it is copied (e.g. not an APNG, whose output is one frame)
+        return frames == "auto" and frame_step == 1 and codec.animation
+    return True
+
+
+def copy_file(source, destination):
+    """Copies source to destination (atomically). Converting a file onto itself leaves it as it is."""
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return # The output already is the source
+    with core.atomic_output(destination) as temp_path:
+        shutil.copyfile(source, temp_path)
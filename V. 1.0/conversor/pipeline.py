@@ -0,0 +1,212 @@
+"""Overlapped batch pipeline: read, convert and write different files at the same time.
+
+run_batch hands each worker a path, so a worker sits idle while its file is read
+and written, which on a network share can take as long as the conversion itself.
+Here an asyncio loop reads source bytes on I/O threads, the worker processes only
+decode and encode in memory, and the outputs are written on I/O threads again,
+so the disk and the CPUs stay busy together. Bounded queues between the stages cap
+how many files are held in memory: reading pauses when the workers fall behind,
+and the workers pause when writing does. The queue depths are published as
+metrics gauges.
+"""
+import asyncio
+import os
+import time
+
+from . import core
+
+DEFAULT_IO_THREADS = 4 # Files read (and written) at once
+QUEUE_PER_WORKER = 2 # Files waiting between two stages, per worker process
+
+_SENTINEL = None
+
+
+def _read(job, overwrite, reencode, options, estimate_memory):
+    # I/O thread: decide whether the source can be copied as it is, estimate its memory, then read it whole
+    from . import admission, passthrough
+    start = time.perf_counter()
+    if not overwrite and os.path.exists(job.destination):
+        return None, False, 0, 0.0
+    encoder = core.encoder_settings(options.get("preset"), options.get("quality"), options.get("target_size"))
+    colour = core.colour_settings(options.get("background"), options.get("quantizer"), options.get("palette"))
+    copy = not reencode and passthrough.can_copy(job.source, job.output_format, options.get("frames", "auto"),
+                                                 options.get("frame_step", 1), options.get("max_dimension"), encoder,
+                                                 colour)
+    estimate = 0
+    if estimate_memory and not copy:
+        estimate = admission.estimate_job(job, dict(options, overwrite=True, reencode=True))
+    with open(job.source, "rb") as f:
+        data = f.read()
+    return data, copy, estimate, time.perf_counter() - start
+
+
+def _write(destination, data):
+    # I/O thread
+    start = time.perf_counter()
+    folder = os.path.dirname(destination)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with core.atomic_output(destination) as temp_path, open(temp_path, "wb") as f:
+        f.write(data)
+    return time.perf_counter() - start
+
+
+class _Pipeline:
+    """The queues and stage tasks of one run_pipeline() call."""
+
+    def __init__(self, jobs, workers, io_threads, queue_size, progress, metrics, overwrite, reencode, options,
+                 budget=None):
+        self.jobs = jobs
+        self.workers = workers
+        self.io_threads = io_threads
+        self.queue_size = queue_size
+        self.progress = progress
+        self.metrics = metrics
+        self.overwrite = overwrite
+        self.reencode = reencode
+        self.options = options
+        self.budget = budget # An admission.MemoryBudget, or None
+        self.results = [None] * len(jobs)
+        self.done = 0
+        self.converting = 0
+
+    def _publish(self):
+        if not self.metrics:
+            return
+        self.metrics.set_gauge("conversor_pipeline_read_queue", self.read_queue.qsize(),
+                               "Sources read and waiting for a worker.")
+        self.metrics.set_gauge("conversor_pipeline_converting", self.converting,
+                               "Sources being decoded and encoded by the workers.")
+        self.metrics.set_gauge("conversor_pipeline_write_queue", self.write_queue.qsize(),
+                               "Converted outputs waiting to be written.")
+
+    def _finish(self, index, result):
+        self.results[index] = result
+        self.done += 1
+        if self.metrics:
+            self.metrics.observe(result, self.jobs[index].output_format)
+        if self.progress:
+            self.progress(self.done, len(self.jobs), result)
+
+    def _failed(self, index, error, start, stages):
+        job = self.jobs[index]
+        self._finish(index, core.ConversionResult(job.source, job.destination, "failed", error,
+                                                  time.perf_counter() - start, stages=stages))
+
+    async def _reader(self, loop, io_pool):
+        while self.pending:
+            index = self.pending.pop()
+            job, start = self.jobs[index], time.perf_counter()
+            try:
+                data, copy, estimate, seconds = await loop.run_in_executor(
+                    io_pool, _read, job, self.overwrite, self.reencode, self.options, self.budget is not None)
+            except Exception as e:
+                self._failed(index, f"{type(e).__name__}: {e}", start, {})
+                continue
+            if data is None:
+                self._finish(index, core.ConversionResult(job.source, job.destination, "skipped",
+                                                          "output already exists", 0.0))
+                continue
+            await self.read_queue.put((index, start, data, copy, estimate, {"read": seconds})) # Waits while full
+            self._publish()
+
+    async def _converter(self, loop, process_pool):
+        while True:
+            item = await self.read_queue.get()
+            if item is _SENTINEL:
+                return
+            index, start, data, copy, estimate, stages = item
+            job = self.jobs[index]
+            if not copy:
+                if self.budget is not None:
+                    ticket = self.budget.enqueue(estimate)
+                    async with self.memory_freed:
+                        await self.memory_freed.wait_for(lambda: self.budget.try_admit(ticket))
+                self.converting += 1
+                self._publish()
+                try:
+                    data, worker_stages, error = await loop.run_in_executor(
+                        process_pool, core.transcode, job.source, data, job.output_format, self.options)
+                except Exception as e:
+                    # A worker process died (e.g. killed by the OOM killer); report it as a failure
+                    data, worker_stages, error = None, {}, f"{type(e).__name__}: {e}"
+                finally:
+                    self.converting -= 1
+                    if self.budget is not None:
+                        self.budget.release(estimate)
+                        async with self.memory_freed:
+                            self.memory_freed.notify_all()
+                stages.update(worker_stages)
+                if error is not None:
+                    self._failed(index, error, start, stages)
+                    self._publish()
+                    continue
+            await self.write_queue.put((index, start, data, stages))
+            self._publish()
+
+    async def _writer(self, loop, io_pool):
+        while True:
+            item = await self.write_queue.get()
+            if item is _SENTINEL:
+                return
+            index, start, data, stages = item
+            job = self.jobs[index]
+            self._publish()
+            try:
+                seconds = await loop.run_in_executor(io_pool, _write, job.destination, data)
+            except Exception as e:
+                self._failed(index, f"{type(e).__name__}: {e}", start, stages)
+                continue
+            stages["write"] = stages.get("write", 0.0) + seconds # The worker's in-memory write plus the disk's
+            self._finish(index, core.ConversionResult(job.source, job.destination, "ok", None,
+                                                      time.perf_counter() - start, stages=stages))
+
+    async def run(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from . import batch
+        loop = asyncio.get_running_loop()
+        self.read_queue = asyncio.Queue(self.queue_size)
+        self.write_queue = asyncio.Queue(self.queue_size)
+        self.memory_freed = asyncio.Condition()
+        self.pending = list(reversed(range(len(self.jobs)))) # pop() hands out the jobs in order
+
+        async def stage(tasks, next_queue, consumers):
+            await asyncio.gather(*tasks)
+            for _ in range(consumers):
+                await next_queue.put(_SENTINEL) # Tells each task of the next stage that nothing more is coming
+
+        # The I/O threads open sources (HEIC included) while workers start, so workers are not forked from here
+        with batch.process_pool(self.workers) as process_pool, \
+                ThreadPoolExecutor(max_workers=2 * self.io_threads) as io_pool:
+            readers = [self._reader(loop, io_pool) for _ in range(self.io_threads)]
+            converters = [self._converter(loop, process_pool) for _ in range(self.workers)]
+            writers = [self._writer(loop, io_pool) for _ in range(self.io_threads)]
+            await asyncio.gather(stage(readers, self.read_queue, self.workers),
+                                 stage(converters, self.write_queue, self.io_threads),
+                                 *writers)
+        return self.results
+
+
+def run_pipeline(jobs, workers=None, progress=None, metrics=None, io_threads=DEFAULT_IO_THREADS, queue_size=None,
+                 overwrite=False, reencode=False, frames="auto", memory_budget=None, **options):
+    """Converts every job like batch.run_batch, overlapping reads, conversions and writes; returns results in job order.
+
+    io_threads files are read and written at once; queue_size (default: QUEUE_PER_WORKER
+    per worker) files may wait between reading and converting, and as many between
+    converting and writing, which bounds the memory held by sources and outputs.
+    Other keyword options (max_dimension, preset, ...) are passed on to core.save_image.
+    memory_budget (bytes), if given, only starts a conversion while the estimated peak memory
+    of the running ones stays under it (see conversor.admission).
+    frames="split" is not supported: it writes several outputs per source.
+    """
+    if frames == "split":
+        raise ValueError("the pipeline writes one output per source; use run_batch for frames='split'")
+    workers = workers or os.cpu_count() or 1
+    queue_size = queue_size or QUEUE_PER_WORKER * workers
+    budget = None
+    if memory_budget:
+        from .admission import MemoryBudget
+        budget = MemoryBudget(memory_budget, metrics=metrics)
+    pipeline = _Pipeline(jobs, workers, io_threads, queue_size, progress, metrics, overwrite, reencode,
+                         dict(options, frames=frames), budget)
+    return asyncio.run(pipeline.run())
@@ -0,0 +1,100 @@
+"""Encoder presets, and encoding to a target file size.
+
+A preset names a set of Pillow save() options per output format, so "web" means
+progressive, optimized JPEGs and effort-4 WEBPs without the caller knowing each
+encoder's knobs. Target-size encoding searches for the highest quality of a lossy
+format (JPEG, WEBP, ...) whose output fits a byte budget, encoding several candidate
+qualities at once in memory (Pillow's encoders release the GIL, so threads run them
+in parallel).
+"""
+import io
+import os
+from collections import namedtuple
+
+DEFAULT_PRESET = "default"
+
+# Pillow save() options per preset and output format; formats left out use Pillow's defaults
+PRESETS = {
+    "default": {},
+    "web": {"JPEG": {"quality": 82, "optimize": True, "progressive": True},
+            "WEBP": {"quality": 80, "method": 4},
+            "PNG": {"optimize": True},
+            "GIF": {"optimize": True}},
+    "small": {"JPEG": {"quality": 70, "optimize": True, "progressive": True, "subsampling": "4:2:0"},
+              "WEBP": {"quality": 70, "method": 6},
+              "PNG": {"optimize": True},
+              "GIF": {"optimize": True}},
+    "fast": {"JPEG": {"quality": 85},
+             "WEBP": {"quality": 80, "method": 0},
+             "PNG": {"compress_level": 1}},
+    # JPEG has no lossless mode: the closest is the top quality without chroma subsampling
+    "lossless": {"JPEG": {"quality": 100, "subsampling": 0},
+                 "WEBP": {"lossless": True, "quality": 100, "method": 4},
+                 "PNG": {"optimize": True}},
+}
+
+# Candidate qualities encoded at once per search round
+SEARCH_WIDTH = 4
+
+# How an output is encoded: a preset name, an explicit quality (overrides the preset's)
+# and a target size in bytes (searches for the quality instead)
+EncoderSettings = namedtuple("EncoderSettings", ["preset", "quality", "target_size"], defaults=(None, None, None))
+
+
+def encoder_options(output_format, settings=None):
+    """Keyword arguments for Pillow's save() of output_format under settings (an EncoderSettings or None)."""
+    from .formats import get
+    codec = get(output_format)
+    output_format = codec.pil_format
+    settings = settings or EncoderSettings()
+    if settings.preset not in (None, *PRESETS):
+        raise ValueError(f"unknown preset {settings.preset!r}; choose from {', '.join(PRESETS)}")
+    options = dict(PRESETS[settings.preset or DEFAULT_PRESET].get(output_format, {}))
+    if settings.quality is not None and codec.lossy:
+        options["quality"] = settings.quality
+    return options
+
+
+def encode_to_size(img, output_format, target_size, settings=None, workers=None):
+    """Encodes img at the highest quality whose output fits in target_size bytes and returns the BytesIO.
+
+    Each round encodes up to `workers` qualities between the best known fit and the
+    lowest known miss in parallel, so about three rounds find the exact quality.
+    Raises ValueError for formats without a quality setting, or when even quality 1
+    does not fit.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from . import formats
+    codec = formats.get(output_format)
+    output_format = codec.pil_format
+    if not codec.lossy:
+        lossy = ", ".join(other.names[0] for other in formats.registered() if other.lossy)
+        raise ValueError(f"a target size needs a lossy format ({lossy}), not {codec.names[0]}")
+    options = encoder_options(output_format, settings)
+    options.pop("lossless", None) # Lossless WEBP ignores quality for size: search the lossy encoder
+    workers = workers or min(SEARCH_WIDTH, os.cpu_count() or 1)
+    img.load()
+
+    def encode(quality):
+        buffer = io.BytesIO()
+        # save() stores per-call state on the Image object: give each thread its own wrapper of the same pixels
+        img._new(img.im).save(buffer, format=output_format, **dict(options, quality=quality))
+        return buffer
+
+    best, smallest = None, None
+    low, high = 0, 101 # Highest quality known to fit (0: none yet) and lowest known not to
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while high - low > 1:
+            count = min(workers, high - low - 1)
+            candidates = sorted({low + (high - low) * (index + 1) // (count + 1) for index in range(count)})
+            for quality, buffer in zip(candidates, pool.map(encode, candidates)):
+                size = buffer.getbuffer().nbytes
+                if quality == 1:
+                    smallest = size
+                if size > target_size:
+                    high = quality # Sizes grow with quality: the higher candidates cannot fit either
+                    break
+                low, best = quality, buffer
+    if best is None:
+        raise ValueError(f"even quality 1 needs {smallest} bytes, above the target of {target_size} bytes")
+    return best
@@ -0,0 +1,116 @@
+"""Header-only image probing with an in-memory cache, and lazily decoded image handles."""
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from . import core
+
+# What the header tells us about an image, without decoding any pixels
+ImageProbe = namedtuple("ImageProbe", ["path", "format", "size", "mode", "n_frames", "orientation"])
+
+PROBE_CACHE_SIZE = 4096 # Entries kept before the least recently used one is dropped
+
+_EXIF_ORIENTATION = 0x0112
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_key(path):
+    # mtime and size change whenever the file is rewritten, so a stale entry can never match
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def _read_header(path, img):
+    try:
+        orientation = img.getexif().get(_EXIF_ORIENTATION, 1)
+    except Exception:
+        orientation = 1 # Damaged EXIF must not prevent loading the image
+    return ImageProbe(path, core.detected_format(img, path), img.size, img.mode,
+                      getattr(img, "n_frames", 1), orientation)
+
+
+def _remember(key, probe):
+    with _cache_lock:
+        _cache[key] = probe
+        _cache.move_to_end(key)
+        while len(_cache) > PROBE_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def _cached(key):
+    with _cache_lock:
+        probe = _cache.get(key)
+        if probe is not None:
+            _cache.move_to_end(key)
+        return probe
+
+
+class ProbedImage:
+    """A probed file whose pixels are only decoded when .image is first used.
+
+    When the header had to be read, the handle opened for it is kept and reused,
+    so a file is never opened twice.
+    """
+
+    def __init__(self, probe, img=None):
+        self.probe = probe
+        self._img = img
+
+    @property
+    def image(self):
+        """The PIL image, opened on first use (Pillow itself decodes on first pixel access)."""
+        if self._img is None:
+            self._img = core.open_image(self.probe.path)
+        return self._img
+
+    def close(self):
+        if self._img is not None:
+            self._img.close()
+            self._img = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def probe_image(path):
+    """Returns the ImageProbe of a file, reading only its header and caching it by path + mtime + size."""
+    return open_probed(path, keep_open=False).probe
+
+
+def open_probed(path, keep_open=True):
+    """Probes a file (from cache when possible) and returns a ProbedImage for it.
+
+    Raises PIL.UnidentifiedImageError if the file is not a readable image.
+    """
+    key = _cache_key(path)
+    probe = _cached(key)
+    if probe is not None:
+        return ProbedImage(probe)
+
+    img = core.open_image(path)
+    try:
+        probe = _read_header(path, img)
+    except Exception:
+        img.close()
+        raise
+    _remember(key, probe)
+    if not keep_open:
+        img.close()
+        img = None
+    return ProbedImage(probe, img)
+
+
+def probe_bytes(name, data):
+    """Returns the ImageProbe (uncached) of an image held in memory, e.g. an archive member, with name as its path."""
+    import io
+    with core.open_image(io.BytesIO(data)) as img:
+        return _read_header(name, img)
+
+
+def clear_probe_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,358 @@
+"""Local HTTP conversion service: POST image bytes, get the converted image back.
+
+    curl --data-binary @photo.heic "http://127.0.0.1:8080/convert?format=jpg&quality=85" -o photo.jpg
+    curl --data-binary @photo.heic "http://127.0.0.1:8080/convert?format=webp&preset=web&target_kb=200" -o photo.webp
+
+Uploads are streamed to a temporary file in chunks, converted by a pool of worker
+processes started (and warmed up: Pillow plugins and the HEIF opener loaded) before
+the first request, and the output is streamed back from disk. At most `workers`
+conversions run at once and up to `queue_size` more wait their turn; anything
+beyond that is answered at once with 503, so latency stays bounded under bursts.
+A worker that dies (e.g. killed for using too much memory) breaks the pool: /health
+reports it, and the next conversion starts a new pool instead of failing forever.
+"""
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+from . import admission, batch, core, formats, metrics, presets
+
+DEFAULT_PORT = 8080
+DEFAULT_MAX_UPLOAD = 100 * 2**20 # 100 MB
+_CHUNK = 64 * 1024
+
+# Upload content types the codecs (conversor.formats) do not name, so the temporary file
+# keeps a meaningful extension (used in the metrics)
+_UPLOAD_EXTENSIONS = {"image/heif": ".heif"}
+
+
+def _upload_extension(content_type):
+    for codec in formats.registered():
+        if codec.mime_type == content_type:
+            return codec.extensions[0]
+    return _UPLOAD_EXTENSIONS.get(content_type, "")
+
+
+def _warm_up():
+    # Runs once in every worker: load every Pillow plugin and encoder before the first request needs them
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C stops the server, which then shuts the pool down
+    Image.init()
+    sample = Image.new("RGB", (8, 8))
+    for codec in formats.registered():
+        if formats.available(codec.pil_format): # Loads its plugin too
+            core.encode_image(sample, codec.pil_format)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _convert_upload(source, destination, output_format, options):
+    return core.convert_file(source, destination, output_format, overwrite=True, **options)
+
+
+class RequestError(Exception):
+    """A client error, answered with its HTTP status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _size(text, name, base=10):
+    """A byte count sent by the client (Content-Length, or a chunk size in hex); RequestError if malformed."""
+    try:
+        size = int(text, base)
+    except ValueError:
+        raise RequestError(400, f"invalid {name}") from None
+    if size < 0:
+        raise RequestError(400, f"invalid {name}")
+    return size
+
+
+def _int_param(params, name, low, high):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise RequestError(400, f"{name} must be an integer") from None
+    if not low <= number <= high:
+        raise RequestError(400, f"{name} must be between {low} and {high}")
+    return number
+
+
+def conversion_options(params):
+    """Validates the query parameters and returns (output_format, convert_file options)."""
+    output_format = params.get("format", "").upper()
+    if output_format not in formats.output_names():
+        raise RequestError(400, f"format must be one of {', '.join(formats.output_names())}")
+    frame_mode = params.get("frames", "auto")
+    if frame_mode not in ("auto", "first"):
+        raise RequestError(400, "frames must be auto or first") # "split" would need several response bodies
+    preset = params.get("preset")
+    if preset is not None and preset not in presets.PRESETS:
+        raise RequestError(400, f"preset must be one of {', '.join(presets.PRESETS)}")
+    target_kb = _int_param(params, "target_kb", 1, 2**20)
+    options = {"quality": _int_param(params, "quality", 1, 100),
+               "preset": preset,
+               "target_size": target_kb and target_kb * 1024,
+               "max_dimension": _int_param(params, "max_dimension", 1, 65535),
+               "frames": frame_mode,
+               "frame_step": _int_param(params, "frame_step", 1, 10000) or 1}
+    return output_format, options
+
+
+class ConversionService:
+    """The worker pool and the admission limit shared by every request thread."""
+
+    def __init__(self, workers=None, queue_size=None, max_upload=DEFAULT_MAX_UPLOAD, metrics_sinks=None,
+                 memory_budget=None, **defaults):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.max_upload = max_upload
+        self.defaults = defaults # convert_file options applied to every request (memory_limit, cache, ...)
+        # /metrics always works; extra sinks (JSON log, textfile) receive the same records
+        self.prometheus = metrics.PrometheusTextfileSink(None)
+        self.metrics = metrics.Metrics([self.prometheus] + list(metrics_sinks or ()))
+        # Admitted requests also wait until their estimated memory fits next to the running conversions
+        self.budget = admission.MemoryBudget(memory_budget, metrics=self.metrics) if memory_budget else None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._active = 0
+        self._active_lock = threading.Lock()
+        # Request threads probe uploads while a worker may be (re)started: workers are never forked from them
+        self._executor = batch.process_pool(self.workers, initializer=_warm_up)
+        self._executor_lock = threading.Lock()
+        self.temp_dir = tempfile.mkdtemp(prefix="conversor-server-")
+
+    def start(self):
+        """Starts every worker process now, so the first requests do not pay for it."""
+        futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    @property
+    def broken(self):
+        """True once a worker died, until the next conversion replaces the pool."""
+        return bool(getattr(self._executor, "_broken", False)) # Set by the executor when a worker dies
+
+    def _replace_pool(self, executor):
+        """Swaps a broken executor for a new pool (once, however many threads saw it break); returns the new one."""
+        with self._executor_lock:
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = batch.process_pool(self.workers, initializer=_warm_up)
+            return self._executor
+
+    def _run(self, fn, *args):
+        executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died before this request: it is not to blame, so run it on a new pool
+            future = self._replace_pool(executor).submit(fn, *args)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # This conversion may be what killed the worker: report it rather than run it again
+            self._replace_pool(executor)
+            raise RequestError(503, "a worker process died during the conversion") from None
+
+    def admit(self):
+        """Takes a slot for a request, or returns False when the workers and the queue are all busy."""
+        if not self._slots.acquire(blocking=False):
+            return False
+        self._set_active(1)
+        return True
+
+    def release(self):
+        self._set_active(-1)
+        self._slots.release()
+
+    def _set_active(self, change):
+        with self._active_lock:
+            self._active += change
+            active = self._active
+        self.metrics.set_gauge("conversor_server_requests_active", active,
+                               "Conversion requests admitted (running or queued).")
+        self.metrics.set_gauge("conversor_server_requests_queued", max(0, active - self.workers),
+                               "Admitted conversion requests waiting for a worker.")
+
+    def convert(self, source, destination, output_format, options):
+        options = dict(self.defaults, **options)
+        estimate = 0
+        if self.budget:
+            job = batch.ConversionJob(source, destination, output_format)
+            estimate = admission.estimate_job(job, dict(options, overwrite=True))
+            self.budget.acquire(estimate)
+        try:
+            result = self._run(_convert_upload, source, destination, output_format, options)
+        finally:
+            if self.budget:
+                self.budget.release(estimate)
+        self.metrics.observe(result, output_format)
+        return result
+
+    def close(self):
+        self._executor.shutdown()
+        self.metrics.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    """POST /convert?format=...; GET /health and /metrics."""
+
+    server_version = "conversor"
+    protocol_version = "HTTP/1.1"
+    timeout = 60 # Seconds a client may stall while sending its upload
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send_text(self, status, text, content_type="text/plain; charset=utf-8", headers=None):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, headers=None):
+        self._send_text(status, json.dumps({"error": message}) + "\n", "application/json", headers)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            if self.service.broken:
+                self._send_error(503, "a worker process died; the pool restarts with the next conversion")
+            else:
+                self._send_text(200, "ok\n")
+        elif path == "/metrics":
+            self._send_text(200, self.service.prometheus.render(), "text/plain; version=0.0.4")
+        else:
+            self._send_error(404, "not found")
+
+    def _body_chunks(self):
+        """Yields the request body in chunks, from a Content-Length or a chunked transfer encoding."""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = _size(self.rfile.readline().split(b";")[0].strip() or b"0", "chunk size", 16)
+                if size == 0:
+                    while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                        pass # Trailers
+                    return
+                remaining = size
+                while remaining:
+                    data = self.rfile.read(min(remaining, _CHUNK))
+                    if not data:
+                        raise RequestError(400, "upload ended early")
+                    remaining -= len(data)
+                    yield data
+                self.rfile.readline() # CRLF after each chunk
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise RequestError(411, "Content-Length or chunked transfer encoding required")
+        remaining = _size(length, "Content-Length")
+        if remaining > self.service.max_upload:
+            raise RequestError(413, f"upload larger than {self.service.max_upload // 2**20} MB")
+        while remaining:
+            data = self.rfile.read(min(remaining, _CHUNK))
+            if not data:
+                raise RequestError(400, "upload ended early")
+            remaining -= len(data)
+            yield data
+
+    def _receive(self, path):
+        received = 0
+        with open(path, "wb") as f:
+            for data in self._body_chunks():
+                received += len(data)
+                if received > self.service.max_upload:
+                    raise RequestError(413, f"upload larger than {self.service.max_upload // 2**20} MB")
+                f.write(data)
+        if not received:
+            raise RequestError(400, "empty upload")
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/convert":
+            self._send_error(404, "not found")
+            return
+        if not self.service.admit():
+            self.close_connection = True # The upload is not read: do not reuse the connection
+            self._send_error(503, "too many conversions in progress, retry later", {"Retry-After": "1"})
+            return
+        folder = tempfile.mkdtemp(dir=self.service.temp_dir)
+        responded = False
+        try:
+            params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            output_format, options = conversion_options(params)
+            content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            source = os.path.join(folder, "upload" + _upload_extension(content_type))
+            destination = os.path.join(folder, "output." + output_format.lower())
+            self._receive(source)
+            result = self.service.convert(source, destination, output_format, options)
+            if result.status != "ok":
+                self._send_error(422, result.error.replace(source, "upload")) # Do not leak server paths
+                return
+            responded = True
+            self.send_response(200)
+            self.send_header("Content-Type", formats.get(output_format).mime_type)
+            self.send_header("Content-Length", str(os.path.getsize(destination)))
+            self.send_header("X-Conversion-Seconds", f"{result.seconds:.4f}")
+            self.end_headers()
+            with open(destination, "rb") as f:
+                shutil.copyfileobj(f, self.wfile, _CHUNK)
+        except RequestError as e:
+            self.close_connection = True # Part of the upload may still be unread
+            self._send_error(e.status, str(e))
+        except Exception as e:
+            if responded:
+                raise # The output was being sent (the client went away?): nothing else can be said
+            self.close_connection = True
+            self._send_error(500, f"{type(e).__name__}: {e}")
+            self.log_error("conversion failed: %r", e)
+        finally:
+            self.service.release()
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+class ConversionServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, quiet=False):
+        super().__init__(address, ConversionHandler)
+        self.service = service
+        self.quiet = quiet
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT, quiet=False, **service_options):
+    """Runs the service until interrupted. service_options are passed on to ConversionService."""
+    service = ConversionService(**service_options)
+    try:
+        service.start()
+        with ConversionServer((host, port), service, quiet) as server:
+            print(f"Serving on http://{host}:{server.server_address[1]} with {service.workers} workers "
+                  f"(queue of {service.queue_size})", flush=True)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+    finally:
+        service.close()
@@ -0,0 +1,270 @@
+"""Bounded-memory conversion of very large images: strip-wise reading, mode conversion and PNG writing.
+
+Used by core.convert_file when the normal path (decode everything, convert, encode
+in memory) would go over the configured memory limit.
+"""
+import struct
+import zlib
+
+from PIL import Image, ImageChops
+
+from . import core, formats
+
+# Bytes per pixel of decoded images, by mode
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "LA": 2, "PA": 2, "I;16": 2, "RGB": 3, "YCbCr": 3, "LAB": 3, "HSV": 3,
+               "RGBA": 4, "RGBX": 4, "CMYK": 4, "I": 4, "F": 4}
+
+# Raw (uncompressed) layouts whose rows can be read independently, with their bytes per pixel
+_RAW_PIXEL_BYTES = {"L": 1, "P": 1, "LA": 2, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4,
+                    "CMYK": 4}
+
+# Modes Pillow stores with a fourth, unused byte per pixel
+_PADDED_MODES = ("RGB", "YCbCr", "LAB", "HSV")
+
+_PNG_COLOR_TYPES = {"L": 0, "RGB": 2, "P": 3, "LA": 4, "RGBA": 6}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_PNG_FILTER_UP = 2
+
+
+def decoded_bytes(size, mode):
+    """Memory taken by a decoded image of this size and mode."""
+    return size[0] * size[1] * (4 if mode in _PADDED_MODES else _MODE_BYTES.get(mode, 4))
+
+
+def target_mode(mode, output_format, colour=None):
+    """The mode core.normalize_mode would give an image of this mode, without needing the image."""
+    return core.normalize_mode(Image.new(mode, (1, 1)), output_format, colour).mode
+
+
+def estimate_peak(size, mode, output_format, colour=None):
+    """Peak memory of the normal conversion path: decoded source, converted copy and encoded buffer.
+
+    colour is a conversor.colour.ColourSettings (or None); quantized outputs count the
+    quantizer's working memory instead of a converted copy (see colour.quantize_bytes).
+    """
+    from .colour import quantize_bytes
+    out_mode = target_mode(mode, output_format, colour)
+    peak = decoded_bytes(size, mode)
+    working = quantize_bytes(mode, output_format, colour) * size[0] * size[1]
+    if working:
+        peak += working
+    elif out_mode != mode:
+        peak += decoded_bytes(size, out_mode)
+    return peak + decoded_bytes(size, out_mode) // 2 # The encoded file is held in memory before writing
+
+
+def _raw_band_layout(img):
+    """Returns (offset, stride, ystep, rawmode) if the image rows can be read band by band, else None."""
+    if len(img.tile) != 1 or getattr(img, "use_load_libtiff", False):
+        return None
+    decoder_name, extents, offset, args = img.tile[0]
+    if decoder_name != "raw" or extents != (0, 0) + img.size:
+        return None
+    if isinstance(args, str):
+        args = (args, 0, 1)
+    rawmode, stride, ystep = (tuple(args) + (0, 1))[:3]
+    if rawmode not in _RAW_PIXEL_BYTES or ystep not in (1, -1):
+        return None
+    if not stride:
+        stride = img.size[0] * _RAW_PIXEL_BYTES[rawmode]
+    return offset, stride, ystep, rawmode
+
+
+def can_read_strips(img):
+    """True if the source can be decoded in row bands instead of all at once (uncompressed TIFF, PPM, BMP...)."""
+    return _raw_band_layout(img) is not None
+
+
+def iter_strips(path, img, rows):
+    """Yields (top, strip) row bands of the image, at most `rows` rows high.
+
+    Sources that can be read band by band are never fully decoded; the others are
+    decoded once and cropped. Each strip is a new image the caller may keep.
+    """
+    width, height = img.size
+    layout = _raw_band_layout(img)
+    if layout is None:
+        img.load()
+        for top in range(0, height, rows):
+            yield top, img.crop((0, top, width, min(top + rows, height)))
+        return
+
+    offset, stride, ystep, rawmode = layout
+    for top in range(0, height, rows):
+        bottom = min(top + rows, height)
+        # Bottom-up files (BMP) store the last row first
+        first_row = top if ystep == 1 else height - bottom
+        with core.open_image(path) as band:
+            band._size = (width, bottom - top)
+            if hasattr(band, "_tile_size"):
+                band._tile_size = band._size # TIFF allocates its buffer from _tile_size
+            band.tile = [("raw", (0, 0, width, bottom - top), offset + first_row * stride, (rawmode, stride, ystep))]
+            band.load()
+            yield top, band.copy()
+
+
+class PngStripWriter:
+    """Writes a PNG strip by strip, so the whole image never has to be in memory.
+
+    Rows use the PNG "Up" filter, computed with ImageChops in C, and share a
+    single zlib stream across strips.
+    """
+
+    def __init__(self, f, size, mode, palette=None, transparency=None, compress_level=6):
+        if mode not in _PNG_COLOR_TYPES:
+            raise ValueError(f"cannot stream mode {mode} as PNG")
+        self.f = f
+        self.mode = mode
+        self.row_bytes = size[0] * _MODE_BYTES[mode]
+        self._previous_row = None
+        self._compressor = zlib.compressobj(compress_level)
+
+        f.write(_PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", size[0], size[1], 8, _PNG_COLOR_TYPES[mode], 0, 0, 0))
+        if mode == "P":
+            self._chunk(b"PLTE", bytes(palette or []))
+            if isinstance(transparency, bytes):
+                self._chunk(b"tRNS", transparency)
+            elif transparency is not None:
+                self._chunk(b"tRNS", b"\xff" * transparency + b"\x00")
+
+    def _chunk(self, tag, data):
+        self.f.write(struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF))
+
+    def write(self, strip):
+        """Appends the rows of a strip (same mode and width as the PNG)."""
+        height = strip.size[1]
+        # View the pixel bytes as an "L" image so the filter works the same for every mode
+        raw = Image.frombytes("L", (self.row_bytes, height), strip.tobytes())
+        above = Image.new("L", raw.size)
+        if self._previous_row is not None:
+            above.paste(self._previous_row, (0, 0))
+        if height > 1:
+            above.paste(raw.crop((0, 0, self.row_bytes, height - 1)), (0, 1))
+        self._previous_row = raw.crop((0, height - 1, self.row_bytes, height))
+
+        # Each row is its filter type byte followed by the filtered bytes
+        rows = Image.new("L", (self.row_bytes + 1, height), _PNG_FILTER_UP)
+        rows.paste(ImageChops.subtract_modulo(raw, above), (1, 0))
+        data = self._compressor.compress(rows.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+def _png_mode(mode):
+    if mode in _PNG_COLOR_TYPES:
+        return mode
+    return "RGBA" if "A" in mode else "RGB"
+
+
+def _strip_rows(width, modes, memory_limit):
+    # Keep each strip (and its converted copy) within an eighth of the budget
+    row_bytes = width * max(_MODE_BYTES.get(mode, 4) for mode in modes)
+    return max(16, (memory_limit // 8) // max(row_bytes, 1))
+
+
+def _quantized_png(colour):
+    return colour is not None and bool(colour.quantizer or colour.palette)
+
+
+def _assemble_mode(img, out_mode, colour):
+    # A palette computed from the whole image can only be applied once every strip is in
+    if _quantized_png(colour) or (out_mode == "P" and img.mode != "P"):
+        return "RGBA" if "A" in img.mode or "transparency" in img.info else "RGB"
+    return out_mode
+
+
+def floor_bytes(img, output_format, rows, colour=None):
+    """Memory the streaming path cannot avoid for this image and output format.
+
+    Quantized outputs (GIF, PNG with a quantizer or palette) count the whole image
+    assembled in RGB(A) plus the quantizer's working memory (see colour.quantize_bytes).
+    """
+    from .colour import quantize_bytes
+    out_mode = target_mode(img.mode, output_format, colour)
+    strip = decoded_bytes((img.size[0], rows), img.mode) + decoded_bytes((img.size[0], rows), out_mode)
+    source = 0 if can_read_strips(img) else decoded_bytes(img.size, img.mode)
+    if "strips" in formats.get(output_format).fast_paths and not _quantized_png(colour):
+        return source + strip
+    # Other encoders need the whole output image at once
+    pixels = img.size[0] * img.size[1]
+    if source:
+        # Decoded whole and converted (or quantized) once
+        if out_mode == img.mode:
+            return source
+        return source + (quantize_bytes(img.mode, output_format, colour) * pixels or decoded_bytes(img.size, out_mode))
+    assemble_mode = _assemble_mode(img, out_mode, colour)
+    working = quantize_bytes(assemble_mode, output_format, colour) * pixels if assemble_mode != out_mode else 0
+    return decoded_bytes(img.size, assemble_mode) + working + strip
+
+
+def convert_streaming(source, destination, output_format, memory_limit, progress=None, encoder=None, colour=None):
+    """Converts a file while keeping memory under memory_limit bytes where the formats allow it.
+
+    PNG output is written strip by strip; other outputs are assembled from strips into a
+    single output image, with no extra full copy. Raises MemoryError when even that
+    does not fit in memory_limit. encoder is a conversor.presets.EncoderSettings (or None)
+    and colour a conversor.colour.ColourSettings (or None); quantized outputs need the
+    whole image, so they are assembled first and quantized once.
+    """
+    from .colour import to_mode
+    formats.load_plugin(formats.get(output_format))
+    report = core.stage_reporter(progress)
+    background = colour.background if colour else None
+    with core.open_image(source) as img:
+        report("open")
+        out_mode = target_mode(img.mode, output_format, colour)
+        rows = _strip_rows(img.size[0], (img.mode, out_mode), memory_limit)
+        needed = floor_bytes(img, output_format, rows, colour)
+        if needed > memory_limit:
+            raise MemoryError(f"needs about {needed / 2**20:.1f} MB even when streamed, "
+                              f"above the {memory_limit / 2**20:.1f} MB limit")
+
+        width, height = img.size
+        palette = img.getpalette() if img.mode == "P" else None
+        transparency = img.info.get("transparency")
+
+        if "strips" in formats.get(output_format).fast_paths and not _quantized_png(colour):
+            png_mode = _png_mode(out_mode)
+            with core.atomic_output(destination) as temp_path, open(temp_path, "wb") as f:
+                writer = PngStripWriter(f, img.size, png_mode, palette, transparency)
+                for top, strip in iter_strips(source, img, rows):
+                    writer.write(to_mode(strip, png_mode, background))
+                    if progress:
+                        progress("encode", 0.05 + 0.9 * min(top + rows, height) / height)
+                writer.close()
+            report("write")
+            return
+
+        if not can_read_strips(img):
+            # The source has to be decoded whole; convert it once and free it before encoding
+            img.load()
+            report("decode")
+            img_to_save = core.normalize_mode(img, output_format, colour)
+            if img_to_save is not img:
+                img.close()
+        else:
+            assemble_mode = _assemble_mode(img, out_mode, colour)
+            img_to_save = Image.new(assemble_mode, img.size)
+            if assemble_mode == "P":
+                img_to_save.putpalette(palette)
+                if transparency is not None:
+                    img_to_save.info["transparency"] = transparency
+            for top, strip in iter_strips(source, img, rows):
+                img_to_save.paste(to_mode(strip, assemble_mode, background), (0, top))
+            report("decode")
+            img_to_save = core.normalize_mode(img_to_save, output_format, colour)
+        report("convert")
+        if encoder is not None and encoder.target_size:
+            # The quality search needs the candidates in memory; they are no larger than the target
+            core.write_output(destination, core.encode_image(img_to_save, output_format, encoder))
+        else:
+            # Encode straight to the file: no second in-memory copy of the output
+            with core.atomic_output(destination) as temp_path:
+                img_to_save.save(temp_path, format=core.pil_format(output_format),
+                                 **core.save_options(output_format, encoder))
+        report("write")
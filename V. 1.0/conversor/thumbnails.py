@@ -0,0 +1,47 @@
+"""Reduced-resolution decoding for previews and downscaled outputs.
+
+Instead of decoding at full resolution and resizing, the decoder is asked for a
+smaller image first: JPEG DCT scaling (draft mode), embedded HEIF thumbnails
+(pillow_heif's draft) and, for other formats, Image.reduce's fast box
+reduction. Only the last, small step uses a high quality filter.
+"""
+from PIL import Image, ImageOps
+
+from . import core
+
+PREVIEW_SIZE = 256
+
+# Decode at no less than this multiple of the target size, so the final resample still has detail to work with
+REDUCING_GAP = 2.0
+
+
+def fitted_size(size, max_dimension):
+    """Size that fits in a max_dimension square, keeping the aspect ratio (never upscales)."""
+    width, height = size
+    scale = min(1.0, max_dimension / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode_reduced(img, max_dimension, resample=Image.Resampling.LANCZOS):
+    """Returns img scaled to fit in max_dimension, decoding at reduced resolution where the format allows it.
+
+    Must be called before img is loaded for draft mode to take effect. Images that
+    already fit are returned unchanged.
+    """
+    target = fitted_size(img.size, max_dimension)
+    if target == img.size:
+        return img
+    # JPEG decodes at 1/2, 1/4 or 1/8 scale; HEIF switches to an embedded thumbnail when one is big enough
+    img.draft(None, (int(target[0] * REDUCING_GAP), int(target[1] * REDUCING_GAP)))
+    target = fitted_size(img.size, max_dimension) # draft may have changed the size (and, for HEIF, the mode)
+    # resize() box-reduces by an integer factor first, then resamples only the remaining gap
+    return img.resize(target, resample, reducing_gap=REDUCING_GAP)
+
+
+def make_preview(path, size=PREVIEW_SIZE):
+    """Decodes a small, upright preview of an image file. Opens its own handle so a held image is not altered."""
+    with core.open_image(path) as img:
+        preview = decode_reduced(img, size, resample=Image.Resampling.BILINEAR)
+        if preview is img:
+            preview = img.copy()
+        return ImageOps.exif_transpose(preview)
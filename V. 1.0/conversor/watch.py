@@ -0,0 +1,337 @@
+"""Watch-folder mode: convert files as they arrive in a directory, until stopped.
+
+New files are noticed through inotify on Linux (called through ctypes, no extra
+dependency) or by re-scanning the directory elsewhere. A file is only converted
+once its size and modification time have stopped changing for `settle` seconds,
+so partially copied uploads are left alone. A small SQLite index remembers what
+was converted, so a restart only picks up files that are new or changed.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+
+from . import admission, batch, core, formats
+
+DEFAULT_SETTLE = 2.0 # Seconds a file must stay unchanged before it is converted
+DEFAULT_POLL_INTERVAL = 1.0 # Seconds between directory scans when inotify is not available
+STATE_FILE = ".conversor-watch.sqlite"
+
+# inotify(7) constants
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_Q_OVERFLOW = 0x4000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """Reports paths written or moved into a directory tree, using Linux inotify through libc."""
+
+    def __init__(self, directory, recursive=False):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.recursive = recursive
+        self._dirs = {} # watch descriptor -> directory
+        self.add_tree(directory)
+
+    def add_tree(self, directory):
+        """Watches directory (and, when recursive, every sub-directory)."""
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_MODIFY
+        for root, dirs, _ in os.walk(directory):
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(root), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"cannot watch {root}")
+            self._dirs[wd] = root
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            if not self.recursive:
+                break
+
+    def read(self, timeout):
+        """Waits up to timeout seconds and returns (changed_paths, overflowed)."""
+        paths, overflowed = set(), False
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return paths, overflowed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths, overflowed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                overflowed = True # Events were lost: the caller re-scans everything
+                continue
+            if wd not in self._dirs or not name:
+                continue
+            path = os.path.join(self._dirs[wd], os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                if self.recursive and mask & (_IN_CREATE | _IN_MOVED_TO) and os.path.isdir(path):
+                    self.add_tree(path)
+                    overflowed = True # Files may have landed in it before the watch existed
+            else:
+                paths.add(path)
+        return paths, overflowed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback for systems without inotify: reports nothing, the caller's periodic re-scan finds the files."""
+
+    def read(self, timeout):
+        time.sleep(timeout)
+        return set(), True
+
+    def close(self):
+        pass
+
+
+def make_watcher(directory, recursive=False):
+    """An InotifyWatcher where the platform allows it, otherwise a PollingWatcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directory, recursive)
+        except (OSError, AttributeError):
+            pass # No libc inotify (e.g. a restricted container), or the watch limit was reached
+    return PollingWatcher()
+
+
+def _ignore_interrupts():
+    # Ctrl+C reaches the whole process group: let the watcher finish the jobs in progress instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WatchState:
+    """SQLite index of converted sources: path -> (size, mtime, status, destination)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS files (source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                             " status TEXT, destination TEXT, error TEXT, converted_at REAL)")
+
+    def lookup(self, source):
+        """Returns (size, mtime_ns, status) recorded for source, or None."""
+        return self._db.execute("SELECT size, mtime_ns, status FROM files WHERE source = ?", (source,)).fetchone()
+
+    def destinations(self):
+        return {row[0] for row in self._db.execute("SELECT destination FROM files")}
+
+    def destination(self, source):
+        """The output recorded for source, unless it was skipped (its output was someone else's); else None."""
+        row = self._db.execute("SELECT destination FROM files WHERE source = ? AND status != 'skipped'",
+                               (source,)).fetchone()
+        return row and row[0]
+
+    def record(self, source, signature, result):
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (source, signature[0], signature[1], result.status, result.destination, result.error,
+                              time.time()))
+
+    def close(self):
+        self._db.close()
+
+
+class FolderWatcher:
+    """Converts every image that settles in directory to output_format, on a pool of worker processes.
+
+    Sources already recorded in the state index with the same size and modification time
+    are not converted again. A changed source is converted again, replacing its output.
+    Each source keeps one output; sources with the same name (a.jpg and a.png) get
+    a_converted, a_converted_2, ... as in batch.unique_destinations. Failures, and
+    files skipped because their output already existed, are retried once the file
+    changes or the watcher restarts.
+    report, if given, is called with each ConversionResult; metrics, a
+    conversor.metrics.Metrics, receives every result and the pending/in-flight counts.
+    memory_budget (bytes), if given, only starts a conversion while the estimated peak memory
+    of the running ones stays under it (see conversor.admission).
+    Other keyword options are passed on to core.convert_file.
+    """
+
+    def __init__(self, directory, output_format, output_dir=None, suffix="_converted", recursive=False,
+                 workers=None, settle=DEFAULT_SETTLE, poll_interval=DEFAULT_POLL_INTERVAL, state_path=None,
+                 report=None, metrics=None, memory_budget=None, **options):
+        self.directory = os.path.abspath(directory)
+        self.output_format = output_format
+        self.output_dir = output_dir and os.path.abspath(output_dir)
+        self.suffix = suffix
+        self.recursive = recursive
+        self.workers = workers or os.cpu_count() or 1
+        self.settle = settle
+        self.poll_interval = poll_interval
+        os.makedirs(self.output_dir or self.directory, exist_ok=True)
+        self.state = WatchState(state_path or os.path.join(self.output_dir or self.directory, STATE_FILE))
+        self.report = report
+        self.metrics = metrics
+        self.options = options
+        self.budget = admission.MemoryBudget(memory_budget, metrics=metrics) if memory_budget else None
+        self.stop_event = threading.Event()
+        self._pending = {} # path -> (signature, time the signature was last seen changing)
+        self._running = {} # future -> (source, signature, estimated memory)
+        self._tickets = {} # path -> (admission ticket, estimate) of settled files waiting for memory
+        self._outputs = self.state.destinations() # Our own outputs must never be picked up as inputs
+        self._names = batch.DestinationNames(used=self._outputs)
+        self._destinations = {} # path -> its output, fixed the first time it is needed
+        self._failed = {} # path -> signature that failed or was skipped in this run, not retried until it changes
+
+    def stop(self):
+        """Asks run() to return after the conversions in progress finish. Safe to call from a signal handler."""
+        self.stop_event.set()
+
+    def _wanted(self, path):
+        name = os.path.basename(path)
+        if name.startswith(".") or not name.lower().endswith(formats.input_extensions()) or path in self._outputs:
+            return False
+        if self.output_dir and self.output_dir != self.directory:
+            if os.path.commonpath([self.output_dir, path]) == self.output_dir:
+                return False # Outputs written inside the watched tree
+        return True
+
+    def _scan(self):
+        """Queues every wanted file in the directory, e.g. those that arrived while nobody was watching."""
+        for source, _ in batch.collect_inputs([self.directory], recursive=self.recursive):
+            self._notice(os.path.abspath(source))
+
+    def _notice(self, path):
+        if path in self._pending or not self._wanted(path):
+            return
+        if any(running[0] == path for running in self._running.values()):
+            return
+        try:
+            signature = _signature(path)
+        except OSError:
+            return # Already gone (e.g. a temporary file renamed away)
+        recorded = self.state.lookup(path)
+        if recorded and recorded[:2] == signature and recorded[2] == "ok":
+            return
+        if self._failed.get(path) == signature:
+            return
+        self._pending[path] = (signature, time.monotonic())
+
+    def _destination(self, source):
+        if source not in self._destinations:
+            destination = self.state.destination(source)
+            if destination is None:
+                folder = None
+                if self.output_dir:
+                    relative = os.path.relpath(os.path.dirname(source), self.directory)
+                    folder = os.path.normpath(os.path.join(self.output_dir, relative))
+                destination = self._names.claim(core.output_path_for(source, self.output_format, folder, self.suffix))
+            self._destinations[source] = destination
+        return self._destinations[source]
+
+    def _drop_ticket(self, path):
+        entry = self._tickets.pop(path, None)
+        if entry is not None:
+            self.budget.cancel(entry[0])
+
+    def _submit_settled(self, executor):
+        now = time.monotonic()
+        # With a memory budget only running jobs may hold memory: the others wait here, not in the pool's queue
+        max_running = self.workers if self.budget else 2 * self.workers
+        for path, (signature, since) in list(self._pending.items()):
+            try:
+                current = _signature(path)
+            except OSError:
+                del self._pending[path]
+                self._drop_ticket(path)
+                continue
+            if current != signature:
+                self._pending[path] = (current, now) # Still being written: wait for it to settle again
+                self._drop_ticket(path) # Its size may have changed too
+                continue
+            if now - since < self.settle or len(self._running) >= max_running:
+                continue
+            job = batch.ConversionJob(path, self._destination(path), self.output_format)
+            options = self.options
+            recorded = self.state.lookup(path)
+            if recorded and recorded[2] == "ok":
+                options = dict(options, overwrite=True) # The source changed since we converted it
+            estimate = 0
+            if self.budget:
+                if path not in self._tickets:
+                    estimate = admission.estimate_job(job, options)
+                    self._tickets[path] = (self.budget.enqueue(estimate), estimate)
+                ticket, estimate = self._tickets[path]
+                if not self.budget.try_admit(ticket):
+                    continue
+                del self._tickets[path]
+            del self._pending[path]
+            self._outputs.add(job.destination)
+            self._running[executor.submit(batch._run_job, job, options, time.time())] = (path, signature, estimate)
+
+    def _collect(self, timeout=0):
+        from concurrent.futures import FIRST_COMPLETED, wait
+        if not self._running:
+            return
+        done, _ = wait(self._running, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            source, signature, estimate = self._running.pop(future)
+            if self.budget:
+                self.budget.release(estimate)
+            destination = self._destination(source)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = core.ConversionResult(source, destination, "failed", f"{type(e).__name__}: {e}", 0.0)
+            self.state.record(source, signature, result)
+            if result.status in ("failed", "skipped"):
+                self._failed[source] = signature
+            if self.metrics:
+                self.metrics.observe(result, self.output_format)
+            if self.report:
+                self.report(result)
+
+    def run(self):
+        """Watches and converts until stop() is called; then waits for the conversions in progress."""
+        watcher = make_watcher(self.directory, self.recursive)
+        polling = isinstance(watcher, PollingWatcher)
+        # Short waits keep the settle timer and finished jobs moving even when no events arrive
+        tick = min(self.poll_interval if polling else 0.5, max(self.settle / 2, 0.05))
+        try:
+            with batch.process_pool(self.workers, initializer=_ignore_interrupts) as executor:
+                self._scan()
+                last_scan = time.monotonic()
+                while not self.stop_event.is_set():
+                    changed, rescan = watcher.read(tick)
+                    if rescan and (not polling or time.monotonic() - last_scan >= self.poll_interval):
+                        self._scan()
+                        last_scan = time.monotonic()
+                    for path in changed:
+                        self._notice(os.path.abspath(path))
+                    self._submit_settled(executor)
+                    self._collect()
+                    if self.metrics:
+                        self.metrics.set_gauge("conversor_watch_pending", len(self._pending),
+                                               "Files waiting to settle before conversion.")
+                        self.metrics.set_gauge("conversor_watch_in_flight", len(self._running),
+                                               "Conversions submitted to the worker pool and not finished.")
+                while self._running:
+                    self._collect(timeout=None)
+        finally:
+            watcher.close()
+            self.state.close()
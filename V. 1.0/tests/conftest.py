@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the conversor package from "V. 1.0", wherever pytest is started
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,45 @@
+"""Admission estimates against the memory a conversion really takes."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from PIL import Image
+
+from conversor import admission, batch
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Converts argv[1] to GIF and prints the growth of the peak RSS, in bytes. VmHWM, unlike
+# ru_maxrss, does not start from the peak of the (larger) pytest process that spawned it
+_MEASURE = """
+import sys
+from PIL import Image
+from conversor import core
+
+def peak():
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+
+Image.new("RGB", (8, 8)).quantize() # Loads the quantizer before the baseline
+base = peak()
+result = core.convert_file(sys.argv[1], sys.argv[2], "GIF", overwrite=True)
+assert result.status == "ok", result.error
+print(peak() - base)
+"""
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/status"), reason="measures VmHWM from /proc")
+def test_gif_estimate_covers_the_quantize_stage(tmp_path):
+    source = str(tmp_path / "photo.png")
+    gradient = Image.linear_gradient("L").resize((2400, 1800))
+    Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.ROTATE_180), gradient.point(lambda v: v // 3)))\
+        .save(source)
+    destination = str(tmp_path / "photo.gif")
+    done = subprocess.run([sys.executable, "-c", _MEASURE, source, destination], capture_output=True, text=True,
+                          env=dict(os.environ, PYTHONPATH=PACKAGE_DIR), timeout=120)
+    assert done.returncode == 0, done.stderr
+    measured = int(done.stdout)
+    estimate = admission.estimate_job(batch.ConversionJob(source, destination, "GIF"), {"overwrite": True})
+    assert measured * 0.9 <= estimate <= measured * 1.5
@@ -0,0 +1,70 @@
+"""Archive conversion: members become outputs of the same kind of archive (or a folder), in source order."""
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from PIL import Image
+
+from conversor import archives
+
+
+def _image_bytes(fmt, colour="teal"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), colour).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+MEMBERS = [("photos/a.png", _image_bytes("PNG")), ("photos/a.jpg", _image_bytes("JPEG", "navy")),
+           ("photos/a_2.png", _image_bytes("PNG", "olive")), ("notes.txt", b"not an image")]
+
+
+def _write_archive(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, data in MEMBERS:
+                archive.writestr(name, data)
+    else:
+        with tarfile.open(path, "w:gz") as archive:
+            for name, data in MEMBERS:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+
+
+def _names(path):
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            return archive.namelist()
+    if path.endswith(".tar.gz"):
+        with tarfile.open(path) as archive:
+            return archive.getnames()
+    return sorted(os.path.relpath(os.path.join(folder, name), path).replace(os.sep, "/")
+                  for folder, _, files in os.walk(path) for name in files)
+
+
+@pytest.mark.parametrize("source_name, destination_name, expected", [
+    # A ZIP lists its members up front: a_2.png keeps its own name and the second "a" becomes a_3
+    ("in.zip", "out.zip", ["photos/a.webp", "photos/a_3.webp", "photos/a_2.webp"]),
+    ("in.zip", "out", ["photos/a.webp", "photos/a_2.webp", "photos/a_3.webp"]),
+    # A TAR is a stream: the second "a" takes a_2 first, so a_2.png is renamed in turn
+    ("in.tar.gz", "out.tar.gz", ["photos/a.webp", "photos/a_2.webp", "photos/a_2_2.webp"]),
+])
+def test_members_with_the_same_stem_get_distinct_outputs(tmp_path, source_name, destination_name, expected):
+    source, destination = str(tmp_path / source_name), str(tmp_path / destination_name)
+    _write_archive(source)
+    results = archives.convert_archive(source, destination, "WEBP", workers=2)
+    assert [result.status for result in results] == ["ok"] * 3
+    assert _names(destination) == expected
+    assert len({result.destination for result in results}) == 3
+
+
+def test_same_archive_gives_the_same_output(tmp_path):
+    source = str(tmp_path / "in.zip")
+    _write_archive(source)
+    archives.convert_archive(source, str(tmp_path / "first.zip"), "JPG", workers=2)
+    archives.convert_archive(source, str(tmp_path / "second.zip"), "JPG", workers=1)
+    with open(tmp_path / "first.zip", "rb") as first, open(tmp_path / "second.zip", "rb") as second:
+        assert first.read() == second.read()
@@ -0,0 +1,33 @@
+"""The conversion cache: keyed on the source's content, not its path."""
+import shutil
+
+from PIL import Image
+
+from conversor import cache, core
+
+
+def test_hit_and_miss_follow_the_content(tmp_path):
+    conversions = cache.ConversionCache(str(tmp_path / "cache"))
+    Image.new("RGB", (40, 30), "teal").save(tmp_path / "a.png")
+    shutil.copyfile(tmp_path / "a.png", tmp_path / "copy.png") # Same bytes under another name
+    Image.new("RGB", (40, 30), "navy").save(tmp_path / "other.png")
+
+    first = core.convert_file(str(tmp_path / "a.png"), str(tmp_path / "a.jpg"), "JPG", cache=conversions)
+    copy = core.convert_file(str(tmp_path / "copy.png"), str(tmp_path / "copy.jpg"), "JPG", cache=conversions)
+    other = core.convert_file(str(tmp_path / "other.png"), str(tmp_path / "other.jpg"), "JPG", cache=conversions)
+    webp = core.convert_file(str(tmp_path / "a.png"), str(tmp_path / "a.webp"), "WEBP", cache=conversions)
+
+    assert [result.status for result in (first, copy, other, webp)] == ["ok"] * 4
+    assert [result.cached for result in (first, copy, other, webp)] == [False, True, False, False]
+    assert (tmp_path / "copy.jpg").read_bytes() == (tmp_path / "a.jpg").read_bytes()
+    assert conversions.stats()["hits"] == 1
+    assert conversions.stats()["misses"] == 3
+
+
+def test_evicts_the_least_recently_used_entries(tmp_path):
+    conversions = cache.ConversionCache(str(tmp_path / "cache"), max_bytes=0)
+    Image.new("RGB", (40, 30), "teal").save(tmp_path / "a.png")
+    core.convert_file(str(tmp_path / "a.png"), str(tmp_path / "a.jpg"), "JPG", cache=conversions)
+    assert conversions.stats()["entries"] == 0
+    again = core.convert_file(str(tmp_path / "a.png"), str(tmp_path / "b.jpg"), "JPG", cache=conversions)
+    assert not again.cached
@@ -0,0 +1,57 @@
+"""Perceptual deduplication: copies match, different pictures (even featureless ones) do not."""
+import os
+
+from PIL import Image
+
+from conversor import batch, dedup
+
+
+def _photo(size=(640, 480)):
+    """Something with detail in both directions and some colour, like a photograph."""
+    grey = Image.effect_mandelbrot(size, (-2.0, -1.2, 0.8, 1.2), 64)
+    return Image.merge("RGB", (grey, grey.transpose(Image.Transpose.ROTATE_180), grey.point(lambda v: v // 2)))
+
+
+def _jobs(directory, names):
+    return [batch.ConversionJob(str(directory / name), str(directory / "out" / f"{name}.webp"), "WEBP")
+            for name in names]
+
+
+def test_resized_copy_is_a_duplicate(tmp_path):
+    _photo().save(tmp_path / "photo.png")
+    _photo().resize((320, 240)).save(tmp_path / "small.jpg", quality=80)
+    with dedup.DedupIndex(str(tmp_path / "index.sqlite")) as index:
+        duplicates = index.find_duplicates(_jobs(tmp_path, ["photo.png", "small.jpg"]))
+    assert duplicates == {1: (str(tmp_path / "photo.png"), str(tmp_path / "out" / "photo.png.webp"), 0)}
+
+
+def test_featureless_images_are_not_duplicates(tmp_path):
+    Image.new("RGB", (200, 200), "black").save(tmp_path / "black.png")
+    Image.new("RGB", (200, 200), "white").save(tmp_path / "white.png")
+    Image.new("RGB", (200, 200), "blue").save(tmp_path / "blue.png")
+    Image.new("RGB", (200, 200), "red").save(tmp_path / "red.png")
+    Image.linear_gradient("L").convert("RGB").save(tmp_path / "gradient.jpg")
+    names = ["black.png", "white.png", "blue.png", "red.png", "gradient.jpg"]
+    with dedup.DedupIndex(str(tmp_path / "index.sqlite")) as index:
+        assert index.find_duplicates(_jobs(tmp_path, names)) == {}
+
+
+def test_different_colours_are_not_duplicates(tmp_path):
+    _photo().save(tmp_path / "photo.png")
+    red, green, blue = _photo().split()
+    Image.merge("RGB", (blue, red, green)).save(tmp_path / "recoloured.png") # Same shapes, other colours
+    with dedup.DedupIndex(str(tmp_path / "index.sqlite")) as index:
+        assert index.find_duplicates(_jobs(tmp_path, ["photo.png", "recoloured.png"])) == {}
+
+
+def test_link_only_links_real_copies(tmp_path):
+    _photo().save(tmp_path / "photo.png")
+    _photo().resize((320, 240)).save(tmp_path / "copy.png")
+    Image.new("RGB", (200, 200), "blue").save(tmp_path / "blue.png")
+    Image.new("RGB", (200, 200), "red").save(tmp_path / "red.png")
+    jobs = _jobs(tmp_path, ["photo.png", "copy.png", "blue.png", "red.png"])
+    with dedup.DedupIndex(str(tmp_path / "index.sqlite")) as index:
+        results = index.run(jobs, batch.run_batch, action="link", workers=1)
+    assert [result.status for result in results] == ["ok", "linked", "ok", "ok"]
+    assert os.path.samefile(jobs[0].destination, jobs[1].destination)
+    assert Image.open(jobs[3].destination).convert("RGB").getpixel((0, 0))[0] > 200 # Red, not blue's output
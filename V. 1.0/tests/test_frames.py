@@ -0,0 +1,52 @@
+"""Animations: every frame and its duration survive a conversion, or each frame gets its own file."""
+import os
+
+from PIL import Image
+
+from conversor import core, frames
+
+COLOURS = ("red", "green", "blue", "yellow")
+
+
+def _animation(path):
+    images = [Image.new("RGB", (40, 30), colour) for colour in COLOURS]
+    images[0].save(path, save_all=True, append_images=images[1:], duration=[100, 200, 300, 400], loop=0)
+    return str(path)
+
+
+def _durations(path):
+    with Image.open(path) as img:
+        durations = []
+        for index in range(img.n_frames):
+            img.seek(index)
+            img.load() # WEBP frames only report their duration once decoded
+            durations.append(img.info["duration"])
+        return durations
+
+
+def test_animation_keeps_its_frames(tmp_path):
+    source = _animation(tmp_path / "anim.gif")
+    assert core.convert_file(source, str(tmp_path / "anim.webp"), "WEBP").status == "ok"
+    assert _durations(tmp_path / "anim.webp") == [100, 200, 300, 400]
+
+
+def test_frame_step_keeps_the_running_time(tmp_path):
+    source = _animation(tmp_path / "anim.gif")
+    assert core.convert_file(source, str(tmp_path / "anim.webp"), "WEBP", frame_step=2).status == "ok"
+    assert _durations(tmp_path / "anim.webp") == [300, 700]
+
+
+def test_first_keeps_one_frame(tmp_path):
+    source = _animation(tmp_path / "anim.gif")
+    assert core.convert_file(source, str(tmp_path / "anim.webp"), "WEBP", frames="first").status == "ok"
+    assert Image.open(tmp_path / "anim.webp").n_frames == 1
+
+
+def test_split_writes_numbered_files(tmp_path):
+    source = _animation(tmp_path / "anim.gif")
+    destination = str(tmp_path / "out" / "anim.png")
+    assert core.convert_file(source, destination, "PNG", frames="split").status == "ok"
+    assert sorted(os.listdir(tmp_path / "out")) == [os.path.basename(frames.frame_path(destination, number))
+                                                    for number in range(1, len(COLOURS) + 1)]
+    assert Image.open(frames.frame_path(destination, 3)).convert("RGB").getpixel((0, 0)) == (0, 0, 255)
+    assert core.convert_file(source, destination, "PNG", frames="split").status == "skipped"
@@ -0,0 +1,76 @@
+"""Resuming a journaled batch: finished jobs are skipped only while their outputs are still there."""
+import os
+
+from PIL import Image
+
+from conversor import batch, journal
+
+
+def _jobs(directory, count=3, output_format="WEBP"):
+    jobs = []
+    for number in range(count):
+        source = str(directory / f"p{number}.png")
+        Image.new("RGB", (40, 30), (number * 60, 90, 20)).save(source)
+        jobs.append(batch.ConversionJob(source, str(directory / "out" / f"p{number}.webp"), output_format))
+    return jobs
+
+
+def _run(path, jobs, verify=False, **options):
+    with journal.BatchJournal(str(path), verify=verify) as manifest:
+        return manifest.run(jobs, batch.run_batch, workers=1, **options)
+
+
+def _statuses(results):
+    return [(result.status, result.error) for result in results]
+
+
+def test_resume_skips_finished_jobs(tmp_path):
+    jobs = _jobs(tmp_path)
+    assert [result.status for result in _run(tmp_path / "journal.sqlite", jobs)] == ["ok"] * 3
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs)) == [("skipped", journal.RESUMED_ERROR)] * 3
+
+
+def test_resume_converts_deleted_and_changed_outputs_again(tmp_path):
+    jobs = _jobs(tmp_path)
+    _run(tmp_path / "journal.sqlite", jobs)
+    os.remove(jobs[0].destination)
+    with open(jobs[1].destination, "ab") as f:
+        f.write(b"garbage")
+    results = _run(tmp_path / "journal.sqlite", jobs, overwrite=True)
+    assert _statuses(results) == [("ok", None), ("ok", None), ("skipped", journal.RESUMED_ERROR)]
+    assert os.path.exists(jobs[0].destination)
+
+
+def test_verify_catches_a_rewritten_output_of_the_same_size(tmp_path):
+    jobs = _jobs(tmp_path, count=1)
+    _run(tmp_path / "journal.sqlite", jobs)
+    with open(jobs[0].destination, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs)) == [("skipped", journal.RESUMED_ERROR)]
+    assert [result.status for result in _run(tmp_path / "journal.sqlite", jobs, verify=True, overwrite=True)] == ["ok"]
+
+
+def test_skipped_job_is_redone_once_its_output_is_gone(tmp_path):
+    jobs = _jobs(tmp_path, count=1)
+    os.makedirs(tmp_path / "out")
+    Image.new("RGB", (8, 8)).save(jobs[0].destination) # Already there: the first run skips the job
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs)) == [("skipped", "output already exists")]
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs)) == [("skipped", journal.RESUMED_ERROR)]
+    os.remove(jobs[0].destination)
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs)) == [("ok", None)]
+    assert Image.open(jobs[0].destination).size == (40, 30)
+
+
+def test_split_frames_are_done_while_their_files_exist(tmp_path):
+    source = str(tmp_path / "anim.gif")
+    frames = [Image.new("RGB", (40, 30), colour) for colour in ("red", "green", "blue")]
+    frames[0].save(source, save_all=True, append_images=frames[1:], duration=100)
+    jobs = [batch.ConversionJob(source, str(tmp_path / "out" / "anim.png"), "PNG")]
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs, frames="split")) == [("ok", None)]
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs, frames="split")) == [("skipped", journal.RESUMED_ERROR)]
+    for name in os.listdir(tmp_path / "out"):
+        os.remove(tmp_path / "out" / name)
+    assert _statuses(_run(tmp_path / "journal.sqlite", jobs, frames="split")) == [("ok", None)]
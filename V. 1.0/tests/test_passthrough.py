@@ -0,0 +1,28 @@
+"""Same-format conversions copy the source unless something would change it."""
+from PIL import Image
+
+from conversor import core
+
+
+def _jpeg(path):
+    Image.effect_mandelbrot((160, 120), (-2.0, -1.2, 0.8, 1.2), 64).convert("RGB").save(path, quality=70)
+    return str(path)
+
+
+def test_same_format_is_copied_byte_for_byte(tmp_path):
+    source = _jpeg(tmp_path / "photo.jpeg")
+    result = core.convert_file(source, str(tmp_path / "photo.jpg"), "JPG")
+    assert result.status == "ok"
+    assert "copy" in result.stages
+    assert (tmp_path / "photo.jpg").read_bytes() == (tmp_path / "photo.jpeg").read_bytes()
+
+
+def test_changes_and_reencode_go_through_the_encoder(tmp_path):
+    source = _jpeg(tmp_path / "photo.jpeg")
+    for name, options in (("reencoded", {"reencode": True}), ("quality", {"quality": 95}),
+                          ("smaller", {"max_dimension": 80})):
+        result = core.convert_file(source, str(tmp_path / f"{name}.jpg"), "JPG", **options)
+        assert result.status == "ok", result.error
+        assert "copy" not in result.stages, name
+        assert (tmp_path / f"{name}.jpg").read_bytes() != (tmp_path / "photo.jpeg").read_bytes(), name
+    assert Image.open(tmp_path / "smaller.jpg").size == (80, 60)
@@ -0,0 +1,37 @@
+"""--pipeline on a mixed batch: HEIC sources are probed on I/O threads while workers start."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from PIL import Image
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _mixed_batch(directory):
+    pillow_heif = pytest.importorskip("pillow_heif")
+    pillow_heif.register_heif_opener()
+    names = []
+    for index in range(3):
+        for name, fmt in ((f"photo{index}.jpg", "JPEG"), (f"shot{index}.png", "PNG"), (f"phone{index}.heic", "HEIF")):
+            Image.new("RGB", (800, 600), (40 * index, 90, 160)).save(os.path.join(directory, name), fmt)
+            names.append(name)
+        frames = [Image.new("P", (320, 240), colour) for colour in (1, 2, 3)]
+        name = f"anim{index}.gif"
+        frames[0].save(os.path.join(directory, name), save_all=True, append_images=frames[1:], duration=80)
+        names.append(name)
+    return names
+
+
+def test_pipeline_mixed_heic_batch_finishes(tmp_path):
+    names = _mixed_batch(tmp_path)
+    env = dict(os.environ, PYTHONPATH=PACKAGE_DIR)
+    command = [sys.executable, "-m", "conversor", "convert", *names, "--to", "WEBP", "--pipeline", "-j", "2",
+               "--io-threads", "4", "-o", "out"]
+    # A worker forked while an I/O thread held libheif's lock used to hang the batch forever
+    done = subprocess.run(command, cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+    assert done.returncode == 0, done.stdout + done.stderr
+    assert f"{len(names)} converted" in done.stdout
+    assert len(os.listdir(tmp_path / "out")) == len(names)
@@ -0,0 +1,71 @@
+"""The HTTP service: conversions, client errors and recovery from a dead worker."""
+import http.client
+import io
+import json
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from PIL import Image
+
+from conversor import server
+
+
+@pytest.fixture
+def service_address():
+    service = server.ConversionService(workers=1)
+    service.start()
+    httpd = server.ConversionServer(("127.0.0.1", 0), service, quiet=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield service, httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+    service.close()
+
+
+def _request(address, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection(*address, timeout=60)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def _png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 48), "orange").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_convert(service_address):
+    _, address = service_address
+    status, body = _request(address, "POST", "/convert?format=jpg", _png(), {"Content-Type": "image/png"})
+    assert status == 200
+    assert Image.open(io.BytesIO(body)).format == "JPEG"
+
+
+def test_malformed_length_is_a_client_error(service_address):
+    _, address = service_address
+    status, body = _request(address, "POST", "/convert?format=jpg", _png(), {"Content-Length": "abc"})
+    assert status == 400
+    assert json.loads(body) == {"error": "invalid Content-Length"}
+
+
+def test_recovers_from_a_killed_worker(service_address):
+    service, address = service_address
+    os.kill(service._executor.submit(server._ping).result(), signal.SIGKILL)
+    deadline = time.monotonic() + 10
+    while _request(address, "GET", "/health")[0] == 200: # The executor notices the death on its own thread
+        assert time.monotonic() < deadline, "/health never reported the dead worker"
+        time.sleep(0.05)
+    assert "error" in json.loads(_request(address, "GET", "/health")[1])
+
+    status, body = _request(address, "POST", "/convert?format=webp", _png())
+    assert status == 200, body
+    assert _request(address, "GET", "/health") == (200, b"ok\n")
@@ -0,0 +1,19 @@
+"""--memory-limit on quantized outputs, which are assembled whole before their palette is computed."""
+import pytest
+
+from PIL import Image
+
+from conversor import colour, core, streaming
+
+
+@pytest.mark.parametrize("output_format, settings", [("GIF", None), ("PNG", colour.ColourSettings(quantizer="octree"))])
+def test_quantized_output_counts_the_canvas_and_the_quantizer(tmp_path, output_format, settings):
+    source = tmp_path / "big.tiff"
+    Image.new("RGB", (1000, 1000), (10, 120, 200)).save(source) # Uncompressed: read strip by strip
+    with core.open_image(source) as img:
+        needed = streaming.floor_bytes(img, output_format, 16, settings)
+    # The RGB canvas (4 bytes per pixel in Pillow) and the quantizer's copies of it
+    assert needed >= 13 * 1000 * 1000
+    with pytest.raises(MemoryError):
+        streaming.convert_streaming(source, tmp_path / f"out.{output_format.lower()}", output_format, needed // 2,
+                                    colour=settings)
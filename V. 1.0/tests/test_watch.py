@@ -0,0 +1,60 @@
+"""Watch mode: files that land in the folder are converted once, each to its own output."""
+import os
+import threading
+import time
+
+from PIL import Image
+
+from conversor import core, watch
+
+
+def _watch_until(watcher, done, timeout=60):
+    """Runs watcher (here: its state index belongs to this thread) until done() is true or timeout seconds pass."""
+    def stop_when_done():
+        deadline = time.monotonic() + timeout
+        while not done() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        watcher.stop()
+
+    thread = threading.Thread(target=stop_when_done)
+    thread.start()
+    watcher.run()
+    thread.join()
+    return done()
+
+
+def _watcher(directory, output, results):
+    return watch.FolderWatcher(str(directory), "WEBP", output_dir=str(output), workers=1, settle=0.1,
+                               poll_interval=0.1, report=results.append)
+
+
+def test_sources_with_the_same_stem_get_their_own_outputs(tmp_path):
+    inbox, output = tmp_path / "in", tmp_path / "out"
+    inbox.mkdir()
+    Image.new("RGB", (40, 30), "red").save(inbox / "a.jpg")
+    Image.new("RGB", (40, 30), "blue").save(inbox / "a.png")
+    results = []
+    assert _watch_until(_watcher(inbox, output, results), lambda: len(results) == 2)
+    assert sorted(result.status for result in results) == ["ok", "ok"]
+    assert sorted(os.listdir(output)) == [".conversor-watch.sqlite", "a_converted.webp", "a_converted_2.webp"]
+
+
+def test_skipped_sources_are_retried_after_a_restart(tmp_path):
+    inbox, output = tmp_path / "in", tmp_path / "out"
+    inbox.mkdir()
+    output.mkdir()
+    Image.new("RGB", (40, 30), "red").save(inbox / "a.jpg")
+    Image.new("RGB", (40, 30), "blue").save(inbox / "a.png")
+    Image.new("RGB", (40, 30), "red").save(output / "a_converted.webp")
+    # An earlier run converted a.jpg and skipped a.png, whose output took the same name
+    state = watch.WatchState(str(output / watch.STATE_FILE))
+    destination = str(output / "a_converted.webp")
+    for name, status in (("a.jpg", "ok"), ("a.png", "skipped")):
+        source = str(inbox / name)
+        state.record(source, watch._signature(source), core.ConversionResult(source, destination, status, None, 0.0))
+    state.close()
+
+    results = []
+    assert _watch_until(_watcher(inbox, output, results), lambda: len(results) == 1)
+    assert [(os.path.basename(result.source), result.status) for result in results] == [("a.png", "ok")]
+    assert os.path.basename(results[0].destination) == "a_converted_2.webp"